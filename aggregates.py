@@ -0,0 +1,200 @@
+import argparse
+
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from bulk_load import load_executemany
+from chunking import chunked
+from instrumentation import log, span
+from schema import create_schema
+from standings import constructor_standings, driver_standings
+from timing import lap_ms, last_session
+
+
+def _results_counts(df):
+    return df.assign(win=df['final_position'].eq(1).astype(int),
+                     podium=df['final_position'].between(1, 3).astype(int),
+                     position=df['final_position'].where(df['final_position'] > 0))
+
+
+def race_constructor_points(df):
+
+    return (_results_counts(df)
+            .groupby(['race_id', 'constructor_id'], as_index=False)
+            .agg(year=('year', 'first'), points=('points', 'sum'), wins=('win', 'sum'), podiums=('podium', 'sum'),
+                 entries=('result_id', 'size'), best_position=('position', 'min'))
+            .astype({'best_position': 'Int64'}))
+
+
+def season_constructor_points(df):
+
+    return (_results_counts(df)
+            .groupby(['year', 'constructor_id'], as_index=False)
+            .agg(points=('points', 'sum'), wins=('win', 'sum'), podiums=('podium', 'sum'),
+                 races=('race_id', 'nunique'), entries=('result_id', 'size')))
+
+
+def season_driver_points(df):
+
+    return (_results_counts(df)
+            .groupby(['year', 'driver_id'], as_index=False)
+            .agg(points=('points', 'sum'), wins=('win', 'sum'), podiums=('podium', 'sum'),
+                 races=('race_id', 'nunique'), best_position=('position', 'min'))
+            .astype({'best_position': 'Int64'}))
+
+
+def race_pit_stops(df):
+
+    return (df.groupby('race_id', as_index=False)
+            .agg(year=('year', 'first'), stops=('pit_stops_id', 'size'), drivers=('driver_id', 'nunique'),
+                 avg_duration=('stop_duration', 'mean'), min_duration=('stop_duration', 'min'),
+                 max_duration=('stop_duration', 'max'), total_duration=('stop_duration', 'sum')))
+
+
+def race_driver_pit_stops(df):
+
+    return (df.groupby(['race_id', 'driver_id'], as_index=False)
+            .agg(year=('year', 'first'), stops=('pit_stops_id', 'size'), avg_duration=('stop_duration', 'mean'),
+                 min_duration=('stop_duration', 'min'), total_duration=('stop_duration', 'sum')))
+
+
+# Fastest time of every session and the pole sitter of each race: the driver
+# with the best time in the last session reached (Q3, then Q2, then Q1).
+def race_qualifying(df):
+
+    times = pd.DataFrame({q: lap_ms(df[q]) for q in ['q1', 'q2', 'q3']}, index=df.index)
+    session, pole_ms = last_session(times['q1'], times['q2'], times['q3'])
+    ranked = (df[['race_id', 'driver_id', 'constructor_id']].join(times)
+              .assign(pole_ms=pole_ms, session=session)
+              .sort_values(['race_id', 'session', 'pole_ms'], ascending=[True, False, True], na_position='last'))
+    pole = ranked.drop_duplicates('race_id').set_index('race_id')
+
+    summary = (df.join(times.add_prefix('best_').add_suffix('_ms'))
+               .groupby('race_id')
+               .agg(year=('year', 'first'), circuit_id=('circuit_id', 'first'), entries=('qualifying_id', 'size'),
+                    best_q1_ms=('best_q1_ms', 'min'), best_q2_ms=('best_q2_ms', 'min'),
+                    best_q3_ms=('best_q3_ms', 'min')))
+    timed = pole['session'] > 0
+    for column, pole_column in [('pole_driver_id', 'driver_id'), ('pole_constructor_id', 'constructor_id'),
+                                ('pole_ms', 'pole_ms')]:
+        summary[column] = pole[pole_column].where(timed).astype('Int64')
+
+    return summary.reset_index()
+
+
+# Fact table, grain ('race' rows are replaced by race_id, 'season' rows by year)
+# and build function of every summary table.
+AGGREGATES = {
+    'agg_race_constructor_points': ('results', 'race', race_constructor_points),
+    'agg_season_constructor_points': ('results', 'season', season_constructor_points),
+    'agg_season_driver_points': ('results', 'season', season_driver_points),
+    'agg_race_pit_stops': ('pit_stops', 'race', race_pit_stops),
+    'agg_race_driver_pit_stops': ('pit_stops', 'race', race_driver_pit_stops),
+    'agg_race_qualifying': ('qualifying', 'race', race_qualifying),
+    'agg_driver_standings': ('results', 'season', driver_standings),
+    'agg_constructor_standings': ('results', 'season', constructor_standings),
+}
+
+GRAIN_KEYS = {'race': 'race_id', 'season': 'year'}
+
+
+def _touched_years(conn, race_ids):
+
+    years = set()
+    query = text("SELECT DISTINCT year FROM race WHERE race_id IN :ids").bindparams(bindparam('ids', expanding=True))
+    for chunk in chunked(race_ids):
+        years.update(row[0] for row in conn.execute(query, {'ids': chunk}))
+
+    return years
+
+
+# Fact rows with the year, month and day of their race, of the given seasons
+# only (all of them when years is None).
+def _read_fact(conn, fact, years=None):
+
+    query = f"SELECT f.*, r.year, r.month, r.day FROM {fact} f JOIN race r ON r.race_id = f.race_id"
+    if years is None:
+        return pd.read_sql(text(query), con=conn)
+
+    if not years:
+        # No season to read, but the columns are still needed
+        return pd.read_sql(text(query + " WHERE 1 = 0"), con=conn)
+
+    query = text(query + " WHERE r.year IN :years").bindparams(bindparam('years', expanding=True))
+    frames = [pd.read_sql(query, con=conn, params={'years': chunk}) for chunk in chunked(years)]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+# Deletes the rows of the touched races or seasons and inserts their new ones
+# in the same transaction, so the dashboards never read a half refreshed table.
+def _replace(engine, table, key, values, frame):
+
+    with engine.begin() as conn:
+        if values is None:
+            conn.execute(text(f"DELETE FROM {table}"))
+        else:
+            query = text(f"DELETE FROM {table} WHERE {key} IN :values").bindparams(
+                bindparam('values', expanding=True))
+            for chunk in chunked(values):
+                conn.execute(query, {'values': chunk})
+        if len(frame):
+            load_executemany(conn, table, frame)
+
+
+# Refreshes the summary tables of the given facts for the races a load touched.
+# touched maps each fact to the race ids it loaded, or to None to rebuild its
+# summary tables from the whole fact table. Race-grain tables are rebuilt for
+# the touched races only and season-grain tables for the seasons of those races.
+# Missing summary tables are created; facts absent from the database are skipped.
+def refresh_aggregates(engine, touched):
+
+    existing = set(inspect(engine).get_table_names())
+    sources = {fact for fact, _, _ in AGGREGATES.values()}
+    touched = {fact: races for fact, races in touched.items() if fact in existing and fact in sources}
+    names = [name for name, (fact, _, _) in AGGREGATES.items() if fact in touched]
+    if not names:
+        return {}
+
+    missing = [name for name in names if name not in existing]
+    if missing:
+        create_schema(engine, missing)
+
+    refreshed = {}
+    for fact, races in touched.items():
+        if races is not None and not len(races):
+            continue
+
+        with engine.connect() as conn:
+            races = None if races is None else {int(r) for r in races}
+            years = None if races is None else _touched_years(conn, races)
+            data = _read_fact(conn, fact, years)
+
+        for name, (source, grain, build) in AGGREGATES.items():
+            if source != fact:
+                continue
+            with span(f'aggregate_{name}', rows_in=len(data), grain=grain) as stage:
+                rows = data if races is None or grain == 'season' else data[data['race_id'].isin(races)]
+                frame = build(rows) if len(rows) else pd.DataFrame()
+                values = races if grain == 'race' else years
+                _replace(engine, name, GRAIN_KEYS[grain], values, frame)
+                stage.update(rows_out=len(frame), keys=None if values is None else len(values))
+                refreshed[name] = len(frame)
+
+    return refreshed
+
+
+if __name__ == '__main__':
+
+    from connections import get_connection, load_db_config
+
+    parser = argparse.ArgumentParser(description='Rebuild the summary tables of a data mart.')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default=None, help='Database to use (the one of config.json by default).')
+    parser.add_argument('--facts', nargs='+', default=['qualifying', 'pit_stops', 'results'],
+                        help='Fact tables whose summary tables are rebuilt.')
+    args = parser.parse_args()
+
+    engine = get_connection(load_db_config(args.config), args.database)
+    for table, rows in refresh_aggregates(engine, {fact: None for fact in args.facts}).items():
+        log('aggregates', f"{table}: {rows} rows.")
@@ -0,0 +1,207 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time as _time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from data_preparation import transform_date
+from instrumentation import current_rss, log, max_rss
+from pipeline import DIMENSIONS, FACTS, load_mart_dimensions, mart_dimensions, prepare_dimensions
+from schema import create_schema
+from source_schemas import SOURCE_FILES, read_source, source_path
+from synthetic_data import generate
+
+
+SCALES = [1, 10, 100]
+BENCHMARK_DIR = '.benchmark'
+MART = 'formula1'
+
+
+# Keeps the highest resident memory seen in peak[0] until stop is set.
+# tracemalloc is not used: it slows pandas down too much to time it.
+def _sample_rss(stop, peak, interval=0.005):
+    while not stop.is_set():
+        peak[0] = max(peak[0], current_rss())
+        stop.wait(interval)
+
+
+def _version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+# Runs func once and records its wall and CPU time, the rows it handled per
+# second and how far the resident memory rose above its level at the start.
+# The pipeline output is kept out of the benchmark log unless verbose is set.
+def measure(stages, name, func, rows=None, verbose=False):
+
+    start_rss = current_rss()
+    peak, stop = [start_rss], threading.Event()
+    sampler = threading.Thread(target=_sample_rss, args=(stop, peak), daemon=True)
+    sampler.start()
+    wall, cpu = _time.perf_counter(), _time.process_time()
+
+    try:
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+    finally:
+        wall, cpu = _time.perf_counter() - wall, _time.process_time() - cpu
+        stop.set()
+        sampler.join()
+    peak = max(peak[0], current_rss()) - start_rss
+
+    if rows is None and isinstance(result, pd.DataFrame):
+        rows = len(result)
+
+    stage = {
+        'stage': name,
+        'rows': rows,
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu, 4),
+        'rows_per_s': round(rows / wall) if rows and wall > 0 else None,
+        'peak_mb': round(peak / 1024 / 1024, 2),
+    }
+    stages.append(stage)
+    log('benchmark', f"{name:<24} {wall:>8.3f}s  {stage['rows_per_s'] or 0:>10} rows/s  {stage['peak_mb']:>8.1f} MB")
+
+    return result
+
+
+def synthetic_dir(scale, root=BENCHMARK_DIR, seed=42):
+
+    out_dir = os.path.join(root, f"data_{scale}x")
+    if not all(os.path.exists(source_path(name, out_dir)) for name in SOURCE_FILES):
+        generate(out_dir, scale, seed)
+
+    return out_dir
+
+
+# Times every stage of the formula1 mart on the files of data_dir: reading each
+# CSV, transform_date, preparing and loading the dimensions, and preparing and
+# loading each fact table into a fresh SQLite database (or db_url).
+def run_benchmark(data_dir, db_url=None, strategy='auto', backend='pandas', verbose=False):
+
+    stages = []
+    work_dir = None
+
+    if db_url is None:
+        work_dir = tempfile.mkdtemp(prefix='benchmark_')
+        engine = create_engine(f"sqlite:///{os.path.join(work_dir, 'formula1.db')}")
+        create_schema(engine)
+    else:
+        engine = create_engine(db_url)
+
+    try:
+        needed = {DIMENSIONS[d][0] for d in mart_dimensions(MART)} | set(FACTS)
+        sources = {}
+        for name in sorted(needed):
+            sources[name] = measure(stages, f'read_{name}', lambda: read_source(name, data_dir), verbose=verbose)
+
+        sources['races'] = measure(stages, 'transform_date', lambda: transform_date(sources['races'], date_col='date'),
+                                   verbose=verbose)
+
+        prepared = measure(stages, 'prepare_dimensions', lambda: prepare_dimensions(sources, [MART]),
+                           rows=sum(len(sources[DIMENSIONS[d][0]]) for d in mart_dimensions(MART)), verbose=verbose)
+        registry = measure(stages, 'load_dimensions', lambda: load_mart_dimensions(engine, MART, prepared),
+                           rows=sum(len(data) for data, _ in prepared.values()), verbose=verbose)
+
+        for fact in FACTS:
+            data = measure(stages, f'prepare_{fact}',
+                           lambda: FACTS[fact]['prepare'](sources, sources[fact], registry, backend), verbose=verbose)
+            measure(stages, f'load_{fact}', lambda: FACTS[fact]['load'](engine, data, strategy),
+                    rows=len(data), verbose=verbose)
+    finally:
+        engine.dispose()
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return stages
+
+
+def run_suite(scales=SCALES, output='benchmark_results.json', db_url=None, strategy='auto', backend='pandas',
+              root=BENCHMARK_DIR, verbose=False):
+
+    report = {
+        'version': _version(),
+        'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'backend': backend,
+        'strategy': strategy,
+        'database': 'sqlite' if db_url is None else db_url.split(':', 1)[0],
+        'runs': [],
+    }
+
+    for scale in scales:
+        log('benchmark', f"==== scale {scale}x ====")
+        data_dir = synthetic_dir(scale, root)
+        stages = run_benchmark(data_dir, db_url, strategy, backend, verbose)
+        report['runs'].append({
+            'scale': scale,
+            'total_s': round(sum(s['wall_s'] for s in stages), 4),
+            'max_rss_mb': round(max_rss() / 1024 / 1024, 1),
+            'stages': stages,
+        })
+
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    log('benchmark', f"Results saved to {output}")
+
+    return report
+
+
+# Prints the wall time of every stage of two result files side by side.
+def compare(old_file, new_file):
+
+    with open(old_file) as file:
+        old = json.load(file)
+    with open(new_file) as file:
+        new = json.load(file)
+
+    print(f"{'scale':>6} {'stage':<24} {old['version'] or 'old':>10} {new['version'] or 'new':>10} {'ratio':>7}")
+    for new_run in new['runs']:
+        old_run = next((r for r in old['runs'] if r['scale'] == new_run['scale']), None)
+        if old_run is None:
+            continue
+        old_stages = {s['stage']: s for s in old_run['stages']}
+        for stage in new_run['stages']:
+            before = old_stages.get(stage['stage'])
+            if before is None:
+                continue
+            ratio = stage['wall_s'] / before['wall_s'] if before['wall_s'] else float('nan')
+            print(f"{new_run['scale']:>5}x {stage['stage']:<24} {before['wall_s']:>9.3f}s {stage['wall_s']:>9.3f}s "
+                  f"{ratio:>6.2f}x")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Time every stage of the pipeline on synthetic data.')
+    parser.add_argument('--scales', type=float, nargs='+', default=SCALES,
+                        help='Sizes to run, as multiples of the files in Data/.')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file for the results.')
+    parser.add_argument('--db-url', default=None,
+                        help='SQLAlchemy URL of the database to load (a new SQLite file by default).')
+    parser.add_argument('--strategy', default='auto', help='Load strategy of the fact tables.')
+    parser.add_argument('--backend', choices=['pandas', 'duckdb'], default='pandas')
+    parser.add_argument('--data-root', default=BENCHMARK_DIR, help='Folder for the synthetic CSV files.')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the pipeline.')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files and exit.')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        scales = [int(s) if s == int(s) else s for s in args.scales]
+        run_suite(scales, args.output, args.db_url, args.strategy, args.backend, args.data_root, args.verbose)
@@ -0,0 +1,221 @@
+import csv
+import os
+import tempfile
+import time as _time
+
+import pandas as pd
+
+from instrumentation import log, span
+
+
+# Fastest strategy found by benchmark_strategies() for every table.
+_best_strategy = {}
+
+
+# Converts every column to a list of plain Python values (None for nulls), so
+# any DBAPI driver can bind them. It works column by column, not cell by cell.
+def _column_values(df):
+
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+        columns.append(series.astype(object).where(series.notna(), None).tolist())
+
+    return columns
+
+
+def _placeholder(conn):
+    return '?' if conn.dialect.paramstyle in ('qmark', 'numeric') else '%s'
+
+
+# Raw DBAPI executemany with one INSERT statement reused for every row.
+def load_executemany(conn, table, df, chunksize=50000):
+
+    columns = ', '.join(df.columns)
+    values = ', '.join([_placeholder(conn)] * len(df.columns))
+    sql = f'INSERT INTO {table} ({columns}) VALUES ({values})'
+
+    for start in range(0, len(df), chunksize):
+        chunk = df.iloc[start:start + chunksize]
+        with span('load_chunk', rows_in=len(chunk), echo=False, table=table, strategy='executemany', offset=start):
+            rows = list(zip(*_column_values(chunk)))
+            if rows:
+                conn.exec_driver_sql(sql, rows)
+
+
+# Writes the rows of the frame to a CSV file for LOAD DATA, with NULL for nulls.
+# With pyarrow the columns are written straight from their buffers (categoricals
+# as their values), without turning every cell into a Python object.
+def _write_csv(df, path):
+
+    dates = {col: df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+             for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])}
+    out = df.assign(**dates) if dates else df
+
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            out.to_csv(file, index=False, header=False, na_rep='NULL',
+                       quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        return
+
+    arrow_table = pa.Table.from_pandas(out, preserve_index=False)
+    arrow_table = arrow_table.cast(pa.schema([
+        pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else field
+        for field in arrow_table.schema]))
+    pa_csv.write_csv(arrow_table, path, pa_csv.WriteOptions(include_header=False, null_string='NULL'))
+
+
+# MySQL LOAD DATA LOCAL INFILE from a temporary CSV file. The engine must be
+# created with local_infile enabled and the server must allow it.
+def load_data_infile(conn, table, df, chunksize=None):
+
+    if conn.dialect.name != 'mysql':
+        raise NotImplementedError(f"LOAD DATA is not available for {conn.dialect.name}.")
+
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        os.close(handle)
+        _write_csv(df, path)
+
+        columns = ', '.join(df.columns)
+        with span('load_chunk', rows_in=len(df), echo=False, table=table, strategy='load_data', offset=0):
+            conn.exec_driver_sql(
+                f"LOAD DATA LOCAL INFILE '{path.replace(os.sep, '/')}' INTO TABLE {table} "
+                f"CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                f"LINES TERMINATED BY '\\n' ({columns})"
+            )
+    finally:
+        os.remove(path)
+
+
+# The previous pandas path, kept as the fallback strategy.
+def load_to_sql(conn, table, df, chunksize=50000):
+    if conn.dialect.name == 'sqlite':
+        # SQLite caps the number of bound variables of a single statement.
+        chunksize = min(chunksize, 32766 // max(len(df.columns), 1))
+    # An empty frame still goes through to_sql once, so a missing table is created.
+    for start in range(0, max(len(df), 1), chunksize):
+        chunk = df.iloc[start:start + chunksize]
+        with span('load_chunk', rows_in=len(chunk), echo=False, table=table, strategy='to_sql', offset=start):
+            chunk.to_sql(table, con=conn, if_exists='append', index=False, chunksize=chunksize, method='multi')
+
+
+STRATEGIES = {
+    'load_data': load_data_infile,
+    'executemany': load_executemany,
+    'to_sql': load_to_sql,
+}
+
+
+# Strategies that can run on the given engine, fastest first.
+def available_strategies(engine):
+    if engine.dialect.name == 'mysql':
+        return ['load_data', 'executemany', 'to_sql']
+    return ['executemany', 'to_sql']
+
+
+# Times every available strategy on a sample of the frame. Each attempt runs in
+# a transaction that is rolled back, so nothing is left in the table.
+def benchmark_strategies(engine, table, df, sample_rows=5000):
+
+    sample = df.head(sample_rows)
+    timings = {}
+
+    for name in available_strategies(engine):
+        with engine.connect() as conn:
+            trans = conn.begin()
+            start = _time.perf_counter()
+            try:
+                STRATEGIES[name](conn, table, sample)
+            except Exception as ex:
+                log('bulk_load', f"{name} is not usable for {table}: {ex}")
+                continue
+            else:
+                timings[name] = _time.perf_counter() - start
+            finally:
+                trans.rollback()
+
+    if timings:
+        _best_strategy[table] = min(timings, key=timings.get)
+        log('bulk_load', f"Timings for {table} on {len(sample)} rows: "
+                         + ', '.join(f"{k}={v:.3f}s" for k, v in timings.items())
+                         + f" -> using {_best_strategy[table]}.")
+
+    return timings
+
+
+def _resolve_strategies(engine, table, df, strategy):
+
+    if strategy == 'benchmark':
+        if table not in _best_strategy:
+            benchmark_strategies(engine, table, df)
+        strategy = _best_strategy.get(table, 'auto')
+
+    if strategy == 'auto':
+        return available_strategies(engine)
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown load strategy “{strategy}”. Use one of {list(STRATEGIES)}, 'auto' or 'benchmark'.")
+
+    return [strategy]
+
+
+# Appends the frame to the table in a single transaction using the chosen
+# strategy: 'load_data', 'executemany', 'to_sql', 'auto' (fastest one the
+# engine supports) or 'benchmark' (fastest one measured for this table).
+# In 'auto' mode, if LOAD DATA is refused by the server the next strategy is used.
+# in_transaction, if given, is called with the connection before the commit,
+# so its statements are committed (or rolled back) together with the rows.
+def bulk_load(engine, table, df, strategy='auto', chunksize=50000, in_transaction=None):
+
+    candidates = _resolve_strategies(engine, table, df, strategy)
+
+    for i, name in enumerate(candidates):
+        try:
+            with engine.begin() as conn:
+                STRATEGIES[name](conn, table, df, chunksize)
+                if in_transaction is not None:
+                    in_transaction(conn)
+        except Exception as ex:
+            if name != 'load_data' or i == len(candidates) - 1:
+                raise
+            log('bulk_load', f"{name} failed for {table} ({ex}), falling back to {candidates[i + 1]}.")
+        else:
+            return name
+
+
+# Inserts the rows of the frame, updating the other columns of the rows whose
+# unique key already exists (ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT on SQLite).
+# By default every column outside the key is updated.
+def upsert_rows(conn, table, df, key_columns, update_columns=None, chunksize=50000):
+
+    columns = ', '.join(df.columns)
+    values = ', '.join([_placeholder(conn)] * len(df.columns))
+    if update_columns is None:
+        update_columns = [c for c in df.columns if c not in key_columns]
+    updates = list(update_columns)
+
+    if conn.dialect.name == 'mysql':
+        if updates:
+            clause = ' ON DUPLICATE KEY UPDATE ' + ', '.join(f'{c} = VALUES({c})' for c in updates)
+        else:
+            clause = ' ON DUPLICATE KEY UPDATE ' + f'{key_columns[0]} = {key_columns[0]}'
+    else:
+        target = ', '.join(key_columns)
+        if updates:
+            clause = f' ON CONFLICT ({target}) DO UPDATE SET ' + ', '.join(f'{c} = excluded.{c}' for c in updates)
+        else:
+            clause = f' ON CONFLICT ({target}) DO NOTHING'
+
+    sql = f'INSERT INTO {table} ({columns}) VALUES ({values}){clause}'
+
+    for start in range(0, len(df), chunksize):
+        rows = list(zip(*_column_values(df.iloc[start:start + chunksize])))
+        if rows:
+            conn.exec_driver_sql(sql, rows)
@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import random
+import time as _time
+
+import pandas as pd
+from sqlalchemy import exc, inspect, text
+
+from bulk_load import bulk_load
+from fingerprint import drop_loaded
+from instrumentation import log, record, span
+
+
+CHECKPOINT_TABLE = 'load_checkpoint'
+
+DEFAULT_BATCH_SIZE = 50000
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+
+# MySQL errors worth retrying: lock wait timeout, deadlock, server gone away,
+# lost connection, too many connections.
+TRANSIENT_MYSQL_ERRORS = {1040, 1205, 1213, 2003, 2006, 2013}
+
+
+def ensure_checkpoint_table(engine):
+
+    if CHECKPOINT_TABLE in inspect(engine).get_table_names():
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE {CHECKPOINT_TABLE} ("
+            "run_id VARCHAR(64), table_name VARCHAR(64), batch_number INT, row_count INT, "
+            "committed_at DATETIME, PRIMARY KEY (run_id, table_name, batch_number))"
+        ))
+
+
+# Identifies a load by the table, the batch size and the content of the frame,
+# so running the same load again after a failure finds its checkpoints.
+def run_id(table, df, batch_size):
+
+    digest = hashlib.sha256(f"{table}:{batch_size}:{list(df.columns)}".encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+    return digest.hexdigest()[:16]
+
+
+def committed_batches(engine, run, table):
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT batch_number FROM {CHECKPOINT_TABLE} WHERE run_id = :run AND table_name = :table_name"),
+            {'run': run, 'table_name': table},
+        )
+        return {row[0] for row in rows}
+
+
+def is_transient(ex):
+
+    if isinstance(ex, exc.DBAPIError) and ex.connection_invalidated:
+        return True
+    if isinstance(ex, exc.OperationalError):
+        code = ex.orig.args[0] if ex.orig is not None and ex.orig.args else None
+        if isinstance(code, int):
+            return code in TRANSIENT_MYSQL_ERRORS
+        # SQLite reports a busy database as an OperationalError without a code
+        return 'locked' in str(ex.orig) or 'busy' in str(ex.orig)
+    return False
+
+
+# Calls func, retrying transient database errors up to max_retries times with
+# exponential backoff and jitter. Other errors are raised at once.
+def with_retry(func, max_retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, what='operation'):
+
+    for attempt in range(max_retries + 1):
+        try:
+            return func()
+        except Exception as ex:
+            if attempt == max_retries or not is_transient(ex):
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random() / 2)
+            log('checkpoints', f"{what} failed ({ex.__class__.__name__}), "
+                               f"retry {attempt + 1}/{max_retries} in {delay:.1f}s.")
+            _time.sleep(delay)
+
+
+# Appends one batch and its checkpoint row in the same transaction.
+def commit_batch(engine, table, batch, run, number, strategy='auto', max_retries=MAX_RETRIES,
+                 backoff=BACKOFF_SECONDS):
+
+    def checkpoint(conn):
+        conn.execute(
+            text(f"INSERT INTO {CHECKPOINT_TABLE} (run_id, table_name, batch_number, row_count, committed_at) "
+                 "VALUES (:run, :table_name, :batch_number, :row_count, :committed_at)"),
+            {'run': run, 'table_name': table, 'batch_number': number, 'row_count': len(batch),
+             'committed_at': pd.Timestamp.now().to_pydatetime()},
+        )
+
+    with span('load_batch', rows_in=len(batch), echo=False, table=table, run_id=run, batch=number) as stage:
+        stage['strategy'] = with_retry(
+            lambda: bulk_load(engine, table, batch, strategy=strategy, in_transaction=checkpoint),
+            max_retries, backoff, what=f"{table} batch {number}",
+        )
+        return stage['strategy']
+
+
+# Loads the frame in numbered batches of batch_size rows, each committed in its
+# own transaction together with its checkpoint. Batches already committed by
+# an earlier attempt of the same run are skipped, so after a failure the load
+# resumes from the first missing batch. The run and its batches come from the
+# whole frame: the rows already in the table are only dropped from each batch
+# before it is written (drop_loaded()), so a second attempt numbers its batches
+# as the first one did. Returns the strategy of the last batch.
+def load_in_batches(engine, table, df, strategy='auto', batch_size=DEFAULT_BATCH_SIZE, max_retries=MAX_RETRIES,
+                    backoff=BACKOFF_SECONDS):
+
+    ensure_checkpoint_table(engine)
+    run = run_id(table, df, batch_size)
+    done = committed_batches(engine, run, table)
+    batches = range(0, len(df), batch_size)
+
+    if done:
+        log('checkpoints', f"{table}: resuming run {run}, {len(done)} of {len(batches)} batches already committed.")
+
+    used, already_loaded = None, 0
+    for number, start in enumerate(batches):
+        batch = df.iloc[start:start + batch_size]
+        if number in done:
+            already_loaded += len(batch)
+            continue
+        new_rows = drop_loaded(engine, table, batch)
+        already_loaded += len(batch) - len(new_rows)
+        used = commit_batch(engine, table, new_rows, run, number, strategy, max_retries, backoff)
+
+    record(already_loaded=already_loaded)
+    return used or strategy
+
+
+# Wraps sink-style writes (one call per chunk, as stream_fact does) in
+# checkpointed batches: call number n is batch n of the run, and calls already
+# committed by an earlier attempt are skipped.
+def checkpointed_sink(engine, table, run, strategy='auto', max_retries=MAX_RETRIES, backoff=BACKOFF_SECONDS):
+
+    ensure_checkpoint_table(engine)
+    done = committed_batches(engine, run, table)
+    counter = [0]
+
+    if done:
+        log('checkpoints', f"{table}: resuming run {run}, skipping {len(done)} committed chunks.")
+
+    def sink(chunk):
+        number = counter[0]
+        counter[0] += 1
+        if number not in done:
+            commit_batch(engine, table, chunk, run, number, strategy, max_retries, backoff)
+
+    return sink
+
+
+# Committed batches and rows of every run, optionally of one table.
+def manifest(engine, table=None):
+
+    query = (f"SELECT run_id, table_name, COUNT(*) AS batches, SUM(row_count) AS row_count, "
+             f"MIN(committed_at) AS first_commit, MAX(committed_at) AS last_commit FROM {CHECKPOINT_TABLE}")
+    params = {}
+    if table:
+        query += " WHERE table_name = :table_name"
+        params['table_name'] = table
+    query += " GROUP BY run_id, table_name ORDER BY last_commit"
+
+    return pd.read_sql(text(query), con=engine, params=params)
+
+
+def clear(engine, table=None, run=None):
+
+    query, params = f"DELETE FROM {CHECKPOINT_TABLE} WHERE 1 = 1", {}
+    if table:
+        query += " AND table_name = :table_name"
+        params['table_name'] = table
+    if run:
+        query += " AND run_id = :run"
+        params['run'] = run
+
+    with engine.begin() as conn:
+        deleted = conn.execute(text(query), params).rowcount
+
+    log('checkpoints', f"Removed {deleted} checkpoints.")
+
+
+if __name__ == '__main__':
+
+    from connections import get_connection, load_db_config
+
+    parser = argparse.ArgumentParser(description='Show or clear the checkpoints of the batched fact loads.')
+    parser.add_argument('command', choices=['status', 'clear'])
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default=None, help='Database to inspect (the one of config.json by default).')
+    parser.add_argument('--table', default=None)
+    parser.add_argument('--run', default=None, help='Run id to clear.')
+    args = parser.parse_args()
+
+    engine = get_connection(load_db_config(args.config), args.database)
+    ensure_checkpoint_table(engine)
+
+    if args.command == 'status':
+        print(manifest(engine, args.table).to_string(index=False))
+    else:
+        clear(engine, args.table, args.run)
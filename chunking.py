@@ -0,0 +1,15 @@
+import numpy as np
+
+
+# Values per IN list of the queries that select or delete rows by race, season
+# or row hash, so no statement grows with the size of a load.
+IN_LIST_SIZE = 1000
+
+
+# The distinct integers of values (ids, years or hashes) in ascending order,
+# as lists of at most size plain Python ints to bind to an IN list.
+def chunked(values, size=IN_LIST_SIZE):
+
+    values = np.unique(np.fromiter(values, dtype='int64')).tolist()
+
+    return [values[start:start + size] for start in range(0, len(values), size)]
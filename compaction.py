@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from fingerprint import HASH_COLUMN
+from instrumentation import span
+from source_schemas import has_pyarrow
+
+
+# Text columns whose distinct values are at most this share of their non-null
+# values become categoricals; the others become Arrow strings (when pyarrow is
+# installed).
+CATEGORY_RATIO = 0.5
+
+# Columns that must keep their type (row_hash is a full 64-bit value).
+KEEP = {HASH_COLUMN}
+
+_SIGNED = [('int8', 'Int8'), ('int16', 'Int16'), ('int32', 'Int32'), ('int64', 'Int64')]
+
+
+def memory_usage(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+# Smallest signed integer type (numpy, or nullable when there are nulls) that
+# holds every value of the column.
+def _smallest_int(values, nullable):
+
+    if values.empty:
+        low = high = 0
+    else:
+        low, high = int(values.min()), int(values.max())
+
+    for numpy_dtype, nullable_dtype in _SIGNED:
+        info = np.iinfo(numpy_dtype)
+        if info.min <= low and high <= info.max:
+            return nullable_dtype if nullable else numpy_dtype
+
+
+def _compact_column(series, category_ratio, arrow_strings):
+
+    dtype = series.dtype
+
+    if pd.api.types.is_bool_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+        return series
+
+    if pd.api.types.is_integer_dtype(dtype):
+        nullable = pd.api.types.is_extension_array_dtype(dtype)
+        return series.astype(_smallest_int(series.dropna(), nullable))
+
+    if pd.api.types.is_float_dtype(dtype):
+        values = series.dropna()
+        # Whole numbers stored as floats (ids, positions) become nullable integers
+        if (values == np.floor(values)).all() and (values.abs() < 2 ** 53).all():
+            return series.astype(_smallest_int(values, nullable=True))
+        as_float32 = series.astype('float32')
+        if (as_float32.astype('float64') == series)[series.notna()].all():
+            return as_float32
+        return series
+
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+            # Other objects (e.g. datetime.time) are left alone
+            return series
+        values = series.count()
+        if values and series.nunique() <= category_ratio * values:
+            return series.astype('category')
+        if arrow_strings:
+            return series.astype('string[pyarrow]')
+
+    return series
+
+
+# Returns a copy of the frame with every column in the smallest type that holds
+# its values: integers as int8/16/32 (Int8/16/32 when nullable), whole-number
+# floats as nullable integers, floats as float32 when no precision is lost,
+# repetitive text as categoricals and other text as Arrow strings. Dates and
+# the columns in KEEP keep their type. Values are not changed.
+def compact(df, category_ratio=CATEGORY_RATIO, arrow_strings=None):
+
+    if arrow_strings is None:
+        arrow_strings = has_pyarrow()
+
+    return pd.DataFrame({col: df[col] if col in KEEP else _compact_column(df[col], category_ratio, arrow_strings)
+                         for col in df.columns}, index=df.index)
+
+
+# Compacts every frame of the dict inside a span that records its size before
+# and after, and returns the new dict. The sizes before (bytes) are also stored
+# in the sizes dict when one is given, for memory_report().
+def compact_frames(frames, prefix='compact', sizes=None):
+
+    compacted = {}
+    for name, df in frames.items():
+        with span(f'{prefix}_{name}', rows_in=len(df), echo=False) as stage:
+            before = memory_usage(df)
+            compacted[name] = compact(df)
+            after = memory_usage(compacted[name])
+            stage.update(rows_out=len(df), mb_before=round(before / 1024 / 1024, 2),
+                         mb_after=round(after / 1024 / 1024, 2))
+        if sizes is not None:
+            sizes[name] = before
+
+    return compacted
+
+
+# Rows, columns and deep memory size (MB) of every frame, optionally next to
+# its size before compaction (bytes per frame name), largest first.
+def memory_report(frames, before=None):
+
+    rows = []
+    for name, df in frames.items():
+        row = {'frame': name, 'rows': len(df), 'columns': df.shape[1], 'mb': memory_usage(df) / 1024 / 1024}
+        if before is not None and name in before:
+            row['mb_before'] = before[name] / 1024 / 1024
+            row['saved'] = 1 - row['mb'] / row['mb_before'] if row['mb_before'] else 0.0
+        rows.append(row)
+
+    report = pd.DataFrame(rows)
+    if report.empty:
+        return report
+
+    return report.sort_values('mb', ascending=False).round(3).reset_index(drop=True)
@@ -0,0 +1,61 @@
+import json
+import threading
+
+from sqlalchemy import URL, create_engine
+
+
+# Pool settings of every engine; a "pool" object in config.json overrides them.
+# pool_size also bounds how many dimension tables are loaded at the same time.
+POOL_SETTINGS = {
+    'pool_size': 5,           # connections kept open per database
+    'max_overflow': 5,        # extra connections allowed under load
+    'pool_recycle': 1800,     # seconds; reconnect before MySQL's wait_timeout closes the connection
+    'pool_pre_ping': True,    # test every connection taken from the pool and replace dead ones
+    'pool_timeout': 30,       # seconds to wait for a free connection
+}
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def load_db_config(config_file='config.json'):
+    with open(config_file, 'r') as file:
+        return json.load(file)
+
+
+def pool_settings(db_config):
+    return {**POOL_SETTINGS, **db_config.get('pool', {})}
+
+
+# Engine of the given database (the one of config.json by default). Engines are
+# kept per server, user and database, so every mart, loader and thread of a run
+# shares the same connection pool.
+def get_connection(db_config, database=None):
+
+    database = database or db_config['database']
+    settings = pool_settings(db_config)
+    key = (db_config['user'], db_config['host'], db_config['port'], database, tuple(sorted(settings.items())))
+
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(
+                URL.create('mysql+pymysql', username=db_config['user'], password=db_config['password'],
+                           host=db_config['host'], port=db_config['port'], database=database),
+                connect_args={'local_infile': True},
+                **settings,
+            )
+            _engines[key] = engine
+
+    return engine
+
+
+# Closes the connections of every cached engine (at the end of a run).
+def dispose_all():
+
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+
+    for engine in engines:
+        engine.dispose()
@@ -1,17 +1,5 @@
 import pandas as pd
-import datetime
-import time as _time
-import numpy as np
-
-
-def _log_q(msg):
-    print(f"[prepare_qualifying_data] {msg}")
-
-def _log_r(msg):
-    print(f"[prepare_results_data] {msg}")
-
-def _log_p(msg):
-    print(f"[prepare_pit_stops_data] {msg}")
+from fact_specs import prepare_fact
 
 
 # Standardizes various null representations in a DataFrame to None.
@@ -26,7 +14,8 @@ def handle_nulls(df, columns_to_clean=None, null_markers=None):
         columns_to_clean = df.columns
     
     for col in columns_to_clean:
-        if col in df.columns:
+        # Typed columns (read with a schema) cannot hold text markers.
+        if col in df.columns and df[col].dtype == object:
             df[col] = df[col].replace(null_markers, None)
     
     return df
@@ -125,9 +114,12 @@ def transform_date(race_df, date_col='date', overwrite=False):
     if date_col not in df.columns:
         raise KeyError(f"The column “{date_col}” does not exist in the DataFrame.")
 
-    df[date_col] = df[date_col].replace({'\\N': None, 'null': None, '': None})
-    
-    parsed = pd.to_datetime(df[date_col], format='%Y-%m-%d', errors='coerce')
+    if pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        # Already parsed while reading the file.
+        parsed = df[date_col]
+    else:
+        df[date_col] = df[date_col].replace({'\\N': None, 'null': None, '': None})
+        parsed = pd.to_datetime(df[date_col], format='%Y-%m-%d', errors='coerce')
 
     df['RACE_DATE'] = parsed
 
@@ -183,211 +175,27 @@ def prepare_status_data(status_data):
 
 
 
+# The fact tables are built by the engine of fact_specs.py from their mapping
+# spec; these functions keep the signature of the original preparers.
 def prepare_qualifying_data(qualifying_data, drivers_csv, constructors_csv, races_csv, circuits_csv,
-                            circuit_db, constructor_db, race_db, driver_db):
+                            registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'constructors': constructors_csv, 'races': races_csv, 'circuits': circuits_csv}
+    return prepare_fact('qualifying', qualifying_data, sources, registry, source_maps)
 
-    _log_q("Preparing qualifying data (with circuit_id by circuit name)...")
-    
-    df = qualifying_data.copy()
-    
-    drivers_csv_temp = drivers_csv[['driverId', 'forename', 'surname', 'dob']].rename(columns={
-        'forename': 'driver_name', 'surname': 'driver_surname', 'dob': 'date_of_birth'
-    })
-    drivers_csv_temp['date_of_birth'] = pd.to_datetime(drivers_csv_temp['date_of_birth'], errors='coerce')
-    constructors_csv_temp = constructors_csv[['constructorId', 'name']].rename(columns={'name': 'constructor_name'})
-    races_csv_temp = races_csv[['raceId', 'year', 'name']].rename(columns={'name': 'race_name'})
-    race_circuit_names = races_csv[['raceId', 'circuitId']].merge(
-        circuits_csv[['circuitId', 'name']], on='circuitId', how='left'
-    ).rename(columns={'name': 'circuit_name'}).drop(columns=['circuitId'])
 
-    
-    df = df.merge(drivers_csv_temp, on='driverId', how='left')
-    df = df.merge(constructors_csv_temp, on='constructorId', how='left')
-    df = df.merge(races_csv_temp, on='raceId', how='left')
-    df = df.merge(race_circuit_names, on='raceId', how='left')
-    df.drop(columns=['driverId', 'constructorId', 'raceId'], inplace=True, errors='ignore')
-    
-    # Delete rows where the key (circuit_name) is null
-    df = remove_rows_with_missing_keys(df, key_columns=['circuit_name'], logger_func=_log_q)
-    _log_q("Mapping new IDs...")
-    
-    driver_db['date_of_birth'] = pd.to_datetime(driver_db['date_of_birth'], errors='coerce')
-    df['date_of_birth'] = pd.to_datetime(df['date_of_birth'], errors='coerce')
-    df = df.merge(driver_db[['driver_id', 'driver_name', 'driver_surname', 'date_of_birth']],
-                  on=['driver_name', 'driver_surname', 'date_of_birth'], how='left')
-    df.drop(columns=['driver_name', 'driver_surname', 'date_of_birth'], inplace=True, errors='ignore')
-
-    df = df.merge(constructor_db[['constructor_id', 'constructor_name']],
-                  on='constructor_name', how='left')
-    df.drop(columns=['constructor_name'], inplace=True, errors='ignore')
-
-    df = df.merge(race_db[['race_id', 'year', 'race_name']],
-                  on=['year', 'race_name'], how='left')
-    df.drop(columns=['year', 'race_name'], inplace=True, errors='ignore')
-                  
-    circuit_db['circuit_name_clean'] = circuit_db['circuit_name'].astype(str).str.strip().str.lower()
-    df['circuit_name_clean'] = df['circuit_name'].astype(str).str.strip().str.lower()
-    df = df.merge(circuit_db[['circuit_id', 'circuit_name_clean']],
-                  on='circuit_name_clean', how='left')
-    df.drop(columns=['circuit_name', 'circuit_name_clean'], inplace=True, errors='ignore')
+def prepare_pit_stops_data(pit_stops_data, drivers_csv, races_csv,
+                           registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'races': races_csv}
+    return prepare_fact('pit_stops', pit_stops_data, sources, registry, source_maps)
 
-    
-    rename_map = {'q1': 'q1', 'q2': 'q2', 'q3': 'q3'}
-    df = df.rename(columns=rename_map)
-    needed_columns = ['circuit_id', 'constructor_id', 'race_id', 'driver_id', 'q1', 'q2', 'q3']
-    existing_cols = [c for c in needed_columns if c in df.columns]
-    result = df[existing_cols].copy()
-    for col in ['circuit_id', 'constructor_id', 'race_id', 'driver_id']:
-        if col in result.columns:
-            result[col] = pd.to_numeric(result[col], errors='coerce').astype('Int64')
-    null_counts = result[['driver_id', 'constructor_id', 'race_id', 'circuit_id']].isna().sum()
-    if null_counts.any():
-        _log_q(f"WARNING: Unmapped IDs:\n{null_counts[null_counts > 0]}")
-    else:
-        _log_q("All IDs correctly mapped.")
-    return result.drop_duplicates()
 
+def prepare_lap_times_data(lap_times_data, drivers_csv, races_csv,
+                           registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'races': races_csv}
+    return prepare_fact('lap_times', lap_times_data, sources, registry, source_maps)
 
-def prepare_pit_stops_data(pit_stops_data, drivers_csv, races_csv,
-                           race_db, driver_db):
-   
-    _log_p("Preparing pit stop data...")
-    
-    df = pit_stops_data.copy()
-    
-
-    drivers_csv_temp = drivers_csv[['driverId', 'forename', 'surname', 'dob']].rename(columns={
-        'forename': 'driver_name', 'surname': 'driver_surname', 'dob': 'date_of_birth'
-    })
-    drivers_csv_temp['date_of_birth'] = pd.to_datetime(drivers_csv_temp['date_of_birth'], errors='coerce')
-    
-    races_csv_temp = races_csv[['raceId', 'year', 'name']].rename(columns={'name': 'race_name'})
-    
-    results_csv = pd.read_csv("Data/results.csv")
-    race_driver_to_constructor = results_csv[['raceId', 'driverId']].drop_duplicates()
-        
-    
-    df = df.merge(drivers_csv_temp, on='driverId', how='left')
-    
-    df = df.merge(races_csv_temp, on='raceId', how='left')
-    
-    df = df.merge(race_driver_to_constructor, on=['raceId', 'driverId'], how='left')
-        
-    df.drop(columns=['driverId', 'forename', 'surname', 'raceId'], inplace=True, errors='ignore')
-    
-        
-    _log_p("Mapping new IDs...")
-    
-    driver_db['date_of_birth'] = pd.to_datetime(driver_db['date_of_birth'], errors='coerce')
-    df['date_of_birth'] = pd.to_datetime(df['date_of_birth'], errors='coerce')
-    df = df.merge(driver_db[['driver_id', 'driver_name', 'driver_surname', 'date_of_birth']],
-                  on=['driver_name', 'driver_surname', 'date_of_birth'], how='left')
-    df.drop(columns=['driver_name', 'driver_surname', 'date_of_birth'], inplace=True, errors='ignore')
-
-    df = df.merge(race_db[['race_id', 'year', 'race_name']],
-                  on=['year', 'race_name'], how='left')
-    df.drop(columns=['year', 'race_name'], inplace=True, errors='ignore')
-                  
-        
-    rename_map = {
-        'stop': 'stop_number', 'lap': 'lap_number', 'time': 'stop_time', 'milliseconds': 'stop_duration'
-    }
-    df = df.rename(columns=rename_map)
-    
-    needed_columns = ['race_id', 'driver_id', 'stop_number', 'lap_number', 'stop_time', 'stop_duration']
-    existing_cols = [c for c in needed_columns if c in df.columns]
-    result = df[existing_cols].copy()
-    
-    null_counts = result[['driver_id','race_id']].isna().sum()
-    if null_counts.any():
-        _log_p(f"WARNING: Unmapped IDs:\n{null_counts}")
-    else:
-        _log_p("All IDs correctly mapped.")
-    
-    return result.drop_duplicates()
 
 def prepare_results_data(results_data, drivers_csv, constructors_csv, races_csv, status_csv,
-                         constructor_db, race_db, driver_db, status_db):
-
-    _log_r("Preparing results data...")
-    
-    df = results_data.copy()
-    
-    drivers_csv_temp = drivers_csv[['driverId', 'forename', 'surname', 'dob']].rename(columns={
-        'forename': 'driver_name', 'surname': 'driver_surname', 'dob': 'date_of_birth'
-    })
-    drivers_csv_temp['date_of_birth'] = pd.to_datetime(drivers_csv_temp['date_of_birth'], errors='coerce')
-    constructors_csv_temp = constructors_csv[['constructorId', 'name']].rename(columns={'name': 'constructor_name'})
-    races_csv_temp = races_csv[['raceId', 'year', 'name']].rename(columns={'name': 'race_name'})
-    status_csv_temp = status_csv[['statusId', 'status']]
-    
-    
-    df = df.merge(drivers_csv_temp, on='driverId', how='left')
-    df = df.merge(constructors_csv_temp, on='constructorId', how='left')
-    df = df.merge(races_csv_temp, on='raceId', how='left')
-    df = df.merge(status_csv_temp, on='statusId', how='left')
-    df.drop(columns=['driverId', 'constructorId', 'raceId', 'statusId'], inplace=True, errors='ignore')
-    
-    df = remove_rows_with_missing_keys(df, key_columns=['status'], logger_func=_log_r)
-    
-    _log_r("Mapping new IDs...")
-    
-    driver_db['date_of_birth'] = pd.to_datetime(driver_db['date_of_birth'], errors='coerce')
-    df['date_of_birth'] = pd.to_datetime(df['date_of_birth'], errors='coerce')
-    df = df.merge(driver_db[['driver_id', 'driver_name', 'driver_surname', 'date_of_birth']],
-                  on=['driver_name', 'driver_surname', 'date_of_birth'], how='left')
-    df.drop(columns=['driver_name', 'driver_surname', 'date_of_birth'], inplace=True, errors='ignore')
-
-    df = df.merge(constructor_db[['constructor_id', 'constructor_name']],
-                  on='constructor_name', how='left')
-    df.drop(columns=['constructor_name'], inplace=True, errors='ignore')
-                  
-    df = df.merge(race_db[['race_id', 'year', 'race_name']],
-                  on=['year', 'race_name'], how='left')
-    df.drop(columns=['year', 'race_name'], inplace=True, errors='ignore')
-                  
-      
-    status_db['status_clean'] = status_db['status'].astype(str).str.strip().str.lower()
-    df['status_clean'] = df['status'].astype(str).str.strip().str.lower()
-    df = df.merge(status_db[['status_id', 'status_clean']], on='status_clean', how='left')
-    df.drop(columns=['status', 'status_clean'], inplace=True, errors='ignore')
-
-
-    num_cols = ['number', 'grid', 'positionOrder', 'points', 'laps']
-    for col in num_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    rename_map = {
-        'number': 'car_number', 'grid': 'starting_position', 'position': 'final_position', 
-        'positionOrder': 'position_order', 'points': 'points', 'laps': 'laps'
-    }
-    df = df.rename(columns=rename_map)
-    
-    needed_columns = ['constructor_id', 'race_id', 'driver_id', 'status_id',
-                      'car_number', 'starting_position', 'final_position', 'position_order', 'points', 'laps']
-    existing_cols = [c for c in needed_columns if c in df.columns]
-    result = df[existing_cols].copy()
-    
-    
-    if 'final_position' in result.columns:
-        result['final_position'] = result['final_position'].replace({'\\N': np.nan})
-        result['final_position'] = pd.to_numeric(result['final_position'], errors='coerce')
-        
-        result['final_position'] = result['final_position'].fillna(0)
-        
-        result['final_position'] = result['final_position'].astype(int)
-
-    id_cols = ['constructor_id', 'race_id', 'driver_id', 'status_id']
-    for col in id_cols:
-        if col in result.columns:
-            result[col] = pd.to_numeric(result[col], errors='coerce').astype(float)
-
-
-    null_counts = result[id_cols].isna().sum()
-    if null_counts.any():
-        _log_r(f"WARNING: Unmapped IDs: \n{null_counts[null_counts > 0]}")
-    else:
-        _log_r("All IDs correctly mapped.")
-    
-    return result.drop_duplicates()
+                         registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'constructors': constructors_csv, 'races': races_csv, 'status': status_csv}
+    return prepare_fact('results', results_data, sources, registry, source_maps)
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+import fact_specs
+from fact_specs import CASTS, id_columns, plan_for, source_maps_for
+from fingerprint import HASH_COLUMN, add_row_hash
+from instrumentation import muted, span, unmapped_counts
+from key_encoding import MISSING, decode_ids
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+BACKENDS = ['pandas', 'duckdb']
+
+
+def available():
+    return duckdb is not None
+
+
+# Lookup table of a source map as (source_id, id) rows. Source ids with the
+# MISSING code get no row, so a left join leaves them without a match; unmapped
+# keys get a null id.
+def _map_frame(source_map):
+
+    if 'dense' in source_map:
+        table = source_map['dense']
+        source_ids = np.flatnonzero(table != MISSING)
+        codes = table[source_ids]
+    else:
+        keep = source_map['codes'] != MISSING
+        source_ids, codes = source_map['keys'][keep], source_map['codes'][keep]
+
+    return pd.DataFrame({'source_id': source_ids.astype('int64'), 'id': decode_ids(codes)})
+
+
+# Builds and runs the query of one fact table. joins is a list of
+# (dimension, source column, output column, required) in output order; rows
+# whose required source id does not exist are filtered out. columns are
+# (source column, SQL expression, output column) triples, the expression being
+# None for a plain copy. The optimizer pushes the projection into the scan of
+# the fact frame and runs the joins and the dedup on all cores; the first
+# occurrence of every distinct row is kept, in source order, as
+# drop_duplicates() does.
+def _run(fact_data, source_maps, joins, columns):
+
+    used = list(dict.fromkeys([source_col for _, source_col, _, _ in joins]
+                              + [source_col for source_col, _, _ in columns]))
+    fact = pd.DataFrame({col: fact_data[col].to_numpy() for col in used})
+    fact['__row'] = np.arange(len(fact), dtype='int64')
+
+    selects, from_clause, where = [], 'fact f', []
+    for i, (dimension, source_col, col, required) in enumerate(joins):
+        from_clause += f' LEFT JOIN map_{dimension} m{i} ON f."{source_col}" = m{i}.source_id'
+        selects.append(f'm{i}.id AS "{col}"')
+        if required:
+            where.append(f'm{i}.source_id IS NOT NULL')
+    for source_col, expr, col in columns:
+        expr = expr or f'f."{source_col}"'
+        selects.append(f'{expr} AS "{col}"')
+
+    output = ', '.join(f'"{col}"' for col in [col for _, _, col, _ in joins] + [col for _, _, col in columns])
+    query = (f'SELECT f.__row, {", ".join(selects)} FROM {from_clause}'
+             + (f' WHERE {" AND ".join(where)}' if where else '')
+             + f' QUALIFY row_number() OVER (PARTITION BY {output} ORDER BY f.__row) = 1 ORDER BY f.__row')
+
+    con = duckdb.connect()
+    try:
+        con.register('fact', fact)
+        for dimension in {dimension for dimension, _, _, _ in joins}:
+            con.register(f'map_{dimension}', _map_frame(source_maps[dimension]))
+        result = con.execute(query).df()
+    finally:
+        con.close()
+
+    rows = result.pop('__row').to_numpy()
+    result.index = fact_data.index[rows]
+
+    return result
+
+
+# Gives the result the exact columns and types of the pandas preparer, taken
+# from running it on no rows (without the row_hash, added by _finish).
+def _match_pandas(result, template):
+
+    template = template.drop(columns=HASH_COLUMN)
+    result = result[list(template.columns)]
+    for col, dtype in template.dtypes.items():
+        if pd.api.types.is_object_dtype(dtype):
+            result[col] = result[col].where(result[col].notna(), np.nan).astype(object)
+        elif result[col].dtype != dtype:
+            result[col] = result[col].astype(dtype)
+
+    return result
+
+
+def _template(prepare, fact, fact_data, *args):
+    with muted():
+        return prepare(fact, fact_data.iloc[:0], *args)
+
+
+# The query already dropped the duplicates, so only the row_hash is added.
+def _finish(stage, fact, result, id_cols):
+    result, _ = add_row_hash(result, fact)
+    stage['rows_out'] = len(result)
+    stage['unmapped'] = unmapped_counts(result, id_cols)
+    return result
+
+
+# Prepares a fact table from its mapping spec (fact_specs.py) as one DuckDB
+# query: the lookups become joins, the casts SQL expressions, and the casts
+# without one and the derived columns are applied to the result. It takes the
+# same arguments and returns the same frame (columns, types, index and row
+# order) as fact_specs.prepare_fact(). It expects the typed frames of read_source().
+def prepare_fact(fact, fact_data, sources, registry, source_maps=None):
+
+    with span(f'prepare_{fact}', rows_in=len(fact_data), backend='duckdb') as stage:
+
+        plan = plan_for(fact, fact_data)
+        if source_maps is None:
+            source_maps = source_maps_for(plan, sources, registry)
+
+        joins = [(dimension, source_col, col, key_name is not None)
+                 for dimension, source_col, col, key_name in plan['lookups']]
+        columns, later = [], []
+        for source_col, col, cast in plan['columns']:
+            expression = CASTS[cast][1] if cast else None
+            if cast and expression is None:
+                later.append((col, CASTS[cast][0]))
+            columns.append((source_col, expression.format(f'f."{source_col}"') if expression else None, col))
+
+        result = _run(fact_data, source_maps, joins, columns)
+        for col, cast in later:
+            result[col] = cast(result[col])
+        if plan['derive'] is not None:
+            result = plan['derive'](result)
+
+        template = _template(fact_specs.prepare_fact, fact, fact_data, sources, registry, source_maps)
+        result = _match_pandas(result, template)
+
+        return _finish(stage, fact, result, id_columns(fact))
+
+
+# The preparers below keep the signature of the ones in data_preparation.py.
+def prepare_qualifying_data(qualifying_data, drivers_csv, constructors_csv, races_csv, circuits_csv,
+                            registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'constructors': constructors_csv, 'races': races_csv, 'circuits': circuits_csv}
+    return prepare_fact('qualifying', qualifying_data, sources, registry, source_maps)
+
+
+def prepare_pit_stops_data(pit_stops_data, drivers_csv, races_csv, registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'races': races_csv}
+    return prepare_fact('pit_stops', pit_stops_data, sources, registry, source_maps)
+
+
+def prepare_lap_times_data(lap_times_data, drivers_csv, races_csv, registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'races': races_csv}
+    return prepare_fact('lap_times', lap_times_data, sources, registry, source_maps)
+
+
+def prepare_results_data(results_data, drivers_csv, constructors_csv, races_csv, status_csv,
+                         registry, source_maps=None):
+    sources = {'drivers': drivers_csv, 'constructors': constructors_csv, 'races': races_csv, 'status': status_csv}
+    return prepare_fact('results', results_data, sources, registry, source_maps)
@@ -0,0 +1,221 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from fingerprint import add_row_hash
+from instrumentation import record, span, unmapped_counts
+from key_encoding import MISSING, build_source_maps, decode_ids, map_source_ids
+from timing import add_qualifying_times, clock_time
+
+
+# How every fact table is built from its source file:
+# - source: the source file (see source_schemas.py).
+# - lookups: (dimension, source column, output column, required) in output
+#   order. Source ids are resolved to surrogate ids through the dimension
+#   files; required is the natural key reported when rows whose source id does
+#   not exist are dropped, or None to keep them with a null id.
+# - columns: (source column, output column, cast) in output order, the cast
+#   being a name of CASTS or None for a plain copy. Columns missing from the
+#   source are left out.
+# - derive: optional function that adds columns computed from the others.
+FACT_SPECS = {
+    'qualifying': {
+        'source': 'qualifying',
+        'lookups': [('circuit', 'raceId', 'circuit_id', 'circuit_name'),
+                    ('constructor', 'constructorId', 'constructor_id', None),
+                    ('race', 'raceId', 'race_id', None),
+                    ('driver', 'driverId', 'driver_id', None)],
+        'columns': [('q1', 'q1', None), ('q2', 'q2', None), ('q3', 'q3', None)],
+        'derive': add_qualifying_times,
+    },
+    'pit_stops': {
+        'source': 'pit_stops',
+        'lookups': [('race', 'raceId', 'race_id', None),
+                    ('driver', 'driverId', 'driver_id', None)],
+        'columns': [('stop', 'stop_number', None), ('lap', 'lap_number', None), ('time', 'stop_time', 'clock'),
+                    ('milliseconds', 'stop_duration', None)],
+    },
+    'results': {
+        'source': 'results',
+        'lookups': [('constructor', 'constructorId', 'constructor_id', None),
+                    ('race', 'raceId', 'race_id', None),
+                    ('driver', 'driverId', 'driver_id', None),
+                    ('status', 'statusId', 'status_id', 'status')],
+        'columns': [('number', 'car_number', 'numeric'), ('grid', 'starting_position', 'numeric'),
+                    ('position', 'final_position', 'position'), ('positionOrder', 'position_order', 'numeric'),
+                    ('points', 'points', 'numeric'), ('laps', 'laps', 'numeric')],
+    },
+    'driver_standings': {
+        'source': 'driver_standings',
+        'lookups': [('race', 'raceId', 'race_id', None),
+                    ('driver', 'driverId', 'driver_id', None)],
+        'columns': [('points', 'points', 'numeric'), ('position', 'standing_position', 'numeric'),
+                    ('positionText', 'position_text', 'text'), ('wins', 'wins', 'numeric')],
+    },
+    'constructor_standings': {
+        'source': 'constructor_standings',
+        'lookups': [('race', 'raceId', 'race_id', None),
+                    ('constructor', 'constructorId', 'constructor_id', None)],
+        'columns': [('points', 'points', 'numeric'), ('position', 'standing_position', 'numeric'),
+                    ('positionText', 'position_text', 'text'), ('wins', 'wins', 'numeric')],
+    },
+    'constructor_results': {
+        'source': 'constructor_results',
+        'lookups': [('race', 'raceId', 'race_id', None),
+                    ('constructor', 'constructorId', 'constructor_id', None)],
+        'columns': [('points', 'points', 'numeric'), ('status', 'result_status', 'text')],
+    },
+    'lap_times': {
+        'source': 'lap_times',
+        'lookups': [('race', 'raceId', 'race_id', None),
+                    ('driver', 'driverId', 'driver_id', None)],
+        'columns': [('lap', 'lap_number', None), ('position', 'lap_position', None), ('milliseconds', 'lap_ms', None)],
+    },
+}
+
+
+def _text(values):
+    return pd.Series(values.to_numpy(dtype=object), index=values.index).where(values.notna(), np.nan)
+
+
+def _position(values):
+    # Null positions (did not finish) become 0
+    return pd.to_numeric(values, errors='coerce').fillna(0).astype(int)
+
+
+# Casts of the columns: the pandas function and the DuckDB expression ({} is
+# the source column). Casts without an expression are applied by pandas to the
+# result of the query.
+CASTS = {
+    'numeric': (lambda values: pd.to_numeric(values, errors='coerce'), 'TRY_CAST({} AS DOUBLE)'),
+    'position': (_position, 'COALESCE(TRY_CAST({} AS DOUBLE), 0)'),
+    'text': (_text, None),
+    'clock': (clock_time, None),
+}
+
+# Source files that build_source_maps() needs for every dimension lookup, and
+# the argument each one is passed as.
+LOOKUP_SOURCES = {
+    'driver': ['drivers'],
+    'constructor': ['constructors'],
+    'race': ['races'],
+    'circuit': ['races', 'circuits'],
+    'status': ['status'],
+}
+_MAP_ARGUMENTS = {'drivers': 'drivers_csv', 'constructors': 'constructors_csv', 'races': 'races_csv',
+                  'circuits': 'circuits_csv', 'status': 'status_csv'}
+
+
+def fact_dimensions(fact):
+    return list(dict.fromkeys(dimension for dimension, _, _, _ in FACT_SPECS[fact]['lookups']))
+
+
+# Source files read to prepare a fact table: its own file and those of the
+# dimensions it looks up.
+def fact_sources(fact):
+    return list(dict.fromkeys([FACT_SPECS[fact]['source']]
+                              + [name for dimension in fact_dimensions(fact) for name in LOOKUP_SOURCES[dimension]]))
+
+
+def id_columns(fact):
+    return [col for _, _, col, _ in FACT_SPECS[fact]['lookups']]
+
+
+# Compiles the spec of a fact table for a source frame with the given columns:
+# the columns and lookups that apply, the source columns to read (nothing else
+# is copied or filtered) and the source files of the lookups. Required lookups
+# come first, so rows are dropped before any other column is built.
+@functools.lru_cache(maxsize=None)
+def compile_plan(fact, source_columns):
+
+    spec = FACT_SPECS[fact]
+    columns = [(source_col, col, cast) for source_col, col, cast in spec['columns'] if source_col in source_columns]
+    lookups = spec['lookups']
+
+    return {
+        'fact': fact,
+        'lookups': lookups,
+        'filters': [lookup for lookup in lookups if lookup[3] is not None],
+        'columns': columns,
+        'used': list(dict.fromkeys([source_col for _, source_col, _, _ in lookups]
+                                   + [source_col for source_col, _, _ in columns])),
+        'sources': [name for name in fact_sources(fact) if name != spec['source']],
+        'derive': spec.get('derive'),
+    }
+
+
+def plan_for(fact, fact_data):
+    return compile_plan(fact, tuple(fact_data.columns))
+
+
+def source_maps_for(plan, sources, registry):
+    return build_source_maps(registry, **{_MAP_ARGUMENTS[name]: sources[name] for name in plan['sources']})
+
+
+# Lookup tables of every dimension of a fact table, to resolve many chunks of
+# its source file with the same ones.
+def fact_source_maps(fact, sources, registry):
+    return source_maps_for(compile_plan(fact, ()), sources, registry)
+
+
+# Lookup tables of every dimension of the given fact tables, each one built
+# once however many of them look it up.
+def facts_source_maps(facts, sources, registry):
+    names = dict.fromkeys(name for fact in facts for name in compile_plan(fact, ())['sources'])
+    return build_source_maps(registry, **{_MAP_ARGUMENTS[name]: sources[name] for name in names})
+
+
+# Keeps the fact rows whose dimension key exists in the source files (code is
+# not MISSING) and records how many rows were dropped in the current span.
+def _keep_resolved(df, codes, key_column):
+
+    keep = codes != MISSING
+    rows_dropped = int((~keep).sum())
+    record(dropped=rows_dropped, dropped_by=key_column)
+
+    return df[keep], codes[keep]
+
+
+# Records the unmapped ids and the duplicates in the current span, and returns
+# the rows without duplicates and with their row_hash fingerprint.
+def _finish(stage, fact, result, id_cols):
+
+    stage['unmapped'] = unmapped_counts(result, id_cols)
+    deduplicated, stage['duplicates'] = add_row_hash(result, fact)
+    stage['rows_out'] = len(deduplicated)
+
+    return deduplicated
+
+
+# Prepares a fact table from its source frame following its spec: only the
+# source columns the plan uses are read, rows are dropped by the required
+# lookups, every id is resolved with vectorized lookups, the columns are cast
+# and derived, and duplicate rows are dropped by their row_hash. sources holds
+# the dimension source files (drivers, races...).
+def prepare_fact(fact, fact_data, sources, registry, source_maps=None):
+
+    with span(f'prepare_{fact}', rows_in=len(fact_data)) as stage:
+
+        plan = plan_for(fact, fact_data)
+        if source_maps is None:
+            source_maps = source_maps_for(plan, sources, registry)
+
+        df = fact_data[plan['used']]
+        codes = {}
+        for dimension, source_col, col, key_name in plan['filters']:
+            resolved = map_source_ids(source_maps[dimension], df[source_col])
+            codes = {c: v[resolved != MISSING] for c, v in codes.items()}
+            df, codes[col] = _keep_resolved(df, resolved, key_name)
+
+        result = pd.DataFrame({
+            col: decode_ids(codes[col] if col in codes else map_source_ids(source_maps[dimension], df[source_col]))
+            for dimension, source_col, col, _ in plan['lookups']
+        }, index=df.index)
+
+        for source_col, col, cast in plan['columns']:
+            result[col] = CASTS[cast][0](df[source_col]) if cast else df[source_col]
+        if plan['derive'] is not None:
+            result = plan['derive'](result)
+
+        return _finish(stage, fact, result, id_columns(fact))
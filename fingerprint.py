@@ -0,0 +1,133 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from chunking import chunked
+from instrumentation import log, record
+
+
+HASH_COLUMN = 'row_hash'
+
+# Columns that identify a row of each fact table: everything but its
+# auto-increment id. Columns derived from these ones are left out.
+FACT_COLUMNS = {
+    'qualifying': ['circuit_id', 'constructor_id', 'race_id', 'driver_id', 'q1', 'q2', 'q3'],
+    'pit_stops': ['race_id', 'driver_id', 'stop_number', 'lap_number', 'stop_time', 'stop_duration'],
+    'results': ['constructor_id', 'race_id', 'driver_id', 'status_id', 'car_number', 'starting_position',
+                'final_position', 'position_order', 'points', 'laps'],
+    'driver_standings': ['race_id', 'driver_id', 'points', 'standing_position', 'position_text', 'wins'],
+    'constructor_standings': ['race_id', 'constructor_id', 'points', 'standing_position', 'position_text', 'wins'],
+    'constructor_results': ['race_id', 'constructor_id', 'points', 'result_status'],
+    'lap_times': ['race_id', 'driver_id', 'lap_number', 'lap_position', 'lap_ms'],
+}
+
+# The same value must give the same hash whatever the dtype it was read or
+# prepared with: numbers become float64 (5, 5.0 and Int64 5 are equal) and
+# everything else text, with one marker for every kind of null.
+def _canonical(series):
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(series.cat.categories.dtype)
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    if not pd.api.types.is_object_dtype(series):
+        series = series.astype('string').astype(object)
+    # Non-string objects (e.g. datetime.time) are hashed as their str()
+    return series.where(series.notna(), '\\N')
+
+
+# Stable 64-bit hash of the given columns of every row (uint64). It does not
+# depend on the process, the column dtypes or the row index.
+def hash_rows(df, columns):
+
+    canonical = pd.DataFrame({col: _canonical(df[col]) for col in columns}, index=df.index)
+    return pd.util.hash_pandas_object(canonical, index=False).to_numpy()
+
+
+# Hash of the business columns of every row, as signed int64 so MySQL (BIGINT)
+# and SQLite (INTEGER) can store it.
+def row_hashes(df, fact):
+    return hash_rows(df, [col for col in FACT_COLUMNS[fact] if col in df.columns]).view('int64')
+
+
+# Adds the row_hash column and drops the rows whose hash is repeated (the first
+# one is kept). Returns the frame and the number of rows dropped.
+def add_row_hash(df, fact):
+
+    hashes = row_hashes(df, fact)
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+
+    df = df[keep].copy() if not keep.all() else df.copy()
+    df[HASH_COLUMN] = hashes[keep]
+
+    return df, int((~keep).sum())
+
+
+def has_hash_column(engine, table):
+    return HASH_COLUMN in {column['name'] for column in inspect(engine).get_columns(table)}
+
+
+# Adds the indexed row_hash column to the fact tables that do not have it yet.
+# Rows loaded before keep a null hash, so they are never taken as duplicates.
+def ensure_hash_columns(engine, tables):
+
+    existing = set(inspect(engine).get_table_names())
+    for table in tables:
+        if table not in existing or has_hash_column(engine, table):
+            continue
+        log('fingerprint', f"Adding {HASH_COLUMN} to {table}.")
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {HASH_COLUMN} BIGINT"))
+            conn.execute(text(f"CREATE INDEX ix_{table}_{HASH_COLUMN} ON {table} ({HASH_COLUMN})"))
+
+
+# Hashes of the given list that the table already holds, looked up through the
+# row_hash index in chunks.
+def loaded_hashes(engine, table, hashes):
+
+    found = []
+    query = text(f"SELECT {HASH_COLUMN} FROM {table} WHERE {HASH_COLUMN} IN :hashes").bindparams(
+        bindparam('hashes', expanding=True))
+
+    with engine.connect() as conn:
+        if conn.execute(text(f"SELECT 1 FROM {table} WHERE {HASH_COLUMN} IS NOT NULL LIMIT 1")).first() is None:
+            return np.empty(0, dtype='int64')
+        for chunk in chunked(hashes):
+            found += [row[0] for row in conn.execute(query, {'hashes': chunk})]
+
+    return np.asarray(found, dtype='int64')
+
+
+# Drops the rows of the frame that an earlier load already wrote to the table
+# and records how many in the current span. Frames without row_hash, or tables
+# without the column, are returned as they are.
+def drop_loaded(engine, table, df):
+
+    if HASH_COLUMN not in df.columns or df.empty or not has_hash_column(engine, table):
+        return df
+
+    hashes = df[HASH_COLUMN].to_numpy()
+    keep = ~np.isin(hashes, loaded_hashes(engine, table, hashes))
+    already_loaded = int((~keep).sum())
+    record(already_loaded=already_loaded)
+
+    if already_loaded:
+        log('fingerprint', f"{table}: {already_loaded} of {len(df)} rows were already loaded.")
+        return df[keep]
+
+    return df
+
+
+if __name__ == '__main__':
+
+    from connections import get_connection, load_db_config
+
+    parser = argparse.ArgumentParser(description='Add the row_hash column to the fact tables of a database.')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default=None, help='Database to use (the one of config.json by default).')
+    parser.add_argument('--tables', nargs='+', default=list(FACT_COLUMNS))
+    args = parser.parse_args()
+
+    ensure_hash_columns(get_connection(load_db_config(args.config), args.database), args.tables)
@@ -0,0 +1,110 @@
+import pandas as pd
+import numpy as np
+from sqlalchemy import inspect, text
+
+from instrumentation import log
+from key_registry import DIMENSION_KEYS, register_dimension, lookup_ids
+from bulk_load import upsert_rows
+
+
+WATERMARK_TABLE = 'load_watermark'
+
+
+# Creates the unique natural-key indexes of the dimension tables (when they
+# are missing) and the table that stores the high-water mark of each fact.
+def ensure_natural_keys(engine, dimensions=None):
+
+    dimensions = dimensions or list(DIMENSION_KEYS)
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for dimension in dimensions:
+            if dimension not in existing_tables:
+                continue
+            _, key_columns = DIMENSION_KEYS[dimension]
+            unique_sets = [set(ix['column_names']) for ix in inspector.get_indexes(dimension) if ix.get('unique')]
+            unique_sets += [set(uc['column_names']) for uc in inspector.get_unique_constraints(dimension)]
+            if set(key_columns) not in unique_sets:
+                log('incremental', f"Adding unique natural key to {dimension} ({', '.join(key_columns)}).")
+                conn.execute(text(
+                    f"CREATE UNIQUE INDEX uq_{dimension}_natural_key ON {dimension} ({', '.join(key_columns)})"
+                ))
+
+        if WATERMARK_TABLE not in existing_tables:
+            conn.execute(text(
+                f"CREATE TABLE {WATERMARK_TABLE} (table_name VARCHAR(64) PRIMARY KEY, race_date DATE)"
+            ))
+
+
+# Inserts the new rows of a dimension and updates the attributes of the rows
+# whose natural key already exists. Existing rows keep their surrogate id and
+# new rows get ids after the current maximum. Only the id and the key columns
+# are read from the database.
+def upsert_dimension(engine, dimension, dim_data):
+
+    id_col, key_columns = DIMENSION_KEYS[dimension]
+
+    existing = pd.read_sql(f"SELECT {id_col}, {', '.join(key_columns)} FROM {dimension}", con=engine)
+    dim_data = dim_data.reset_index(drop=True).copy()
+
+    if len(existing):
+        ids = lookup_ids(register_dimension({}, dimension, existing), dimension, dim_data)
+        next_id = int(existing[id_col].max()) + 1
+    else:
+        ids = pd.Series(pd.NA, index=dim_data.index, dtype='Int64')
+        next_id = 1
+
+    is_new = ids.isna().to_numpy()
+    ids[is_new] = np.arange(next_id, next_id + is_new.sum())
+    dim_data.insert(0, id_col, ids.astype('int64'))
+
+    attributes = [c for c in dim_data.columns if c not in key_columns and c != id_col]
+    with engine.begin() as conn:
+        upsert_rows(conn, dimension, dim_data, key_columns, update_columns=attributes)
+
+    log('incremental', f"{dimension}: {int(is_new.sum())} new rows, {int((~is_new).sum())} existing rows updated.")
+
+    return dim_data
+
+
+# Returns the date of the most recent race already loaded into a fact table.
+def get_watermark(engine, table):
+
+    with engine.connect() as conn:
+        value = conn.execute(
+            text(f"SELECT race_date FROM {WATERMARK_TABLE} WHERE table_name = :table_name"),
+            {'table_name': table}
+        ).scalar()
+
+    return pd.Timestamp(value) if value is not None else None
+
+
+def set_watermark(engine, table, race_date):
+
+    row = pd.DataFrame({'table_name': [table], 'race_date': [pd.Timestamp(race_date).strftime('%Y-%m-%d')]})
+    with engine.begin() as conn:
+        upsert_rows(conn, WATERMARK_TABLE, row, ['table_name'])
+
+
+# Keeps only the fact rows of races held after the watermark. races_csv must
+# come from transform_date(), which adds the RACE_DATE column. Also returns the
+# new watermark (date of the most recent race kept), or None if nothing is left.
+def filter_new_races(fact_data, races_csv, watermark, race_col='raceId'):
+
+    race_dates = races_csv.set_index('raceId')['RACE_DATE']
+    fact_dates = fact_data[race_col].map(race_dates)
+
+    if watermark is None:
+        new_rows = fact_data
+    else:
+        new_rows = fact_data[(fact_dates > watermark).to_numpy()]
+        fact_dates = fact_dates[(fact_dates > watermark).to_numpy()]
+
+    log('incremental', f"{len(new_rows)}/{len(fact_data)} rows belong to races after {watermark}.")
+
+    new_watermark = fact_dates.max() if len(new_rows) else None
+    if pd.isna(new_watermark):
+        new_watermark = None
+
+    return new_rows, new_watermark
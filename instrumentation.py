@@ -0,0 +1,242 @@
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time as _time
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Settings of the instrumentation, changed with configure().
+_config = {
+    'trace_memory': False,   # tracemalloc peak per span (slows pandas down a lot)
+    'profile_dir': None,     # folder for the cProfile output of the profiled stages
+    'profile_stages': None,  # names of the stages to profile (None = every stage)
+    'echo': True,            # print a one-line summary of every finished span
+}
+
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+_profiling = threading.Lock()
+
+
+def configure(**settings):
+
+    unknown = set(settings) - set(_config)
+    if unknown:
+        raise ValueError(f"Unknown instrumentation settings: {sorted(unknown)}")
+    _config.update(settings)
+
+    if _config['profile_dir']:
+        os.makedirs(_config['profile_dir'], exist_ok=True)
+
+
+# Peak resident memory of the process so far, in bytes (ru_maxrss is in KiB on Linux).
+def max_rss():
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Current resident memory; without psutil only the peak of the process is known.
+def current_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return max_rss()
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _summary(record):
+
+    parts = [f"{record['status']} in {record['wall_s']:.3f}s"]
+    for key in ['rows_in', 'rows_out', 'dropped']:
+        if record.get(key) is not None:
+            parts.append(f"{key}={record[key]}")
+    if record.get('unmapped'):
+        parts.append(f"unmapped={record['unmapped']}")
+    if record.get('strategy'):
+        parts.append(f"strategy={record['strategy']}")
+    if record.get('error'):
+        parts.append(f"error: {record['error']}")
+
+    return f"[{record['stage']}] " + ', '.join(parts)
+
+
+# Times a pipeline stage. The yielded dict is the span record: the stage fills
+# in rows_out, dropped, unmapped (counts by key column) or any other field, and
+# wall and CPU time, peak RSS and, when enabled, the tracemalloc peak are added
+# when the block ends (CPU time is the one of the calling thread). Spans opened
+# inside another one record it as parent. An exception marks the span as failed
+# and is raised again. echo=False keeps the span (e.g. a single chunk) out of
+# the printed log.
+@contextlib.contextmanager
+def span(stage, rows_in=None, echo=True, **fields):
+
+    stack = _stack()
+    record = {'stage': stage, 'parent': stack[-1]['stage'] if stack else None, 'rows_in': rows_in, **fields}
+
+    profile = None
+    if _config['profile_dir'] and (_config['profile_stages'] is None or stage in _config['profile_stages']):
+        # Only one profiler can run at a time in the process.
+        if _profiling.acquire(blocking=False):
+            profile = cProfile.Profile()
+
+    trace = _config['trace_memory'] and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+
+    stack.append(record)
+    record['started_at'] = _time.time()
+    wall, cpu = _time.perf_counter(), _time.thread_time()
+    if profile is not None:
+        profile.enable()
+
+    try:
+        yield record
+        record.setdefault('status', 'ok')
+    except BaseException as ex:
+        record['status'] = 'error'
+        record.setdefault('error', str(ex))
+        raise
+    finally:
+        if profile is not None:
+            profile.disable()
+            _profiling.release()
+        record['wall_s'] = round(_time.perf_counter() - wall, 6)
+        record['cpu_s'] = round(_time.thread_time() - cpu, 6)
+        record['max_rss_mb'] = round(max_rss() / 1024 / 1024, 1)
+        stack.pop()
+
+        if trace:
+            record['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            tracemalloc.stop()
+        if profile is not None:
+            path = os.path.join(_config['profile_dir'], f"{stage}-{int(record['started_at'])}.prof")
+            profile.dump_stats(path)
+            record['profile'] = path
+
+        if not getattr(_local, 'muted', False):
+            with _lock:
+                _spans.append(record)
+            if echo and _config['echo']:
+                print(_summary(record))
+
+
+# Spans of this thread inside the block are neither kept nor printed.
+@contextlib.contextmanager
+def muted():
+    previous = getattr(_local, 'muted', False)
+    _local.muted = True
+    try:
+        yield
+    finally:
+        _local.muted = previous
+
+
+# Adds fields to the innermost open span of this thread (ignored outside spans).
+def record(**fields):
+    stack = _stack()
+    if stack:
+        stack[-1].update(fields)
+
+
+# Message of a module (source), printed as "[source] message" and kept in the
+# messages of the innermost open span of this thread, so the exported records
+# say what happened during the stage.
+def log(source, message):
+    stack = _stack()
+    if stack:
+        stack[-1].setdefault('messages', []).append(f"[{source}] {message}")
+    print(f"[{source}] {message}")
+
+
+def unmapped_counts(df, key_columns):
+    counts = df[key_columns].isna().sum()
+    return {col: int(n) for col, n in counts.items() if n}
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+# Adds spans recorded elsewhere (e.g. by a worker process).
+def extend(records):
+    with _lock:
+        _spans.extend(records)
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+
+def export_jsonl(path, records=None):
+
+    with open(path, 'a') as file:
+        for item in spans() if records is None else records:
+            file.write(json.dumps(item, default=str) + '\n')
+
+
+# Writes the spans as a Prometheus text file (for the node_exporter textfile
+# collector). Stages that ran more than once are summed.
+def export_prometheus(path, records=None):
+
+    metrics = {
+        'pipeline_stage_wall_seconds': 'wall_s',
+        'pipeline_stage_cpu_seconds': 'cpu_s',
+        'pipeline_stage_rows_in': 'rows_in',
+        'pipeline_stage_rows_out': 'rows_out',
+        'pipeline_stage_dropped_rows': 'dropped',
+        'pipeline_stage_max_rss_megabytes': 'max_rss_mb',
+    }
+    totals, unmapped, errors = {}, {}, {}
+
+    for item in spans() if records is None else records:
+        stage = item['stage']
+        for metric, field in metrics.items():
+            value, key = item.get(field), (metric, stage)
+            if value is None:
+                continue
+            if field == 'max_rss_mb':
+                totals[key] = max(totals.get(key, 0), value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+        for column, count in (item.get('unmapped') or {}).items():
+            unmapped[(stage, column)] = unmapped.get((stage, column), 0) + count
+        errors[stage] = errors.get(stage, 0) + (item['status'] == 'error')
+
+    lines = []
+    for metric in metrics:
+        lines.append(f"# TYPE {metric} gauge")
+        lines += [f'{metric}{{stage="{stage}"}} {value}' for (name, stage), value in totals.items() if name == metric]
+    lines.append("# TYPE pipeline_stage_unmapped_keys gauge")
+    lines += [f'pipeline_stage_unmapped_keys{{stage="{stage}",column="{column}"}} {count}'
+              for (stage, column), count in unmapped.items()]
+    lines.append("# TYPE pipeline_stage_errors gauge")
+    lines += [f'pipeline_stage_errors{{stage="{stage}"}} {count}' for stage, count in errors.items()]
+
+    with open(path + '.tmp', 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+# JSON lines unless the file name ends in .prom.
+def export(path, records=None):
+    if path.endswith('.prom'):
+        export_prometheus(path, records)
+    else:
+        export_jsonl(path, records)
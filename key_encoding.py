@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from key_registry import lookup_ids
+
+
+# Codes below zero mark rows that cannot be resolved to a surrogate id.
+UNMAPPED = -1   # the source row exists but its natural key is not in the registry
+MISSING = -2    # the source id (or the natural key itself) does not exist
+
+# Lookup tables whose largest source id is at most this many times their size
+# are stored densely and resolved with a single take().
+DENSE_FACTOR = 4
+
+
+# Turns surrogate ids (with <NA> for unknown keys) into int64 codes. Rows where
+# present is False get the MISSING code.
+def encode_ids(ids, present=None):
+
+    codes = pd.array(ids, dtype='Int64').to_numpy(dtype='int64', na_value=UNMAPPED)
+    if present is not None:
+        codes[~np.asarray(present, dtype=bool)] = MISSING
+
+    return codes
+
+
+def decode_ids(codes):
+
+    ids = pd.array(codes, dtype='Int32')
+    ids[codes < 0] = pd.NA
+
+    return ids
+
+
+# Builds the lookup table from the integer ids of a source file (driverId,
+# raceId...) to codes. Source ids must be unique, as they are in the CSV files.
+def build_source_map(source_ids, codes):
+
+    source_ids = np.asarray(source_ids, dtype='int64')
+    codes = np.asarray(codes, dtype='int64')
+
+    if len(source_ids) and source_ids.min() >= 0 and source_ids.max() <= DENSE_FACTOR * len(source_ids) + 1024:
+        table = np.full(source_ids.max() + 1, MISSING, dtype='int64')
+        table[source_ids] = codes
+        return {'dense': table}
+
+    order = np.argsort(source_ids, kind='stable')
+    return {'keys': source_ids[order], 'codes': codes[order]}
+
+
+# Resolves a column of source ids to codes with vectorized lookups.
+def map_source_ids(source_map, values):
+
+    values = pd.to_numeric(pd.Series(values), errors='coerce')
+    valid = values.notna().to_numpy()
+    keys = values.fillna(-1).to_numpy(dtype='int64')
+    result = np.full(len(keys), MISSING, dtype='int64')
+
+    if 'dense' in source_map:
+        table = source_map['dense']
+        inside = valid & (keys >= 0) & (keys < len(table))
+        result[inside] = table[keys[inside]]
+        return result
+
+    sorted_keys, codes = source_map['keys'], source_map['codes']
+    if len(sorted_keys):
+        positions = np.searchsorted(sorted_keys, keys)
+        positions[positions == len(sorted_keys)] = 0
+        found = valid & (sorted_keys[positions] == keys)
+        result[found] = codes[positions[found]]
+
+    return result
+
+
+# Resolves the natural keys of every row of the source dimension files to
+# surrogate ids once, and keeps them as integer lookup tables keyed by the
+# source ids. Fact rows are then resolved with map_source_ids() instead of
+# string-keyed merges. The 'circuit' table is keyed by raceId.
+def build_source_maps(registry, drivers_csv=None, constructors_csv=None, races_csv=None,
+                      circuits_csv=None, status_csv=None):
+
+    maps = {}
+
+    if drivers_csv is not None and 'driver' in registry:
+        ids = lookup_ids(registry, 'driver', drivers_csv, ['forename', 'surname', 'dob'])
+        maps['driver'] = build_source_map(drivers_csv['driverId'], encode_ids(ids))
+
+    if constructors_csv is not None and 'constructor' in registry:
+        ids = lookup_ids(registry, 'constructor', constructors_csv, ['name'])
+        maps['constructor'] = build_source_map(constructors_csv['constructorId'], encode_ids(ids))
+
+    if races_csv is not None and 'race' in registry:
+        ids = lookup_ids(registry, 'race', races_csv, ['year', 'name'])
+        maps['race'] = build_source_map(races_csv['raceId'], encode_ids(ids))
+
+    if races_csv is not None and circuits_csv is not None and 'circuit' in registry:
+        ids = lookup_ids(registry, 'circuit', circuits_csv, ['name'])
+        by_circuit = build_source_map(circuits_csv['circuitId'],
+                                      encode_ids(ids, present=circuits_csv['name'].notna()))
+        maps['circuit'] = build_source_map(races_csv['raceId'], map_source_ids(by_circuit, races_csv['circuitId']))
+
+    if status_csv is not None and 'status' in registry:
+        ids = lookup_ids(registry, 'status', status_csv, ['status'])
+        maps['status'] = build_source_map(status_csv['statusId'],
+                                          encode_ids(ids, present=status_csv['status'].notna()))
+
+    return maps
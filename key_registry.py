@@ -0,0 +1,80 @@
+import pandas as pd
+
+
+# Surrogate id column and natural key columns of every dimension table.
+DIMENSION_KEYS = {
+    'driver': ('driver_id', ['driver_name', 'driver_surname', 'date_of_birth']),
+    'constructor': ('constructor_id', ['constructor_name']),
+    'race': ('race_id', ['year', 'race_name']),
+    'circuit': ('circuit_id', ['circuit_name']),
+    'status': ('status_id', ['status']),
+}
+
+
+def _clean_text(series):
+    return series.astype(str).str.strip().str.lower()
+
+
+# Normalizes the natural key columns of a dimension so that the same key
+# always hashes the same way, no matter if it comes from a CSV or the database.
+def normalize_keys(dimension, df, key_columns=None):
+
+    _, default_keys = DIMENSION_KEYS[dimension]
+    key_columns = key_columns or default_keys
+
+    keys = pd.DataFrame(
+        {name: df[col].to_numpy() for name, col in zip(default_keys, key_columns)}
+    )
+
+    if dimension == 'driver':
+        keys['date_of_birth'] = pd.to_datetime(keys['date_of_birth'], errors='coerce')
+    elif dimension == 'race':
+        keys['year'] = pd.to_numeric(keys['year'], errors='coerce').astype('Int64')
+    elif dimension in ('circuit', 'status'):
+        keys[default_keys[0]] = _clean_text(keys[default_keys[0]])
+
+    return keys
+
+
+# Builds the hashed index of normalized natural keys for a dimension frame.
+def build_key_index(dimension, dim_data):
+
+    keys = normalize_keys(dimension, dim_data)
+    if keys.shape[1] == 1:
+        return pd.Index(keys.iloc[:, 0])
+    return pd.MultiIndex.from_frame(keys)
+
+
+# Adds (or replaces) the natural key -> surrogate id mapping of a dimension.
+# If the same natural key appears more than once, the first id is kept.
+def register_dimension(registry, dimension, dim_data, key_index=None):
+
+    id_col, _ = DIMENSION_KEYS[dimension]
+
+    if key_index is None:
+        key_index = build_key_index(dimension, dim_data)
+
+    mapping = pd.Series(dim_data[id_col].to_numpy(), index=key_index, name=id_col)
+    registry[dimension] = mapping[~mapping.index.duplicated(keep='first')]
+
+    return registry
+
+
+# Resolves the surrogate ids of the rows of df, given the columns of df that
+# hold the natural key of the dimension. Unknown keys are returned as <NA>.
+def lookup_ids(registry, dimension, df, key_columns=None):
+
+    id_col, _ = DIMENSION_KEYS[dimension]
+    mapping = registry[dimension]
+
+    keys = normalize_keys(dimension, df, key_columns)
+    if keys.shape[1] == 1:
+        probe = pd.Index(keys.iloc[:, 0])
+    else:
+        probe = pd.MultiIndex.from_frame(keys)
+
+    positions = mapping.index.get_indexer(probe)
+    ids = pd.array(mapping.to_numpy()[positions], dtype='Int64')
+    ids[positions == -1] = pd.NA
+
+    return pd.Series(ids, index=df.index, name=id_col)
@@ -0,0 +1,79 @@
+from bulk_load import bulk_load
+from checkpoints import load_in_batches
+from fingerprint import drop_loaded
+from incremental import upsert_dimension
+from instrumentation import span
+
+
+# Upserts a dimension table inside a span and returns its rows with their
+# surrogate ids: rows already in the table keep theirs, so loading the same
+# files again writes nothing new. Errors are recorded in the span and raised:
+# the fact tables must not be loaded with the ids of rows that were never written.
+def _load_dimension(engine, table, data):
+    with span(f'load_{table}', rows_in=len(data)) as stage:
+        data = upsert_dimension(engine, table, data)
+        stage['rows_out'] = len(data)
+    return data
+
+
+# Loads a fact table with bulk_load() inside a span and returns the strategy
+# used, or None if the load failed. Rows whose row_hash is already in the
+# table are skipped. With a batch_size the table is committed
+# in checkpointed batches that a later run resumes after a failure; the whole
+# frame goes to load_in_batches(), which skips the loaded rows batch by batch.
+def _load_fact(engine, table, data, strategy, batch_size=None):
+    with span(f'load_{table}', rows_in=len(data), batch_size=batch_size) as stage:
+        try:
+            if batch_size:
+                strategy = load_in_batches(engine, table, data, strategy=strategy, batch_size=batch_size)
+                written = len(data) - stage.get('already_loaded', 0)
+            else:
+                data = drop_loaded(engine, table, data)
+                strategy = bulk_load(engine, table, data, strategy=strategy)
+                written = len(data)
+        except Exception as ex:
+            stage.update(status='error', error=str(ex))
+            return None
+        stage.update(rows_out=written, strategy=strategy)
+        return strategy
+
+
+def load_driver_data(engine, driver_data):
+    return _load_dimension(engine, 'driver', driver_data)
+
+
+def load_constructor_data(engine, constructor_data):
+    return _load_dimension(engine, 'constructor', constructor_data)
+
+
+def load_race_data(engine, race_data):
+    return _load_dimension(engine, 'race', race_data)
+
+
+def load_circuit_data(engine, circuit_data):
+    return _load_dimension(engine, 'circuit', circuit_data)
+
+
+def load_qualifying_data(engine, qualifying_data, strategy='auto', batch_size=None):
+    return _load_fact(engine, 'qualifying', qualifying_data, strategy, batch_size)
+
+def load_pit_stops_data(engine, pit_stops_data, strategy='auto', batch_size=None):
+    return _load_fact(engine, 'pit_stops', pit_stops_data, strategy, batch_size)
+
+def load_status_data(engine, status_data):
+    return _load_dimension(engine, 'status', status_data)
+
+def load_results_data(engine, results_data, strategy='auto', batch_size=None):
+    return _load_fact(engine, 'results', results_data, strategy, batch_size)
+
+def load_driver_standings_data(engine, driver_standings_data, strategy='auto', batch_size=None):
+    return _load_fact(engine, 'driver_standings', driver_standings_data, strategy, batch_size)
+
+def load_constructor_standings_data(engine, constructor_standings_data, strategy='auto', batch_size=None):
+    return _load_fact(engine, 'constructor_standings', constructor_standings_data, strategy, batch_size)
+
+def load_constructor_results_data(engine, constructor_results_data, strategy='auto', batch_size=None):
+    return _load_fact(engine, 'constructor_results', constructor_results_data, strategy, batch_size)
+
+def load_lap_times_data(engine, lap_times_data, strategy='auto', batch_size=None):
+    return _load_fact(engine, 'lap_times', lap_times_data, strategy, batch_size)
@@ -0,0 +1,189 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from bulk_load import upsert_rows
+from chunking import chunked
+from fingerprint import HASH_COLUMN, hash_rows
+from instrumentation import log
+
+
+# Fingerprint of the source file each fact table was last loaded from, and of
+# every partition (the rows of one source raceId) of that file.
+FILE_TABLE = 'load_file'
+PARTITION_TABLE = 'load_partition'
+
+def ensure_manifest_tables(engine):
+
+    existing = set(inspect(engine).get_table_names())
+
+    with engine.begin() as conn:
+        if FILE_TABLE not in existing:
+            conn.execute(text(
+                f"CREATE TABLE {FILE_TABLE} (table_name VARCHAR(64) PRIMARY KEY, file_hash VARCHAR(64), "
+                "loaded_at DATETIME)"
+            ))
+        if PARTITION_TABLE not in existing:
+            conn.execute(text(
+                f"CREATE TABLE {PARTITION_TABLE} (table_name VARCHAR(64), source_race_id INT, row_count INT, "
+                "partition_hash BIGINT, PRIMARY KEY (table_name, source_race_id))"
+            ))
+
+
+# Row count and hash of every partition of a source frame, from the hashes of
+# the given columns of its rows. The partition hash is the sum of its row
+# hashes (modulo 2**64), so it does not depend on the order of the rows and the
+# hashes of several chunks of a file add up with combine_partitions(). Hashes
+# are stored as signed int64, like row_hash.
+def partition_hashes(df, columns, race_col='raceId'):
+    return _sum_by_race(df[race_col].to_numpy(dtype='int64'), np.ones(len(df), dtype='int64'),
+                        hash_rows(df, columns))
+
+
+def combine_partitions(parts):
+
+    df = pd.concat([part for part in parts if len(part)] or [_sum_by_race(*[np.empty(0, dtype='int64')] * 3)],
+                   ignore_index=True)
+
+    return _sum_by_race(df['source_race_id'].to_numpy(dtype='int64'), df['row_count'].to_numpy(dtype='int64'),
+                        df['partition_hash'].to_numpy(dtype='int64'))
+
+
+def _sum_by_race(races, counts, hashes):
+
+    order = np.argsort(races, kind='stable')
+    races, counts, hashes = races[order], counts[order], hashes[order].view('uint64')
+    if not len(races):
+        return pd.DataFrame({'source_race_id': races, 'row_count': counts, 'partition_hash': hashes.view('int64')})
+
+    starts = np.flatnonzero(np.r_[True, races[1:] != races[:-1]])
+    return pd.DataFrame({
+        'source_race_id': races[starts],
+        'row_count': np.add.reduceat(counts, starts),
+        # uint64 sums wrap around, which keeps them exact modulo 2**64
+        'partition_hash': np.add.reduceat(hashes, starts).view('int64'),
+    })
+
+
+# File hash the table was last loaded from, or None.
+def loaded_file_hash(engine, table):
+
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT file_hash FROM {FILE_TABLE} WHERE table_name = :table_name"),
+                            {'table_name': table}).scalar()
+
+
+def loaded_partitions(engine, table):
+
+    query = text(f"SELECT source_race_id, row_count, partition_hash FROM {PARTITION_TABLE} "
+                 "WHERE table_name = :table_name")
+    df = pd.read_sql(query, con=engine, params={'table_name': table})
+
+    return df.astype({'source_race_id': 'int64', 'row_count': 'int64', 'partition_hash': 'int64'})
+
+
+# Compares the partitions of the new file with those loaded before. Returns the
+# source race ids whose rows are new or changed and those no longer in the file.
+def diff_partitions(loaded, current):
+
+    merged = current.merge(loaded, on='source_race_id', how='left', suffixes=('', '_loaded'))
+
+    same = ((merged['partition_hash'] == merged['partition_hash_loaded'])
+            & (merged['row_count'] == merged['row_count_loaded']))
+    changed = merged.loc[~same.to_numpy(dtype=bool), 'source_race_id']
+    removed = loaded.loc[~loaded['source_race_id'].isin(current['source_race_id']), 'source_race_id']
+
+    return set(changed.tolist()), set(removed.tolist())
+
+
+# Deletes the rows of the given (surrogate) race ids that the new load did not
+# write: those whose row_hash is not in hashes and those without a hash. Run
+# after loading the changed partitions, it leaves every race as in the new
+# file (unchanged rows were skipped by their hash and stay). Returns how many.
+def delete_stale_rows(engine, table, races, hashes):
+
+    hashes = np.asarray(hashes, dtype='int64')
+    select = text(f"SELECT race_id, {HASH_COLUMN} FROM {table} WHERE race_id IN :races").bindparams(
+        bindparam('races', expanding=True))
+    delete_unhashed = text(f"DELETE FROM {table} WHERE race_id IN :races AND {HASH_COLUMN} IS NULL").bindparams(
+        bindparam('races', expanding=True))
+    delete_hashes = text(f"DELETE FROM {table} WHERE race_id IN :races AND {HASH_COLUMN} IN :hashes").bindparams(
+        bindparam('races', expanding=True), bindparam('hashes', expanding=True))
+
+    deleted = 0
+    for chunk in chunked(races):
+        with engine.begin() as conn:
+            loaded = pd.read_sql(select, conn, params={'races': chunk})
+            deleted += conn.execute(delete_unhashed, {'races': chunk}).rowcount
+            stale = loaded[HASH_COLUMN].dropna().astype('int64').to_numpy()
+            for stale_chunk in chunked(stale[~np.isin(stale, hashes)]):
+                deleted += conn.execute(delete_hashes, {'races': chunk, 'hashes': stale_chunk}).rowcount
+
+    if deleted:
+        log('manifest', f"{table}: deleted {deleted} rows that are no longer in the source file.")
+    return deleted
+
+
+# Stores the partitions that were loaded, forgets those removed from the file
+# and records the file hash, so the next load compares against this one.
+def save_manifest(engine, table, file_hash, partitions, removed=()):
+
+    rows = partitions.assign(table_name=table)[['table_name', 'source_race_id', 'row_count', 'partition_hash']]
+    file_row = pd.DataFrame({'table_name': [table], 'file_hash': [file_hash],
+                             'loaded_at': [pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')]})
+    forget = text(f"DELETE FROM {PARTITION_TABLE} WHERE table_name = :table_name AND source_race_id IN :races"
+                  ).bindparams(bindparam('races', expanding=True))
+
+    with engine.begin() as conn:
+        for chunk in chunked(removed):
+            conn.execute(forget, {'table_name': table, 'races': chunk})
+        upsert_rows(conn, PARTITION_TABLE, rows, ['table_name', 'source_race_id'])
+        upsert_rows(conn, FILE_TABLE, file_row, ['table_name'])
+
+
+# Loaded file hash, partitions and rows of every table.
+def status(engine):
+
+    query = (f"SELECT f.table_name, f.file_hash, f.loaded_at, COUNT(p.source_race_id) AS partitions, "
+             f"SUM(p.row_count) AS row_count FROM {FILE_TABLE} f LEFT JOIN {PARTITION_TABLE} p "
+             "ON p.table_name = f.table_name GROUP BY f.table_name, f.file_hash, f.loaded_at ORDER BY f.table_name")
+
+    return pd.read_sql(text(query), con=engine)
+
+
+# Forgets what was loaded (of one table or all), so the next load with changes
+# reloads every partition.
+def clear(engine, table=None):
+
+    deleted = 0
+    with engine.begin() as conn:
+        for name in [FILE_TABLE, PARTITION_TABLE]:
+            query, params = f"DELETE FROM {name}", {}
+            if table:
+                query += " WHERE table_name = :table_name"
+                params['table_name'] = table
+            deleted += conn.execute(text(query), params).rowcount
+
+    log('manifest', f"Removed {deleted} manifest rows.")
+
+
+if __name__ == '__main__':
+
+    from connections import get_connection, load_db_config
+
+    parser = argparse.ArgumentParser(description='Show or clear the manifest of the source files loaded.')
+    parser.add_argument('command', choices=['status', 'clear'])
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default=None, help='Database to inspect (the one of config.json by default).')
+    parser.add_argument('--table', default=None)
+    args = parser.parse_args()
+
+    engine = get_connection(load_db_config(args.config), args.database)
+    ensure_manifest_tables(engine)
+
+    if args.command == 'status':
+        print(status(engine).to_string(index=False))
+    else:
+        clear(engine, args.table)
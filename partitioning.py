@@ -0,0 +1,47 @@
+import time as _time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import log
+
+
+# Times a partition is prepared or loaded again after failing, and the wait
+# before the first retry (doubled every time).
+PARTITION_RETRIES = 2
+RETRY_SECONDS = 1.0
+
+
+# Splits a fact source frame into at most n frames of whole seasons, ranges of
+# consecutive seasons with about the same number of rows. Every race (and so
+# every duplicate row and every race-level computation) stays in one partition.
+# Rows of races missing from the races file go to the last partition. The rows
+# keep their order and index.
+def season_partitions(fact_data, races_csv, n, race_col='raceId'):
+
+    if n <= 1 or len(fact_data) == 0:
+        return [fact_data]
+
+    seasons = races_csv.drop_duplicates('raceId').set_index('raceId')['year']
+    year = fact_data[race_col].map(seasons)
+
+    rows = year.value_counts().sort_index()
+    before = rows.cumsum() - rows
+    bucket_of_year = pd.Series(np.minimum(before.to_numpy() * n // len(fact_data), n - 1), index=rows.index)
+    bucket = year.map(bucket_of_year).fillna(n - 1).to_numpy(dtype='int64')
+
+    return [fact_data[bucket == b] for b in range(n) if (bucket == b).any()]
+
+
+# Calls load (which returns None when it fails, like the loaders) until it
+# succeeds or PARTITION_RETRIES retries are used. Loads skip the rows an
+# earlier attempt already wrote (by their row_hash), so retrying is safe.
+def load_with_retry(load, what, retries=PARTITION_RETRIES, backoff=RETRY_SECONDS):
+
+    for attempt in range(retries + 1):
+        used = load()
+        if used is not None or attempt == retries:
+            return used
+        delay = backoff * 2 ** attempt
+        log('partitioning', f"{what} failed, retry {attempt + 1}/{retries} in {delay:.1f}s.")
+        _time.sleep(delay)
@@ -0,0 +1,715 @@
+import argparse
+import contextlib
+import functools
+import hashlib
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import data_preparation
+import duckdb_backend
+import instrumentation
+from data_preparation import *
+from fact_specs import fact_dimensions, fact_source_maps, fact_sources, facts_source_maps, plan_for
+from key_registry import build_key_index, register_dimension
+from incremental import ensure_natural_keys, get_watermark, set_watermark, filter_new_races
+from loaders import *
+from connections import POOL_SETTINGS, dispose_all, get_connection, load_db_config, pool_settings
+from bulk_load import bulk_load
+from streaming import stream_fact
+from source_schemas import SOURCE_FILES, read_source, read_options, source_path
+from staging_cache import CACHE_DIR, cached_read_source, file_hash
+from checkpoints import checkpointed_sink
+from instrumentation import span
+from schema import add_missing_columns, bulk_mode, create_schema
+from aggregates import refresh_aggregates
+from fingerprint import HASH_COLUMN, drop_loaded, ensure_hash_columns
+from compaction import compact_frames, memory_report
+from shared_maps import attach, detach, shared_source_maps
+from timing import backfill_qualifying_times, refresh_pole_gaps
+from key_encoding import decode_ids, map_source_ids
+from partitioning import PARTITION_RETRIES, load_with_retry, season_partitions
+from manifest import (combine_partitions, delete_stale_rows, diff_partitions, ensure_manifest_tables,
+                      loaded_file_hash, loaded_partitions, partition_hashes, save_manifest)
+
+
+# Source file, preparation and load function of every dimension table.
+DIMENSIONS = {
+    'driver': ('drivers', prepare_driver_data, load_driver_data),
+    'constructor': ('constructors', prepare_constructor_data, load_constructor_data),
+    'race': ('races', prepare_race_data, load_race_data),
+    'circuit': ('circuits', prepare_circuit_data, load_circuit_data),
+    'status': ('status', prepare_status_data, load_status_data),
+}
+
+
+# Module with the preparers of the selected backend. Both give the same frames.
+def _backend(backend):
+    return duckdb_backend if backend == 'duckdb' else data_preparation
+
+
+# Prepares a fact table from its mapping spec (fact_specs.py) with the engine of
+# the selected backend. sources holds the source frames read by read_sources();
+# source_maps the dimension lookups when they were already built.
+def _prepare_fact(fact, sources, fact_data, registry, backend='pandas', source_maps=None):
+    return _backend(backend).prepare_fact(fact, fact_data, sources, registry, source_maps)
+
+
+# Sources, dimensions, preparation and load function of every fact table. The
+# sources and dimensions come from the mapping spec of the table.
+FACT_LOADERS = {
+    'qualifying': load_qualifying_data,
+    'pit_stops': load_pit_stops_data,
+    'results': load_results_data,
+    'driver_standings': load_driver_standings_data,
+    'constructor_standings': load_constructor_standings_data,
+    'constructor_results': load_constructor_results_data,
+    'lap_times': load_lap_times_data,
+}
+
+FACTS = {
+    fact: {
+        'sources': fact_sources(fact),
+        'dimensions': fact_dimensions(fact),
+        'prepare': functools.partial(_prepare_fact, fact),
+        'load': load,
+    }
+    for fact, load in FACT_LOADERS.items()
+}
+# Loads that write part of a race (streamed chunks, changed rows only) leave
+# gaps to pole computed without its other rows, so they are recomputed after
+FACTS['qualifying']['after_partial_load'] = refresh_pole_gaps
+
+# Fact tables too large to read whole: they are always streamed, in chunks of
+# this many rows unless --stream sets another size, without keeping the hashes
+# of the rows written (rows already in the table are still skipped).
+STREAMED_FACTS = {'lap_times': 250000}
+for fact, size in STREAMED_FACTS.items():
+    FACTS[fact].update(chunksize=size, remember=False)
+
+# Championship tables: the standings after every race and the points of every
+# constructor in every race.
+STANDINGS_FACTS = ['driver_standings', 'constructor_standings', 'constructor_results']
+
+
+# Target databases. A database of None means the one set in config.json.
+MARTS = {
+    'formula1': {'database': None, 'facts': ['qualifying', 'pit_stops', 'results'] + STANDINGS_FACTS + ['lap_times']},
+    'qualifying': {'database': 'qualifying_db', 'facts': ['qualifying']},
+    'pit_stops': {'database': 'pit_stops_db', 'facts': ['pit_stops']},
+    'results': {'database': 'results_db', 'facts': ['results'] + STANDINGS_FACTS},
+}
+
+
+def mart_dimensions(mart):
+    needed = {d for fact in MARTS[mart]['facts'] for d in FACTS[fact]['dimensions']}
+    return [d for d in DIMENSIONS if d in needed]
+
+
+# Reads every source file needed by the selected marts exactly once. The races
+# file also gets its date columns here, so no preparer has to parse them again.
+# Files named in skip (fact files that will be streamed) are not read. Every
+# file is parsed with its declared schema, optionally by the pyarrow engine,
+# unless an unchanged copy is found in the staging cache (cache_dir=None skips it).
+def read_sources(marts, data_dir='Data', skip=(), parser='c', cache_dir=CACHE_DIR):
+
+    needed = set()
+    for mart in marts:
+        for fact in MARTS[mart]['facts']:
+            needed.update(FACTS[fact]['sources'])
+        needed.update(DIMENSIONS[d][0] for d in mart_dimensions(mart))
+
+    sources = {}
+    for name in SOURCE_FILES:
+        if name in needed and name not in skip:
+            with span(f'read_{name}', parser=parser) as stage:
+                if cache_dir:
+                    sources[name] = cached_read_source(name, data_dir, engine=parser, cache_dir=cache_dir)
+                else:
+                    sources[name] = read_source(name, data_dir, engine=parser)
+                stage['rows_out'] = len(sources[name])
+
+    if 'races' in sources:
+        with span('transform_date', rows_in=len(sources['races'])):
+            sources['races'] = transform_date(sources['races'], date_col='date')
+
+    return sources
+
+
+# Prepares every dimension needed by the selected marts once, together with the
+# hashed index of its normalized natural keys.
+def prepare_dimensions(sources, marts):
+
+    needed = {d for mart in marts for d in mart_dimensions(mart)}
+    prepared = {}
+
+    for dimension, (source, prepare, _) in DIMENSIONS.items():
+        if dimension in needed:
+            with span(f'prepare_{dimension}', rows_in=len(sources[source])) as stage:
+                dim_data = prepare(sources[source]).reset_index(drop=True)
+                prepared[dimension] = (dim_data, build_key_index(dimension, dim_data))
+                stage['rows_out'] = len(dim_data)
+
+    return prepared
+
+
+def _registry_signature(registry, dimensions):
+    return tuple((d, hash(registry[d].to_numpy().tobytes())) for d in dimensions)
+
+
+# Surrogate ids of the given source race ids (those not in the races file are
+# left out).
+def _race_ids(fact, sources, registry, source_races):
+
+    codes = map_source_ids(fact_source_maps(fact, sources, registry)['race'], sorted(source_races))
+    return {int(race) for race in decode_ids(codes).dropna()}
+
+
+# Compares the source file of a fact table with the manifest of the database
+# (manifest.py). Returns None when the file is the one loaded last. Otherwise
+# partitions (a function, only called then) gives the partition hashes of the
+# file, and the result holds them with the source race ids whose rows are new
+# or changed, those among them loaded before, and those removed from the file.
+def _source_changes(engine, fact, path, partitions):
+
+    digest = file_hash(path)
+    if digest == loaded_file_hash(engine, fact):
+        print(f"{fact}: {path} has not changed since the last load.")
+        return None
+
+    partitions = partitions()
+    loaded = loaded_partitions(engine, fact)
+    changed, removed = diff_partitions(loaded, partitions)
+    print(f"{fact}: {len(changed)} new or changed races, {len(removed)} removed.")
+
+    return {'file_hash': digest, 'partitions': partitions, 'changed': changed, 'removed': removed,
+            'reloaded': changed & set(loaded['source_race_id'].tolist())}
+
+
+# Once the changed races of a fact table are loaded, deletes the rows of the
+# races loaded before that the new file no longer has (hashes are the row_hash
+# of every row prepared from it) and saves the manifest of the file. Returns
+# the surrogate ids of the races written or removed.
+def _apply_changes(engine, fact, changes, sources, registry, hashes):
+
+    with span(f'apply_changes_{fact}', races=len(changes['changed']), removed=len(changes['removed'])) as stage:
+        stale = _race_ids(fact, sources, registry, changes['reloaded'] | changes['removed'])
+        stage['deleted'] = delete_stale_rows(engine, fact, stale, hashes)
+        save_manifest(engine, fact, changes['file_hash'], changes['partitions'], changes['removed'])
+
+    return _race_ids(fact, sources, registry, changes['changed'] | changes['removed'])
+
+
+# Loads the dimensions of one mart and returns its registry of surrogate ids.
+# The dimensions are always upserted by their natural key (whose unique indexes
+# are added when missing), so a rerun keeps the ids of the rows already loaded.
+# The dimension tables do not depend on each other, so with workers > 1 they
+# are loaded concurrently from a thread pool, each over its own pooled connection.
+# Ids are only registered once every dimension is written; a failed load raises.
+def load_mart_dimensions(engine, mart, prepared, workers=POOL_SETTINGS['pool_size']):
+
+    registry = {}
+    dimensions = mart_dimensions(mart)
+    ensure_natural_keys(engine, dimensions)
+
+    with span(f'load_dimensions_{mart}', workers=min(workers, len(dimensions))):
+        if workers <= 1 or len(dimensions) <= 1:
+            loaded = {d: DIMENSIONS[d][2](engine, prepared[d][0]) for d in dimensions}
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(dimensions))) as pool:
+                futures = {d: pool.submit(DIMENSIONS[d][2], engine, prepared[d][0]) for d in dimensions}
+                loaded = {d: future.result() for d, future in futures.items()}
+
+    for dimension in dimensions:
+        register_dimension(registry, dimension, loaded[dimension], key_index=prepared[dimension][1])
+
+    return registry
+
+
+# Runs a preparer in a worker process and returns its result together with
+# the spans it recorded, so they reach the instrumentation of the main process.
+def _prepare_in_worker(prepare, *args):
+
+    instrumentation.reset()
+    result = prepare(*args)
+
+    return result, instrumentation.spans()
+
+
+# Prepares a fact table in a worker process with the dimension lookups of a
+# shared_source_maps() handle, read where the main process published them.
+def _prepare_with_shared_maps(prepare, handle, fact_data, backend):
+
+    try:
+        return _prepare_in_worker(prepare, None, fact_data, None, backend, attach(handle))
+    finally:
+        detach(handle)
+
+
+# Prepares the given fact tables. With an executor (a process pool) the
+# preparers run in parallel; the dimension lookups of all of them are built
+# once and shared with the workers (shared_source_maps()), so a task only
+# carries its source frame. Results are always returned in the order of facts.
+def prepare_facts(facts, sources, fact_inputs, registry, executor=None, backend='pandas'):
+
+    if executor is None:
+        return {fact: FACTS[fact]['prepare'](sources, fact_inputs[fact], registry, backend) for fact in facts}
+
+    prepared = {}
+    with shared_source_maps(facts_source_maps(facts, sources, registry)) as handle:
+        futures = {fact: executor.submit(_prepare_with_shared_maps, FACTS[fact]['prepare'], handle,
+                                         fact_inputs[fact], backend) for fact in facts}
+        for fact in facts:
+            prepared[fact], worker_spans = futures[fact].result()
+            instrumentation.extend(worker_spans)
+
+    return prepared
+
+
+# Dimension lookups and backend of a partition worker, set once per process by
+# its initializer (see load_partitioned()). The lookups are read-only views of
+# the shared memory block the main process published them in.
+_WORKER_STATE = {}
+
+
+def _init_partition_worker(handle, backend):
+    _WORKER_STATE.update(source_maps=attach(handle), backend=backend)
+
+
+# Prepares one partition of a fact table with the lookups the worker attached,
+# so the task only carries its rows. Returns it with the spans it recorded.
+def _prepare_partition(fact, fact_data):
+    return _prepare_in_worker(FACTS[fact]['prepare'], None, fact_data, None, _WORKER_STATE['backend'],
+                              _WORKER_STATE['source_maps'])
+
+
+# Prepares and loads fact tables partitioned by season: every source frame is
+# split into up to `partitions` ranges of whole seasons (season_partitions()),
+# which are prepared in a pool of worker processes. The dimension lookups of
+# every fact are built once and published in shared memory, which each worker
+# attaches when it starts instead of receiving a copy. Every partition is
+# loaded from a thread pool as soon as it is prepared, and one whose
+# preparation or load fails is retried on its own. Returns, for every fact,
+# the race_id and row_hash of the rows prepared and whether every partition
+# was loaded.
+def load_partitioned(engine, fact_inputs, sources, registry, partitions, workers=1, strategy='auto',
+                     backend='pandas', batch_size=None, compact=False):
+
+    parts = {(fact, n): part for fact, data in fact_inputs.items()
+             for n, part in enumerate(season_partitions(data, sources['races'], partitions))}
+    prepared, loads, attempts = {}, {}, Counter()
+
+    with shared_source_maps(facts_source_maps(fact_inputs, sources, registry)) as handle, \
+            span('prepare_partitions', partitions=len(parts), workers=workers), \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_partition_worker,
+                                initargs=(handle, backend)) as pool, \
+            ThreadPoolExecutor(max_workers=workers) as loaders:
+
+        pending = {pool.submit(_prepare_partition, fact, part): (fact, n) for (fact, n), part in parts.items()}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                fact, n = key = pending.pop(future)
+                try:
+                    data, worker_spans = future.result()
+                except Exception as ex:
+                    attempts[key] += 1
+                    if attempts[key] > PARTITION_RETRIES:
+                        print(f"{fact} partition {n} could not be prepared: {ex}")
+                    else:
+                        pending[pool.submit(_prepare_partition, fact, parts[key])] = key
+                    continue
+
+                instrumentation.extend(worker_spans)
+                if compact:
+                    data = compact_frames({fact: data}, prefix='compact_partition')[fact]
+                prepared[key] = data[['race_id', HASH_COLUMN]]
+                loads[key] = loaders.submit(load_with_retry, functools.partial(
+                    FACTS[fact]['load'], engine, data, strategy, batch_size), f"{fact} partition {n}")
+
+        loaded = {key: future.result() for key, future in loads.items()}
+
+    result = {}
+    for fact in fact_inputs:
+        keys = [key for key in parts if key[0] == fact]
+        frames = [prepared[key] for key in keys if key in prepared]
+        result[fact] = (pd.concat(frames) if frames else pd.DataFrame(columns=['race_id', HASH_COLUMN]),
+                        all(loaded.get(key) for key in keys))
+
+    return result
+
+
+# Loads the prepared fact tables, over a thread pool when workers > 1, and
+# returns the strategy used for each one (None if its load failed). With a
+# batch_size every table is committed in checkpointed batches.
+def load_facts(engine, fact_tables, strategy='auto', workers=1, batch_size=None):
+
+    if workers <= 1 or len(fact_tables) <= 1:
+        return {fact: FACTS[fact]['load'](engine, data, strategy, batch_size) for fact, data in fact_tables.items()}
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(fact_tables))) as pool:
+        futures = {fact: pool.submit(FACTS[fact]['load'], engine, data, strategy, batch_size)
+                   for fact, data in fact_tables.items()}
+        return {fact: future.result() for fact, future in futures.items()}
+
+
+# Streams the fact tables of a mart from their CSV files in chunks of chunksize
+# rows (or the chunksize of the fact when None), writing every prepared chunk
+# straight to the database. Facts whose file is missing are skipped. With
+# checkpoint=True every chunk is committed with a checkpoint, and chunks
+# committed by a failed earlier run of the same file are skipped. With changes
+# only the races whose rows changed since the last load are streamed (see
+# load_mart_facts). Returns the race ids written to each fact table (also those
+# of a stream that failed).
+def stream_facts(engine, facts, sources, registry, data_dir='Data', chunksize=100000,
+                 strategy='auto', incremental=False, backend='pandas', checkpoint=False, changes=False):
+
+    touched = {}
+    for fact in facts:
+        spec = FACTS[fact]
+        size = chunksize or spec.get('chunksize', 100000)
+
+        if not os.path.exists(source_path(fact, data_dir)):
+            with span(f'stream_{fact}', chunksize=size) as stage:
+                stage.update(status='skipped')
+            print(f"{source_path(fact, data_dir)} not found, {fact} is not loaded.")
+            continue
+
+        # The dimension lookups are the same for every chunk
+        source_maps = fact_source_maps(fact, sources, registry)
+        previous = get_watermark(engine, fact) if incremental else None
+        newest, races, hashes = [], set(), []
+
+        diff = None
+        if changes:
+            path = source_path(fact, data_dir)
+            diff = _source_changes(engine, fact, path, lambda: combine_partitions(
+                partition_hashes(chunk, plan_for(fact, chunk)['used'])
+                for chunk in pd.read_csv(path, chunksize=size, **read_options(fact))))
+            if diff is None:
+                continue
+            if not diff['changed']:
+                touched[fact] = _apply_changes(engine, fact, diff, sources, registry, np.empty(0, dtype='int64'))
+                continue
+            previous = tuple(sorted(diff['changed']))
+            reloaded = _race_ids(fact, sources, registry, diff['reloaded'])
+
+        if checkpoint:
+            run = hashlib.sha256(repr((file_hash(source_path(fact, data_dir)), size, previous,
+                                       _registry_signature(registry, spec['dimensions']))).encode()).hexdigest()[:16]
+            write = checkpointed_sink(engine, fact, run, strategy)
+        else:
+            write = functools.partial(bulk_load, engine, fact, strategy=strategy)
+
+        def sink(chunk):
+            if diff is not None:
+                hashes.append(chunk.loc[chunk['race_id'].isin(reloaded).to_numpy(), HASH_COLUMN].to_numpy())
+            chunk = drop_loaded(engine, fact, chunk)
+            write(chunk)
+            races.update(chunk['race_id'].dropna().unique())
+
+        touched[fact] = races
+
+        def row_filter(chunk):
+            if diff is not None:
+                return chunk[chunk['raceId'].isin(diff['changed']).to_numpy()]
+            chunk, watermark = filter_new_races(chunk, sources['races'], previous)
+            if watermark is not None:
+                newest.append(watermark)
+            return chunk
+
+        with span(f'stream_{fact}', chunksize=size) as stage:
+            try:
+                stats = stream_fact(
+                    source_path(fact, data_dir),
+                    prepare=lambda chunk: spec['prepare'](sources, chunk, registry, backend, source_maps),
+                    sink=sink,
+                    chunksize=size,
+                    row_filter=row_filter if incremental or diff is not None else None,
+                    read_options=read_options(fact),
+                    remember=spec.get('remember', True),
+                )
+            except Exception as ex:
+                stage.update(status='error', error=str(ex))
+                stats = None
+            else:
+                stage.update(rows_in=stats['rows_read'], rows_out=stats['rows_written'], chunks=stats['chunks'],
+                             duplicates=stats['duplicates'])
+
+        if stats is not None and diff is not None:
+            races |= _apply_changes(engine, fact, diff, sources, registry,
+                                    np.concatenate(hashes) if hashes else np.empty(0, dtype='int64'))
+
+        # Also after a failure: the races already written stay in the table
+        if 'after_partial_load' in spec and races:
+            spec['after_partial_load'](engine, races)
+        if stats is None:
+            continue
+
+        if incremental and newest:
+            set_watermark(engine, fact, max(newest))
+
+    return touched
+
+
+# Prepares the fact tables of a mart (reusing those already prepared for another
+# mart with the same ids) and loads them. Returns the race ids loaded into each
+# fact table whose load succeeded. With compact the prepared tables are kept in
+# their smallest types (compaction.py) and their sizes before go to sizes. facts
+# limits the load to some of the fact tables of the mart.
+# With changes the source files are compared with the manifest of the last load
+# (manifest.py) instead: unchanged files are skipped, only the races whose rows
+# are new or changed are prepared and loaded (rows already in the table are
+# skipped by their hash), then the rows the new file no longer has are deleted.
+# With partitions every fact table is prepared and loaded in that many season
+# partitions by load_partitioned(), in a pool of workers processes (prepared
+# tables are not reused between marts then).
+def load_mart_facts(engine, mart, sources, registry, prepared_facts, executor=None, strategy='auto', workers=1,
+                    incremental=False, backend='pandas', batch_size=None, compact=False, sizes=None, facts=None,
+                    data_dir='Data', changes=False, partitions=None):
+
+    fact_inputs, watermarks, keys, diffs, removed = {}, {}, {}, {}, {}
+    for fact in facts if facts is not None else MARTS[mart]['facts']:
+        fact_data = sources[fact]
+        previous = None
+
+        if incremental:
+            previous = get_watermark(engine, fact)
+            fact_data, watermarks[fact] = filter_new_races(fact_data, sources['races'], previous)
+        elif changes:
+            diffs[fact] = _source_changes(engine, fact, source_path(fact, data_dir), lambda: partition_hashes(
+                sources[fact], plan_for(fact, sources[fact])['used']))
+            if diffs[fact] is None or not diffs[fact]['changed']:
+                # Nothing to load, but races may have been removed from the file
+                diff = diffs.pop(fact)
+                if diff is not None:
+                    removed[fact] = _apply_changes(engine, fact, diff, sources, registry, np.empty(0, dtype='int64'))
+                continue
+            fact_data = fact_data[fact_data['raceId'].isin(diffs[fact]['changed']).to_numpy()]
+            previous = tuple(sorted(diffs[fact]['changed']))
+
+        fact_inputs[fact] = fact_data
+        keys[fact] = (fact, _registry_signature(registry, FACTS[fact]['dimensions']),
+                      previous if incremental or changes else 'full')
+
+    if partitions and fact_inputs:
+        results = load_partitioned(engine, fact_inputs, sources, registry, partitions, max(workers, 1), strategy,
+                                   backend, batch_size, compact)
+        prepared = {fact: data for fact, (data, _) in results.items()}
+        loaded = {fact: done for fact, (_, done) in results.items()}
+    else:
+        missing = [fact for fact in fact_inputs if keys[fact] not in prepared_facts]
+        for fact, data in prepare_facts(missing, sources, fact_inputs, registry, executor, backend).items():
+            if compact:
+                before = {}
+                data = compact_frames({fact: data}, sizes=before)[fact]
+                if sizes is not None:
+                    sizes[keys[fact]] = before[fact]
+            prepared_facts[keys[fact]] = data
+
+        prepared = {fact: prepared_facts[keys[fact]] for fact in fact_inputs}
+        loaded = load_facts(engine, prepared, strategy, workers, batch_size)
+
+    if incremental:
+        for fact, used in loaded.items():
+            if used and watermarks[fact] is not None:
+                set_watermark(engine, fact, watermarks[fact])
+
+    touched = {fact: set(prepared[fact]['race_id'].dropna().unique()) for fact, used in loaded.items() if used}
+    touched.update(removed)
+
+    for fact, diff in diffs.items():
+        if loaded[fact]:
+            touched[fact] |= _apply_changes(engine, fact, diff, sources, registry,
+                                            prepared[fact][HASH_COLUMN].to_numpy(dtype='int64'))
+            if 'after_partial_load' in FACTS[fact] and touched[fact]:
+                FACTS[fact]['after_partial_load'](engine, touched[fact])
+
+    return touched
+
+
+# Prints the memory used by the source frames and the prepared fact tables, next
+# to their size before compaction.
+def _report_memory(sources, prepared_facts, sizes):
+
+    frames = {f'source_{name}': df for name, df in sources.items()}
+    before = {f'source_{name}': size for name, size in sizes.items() if name in sources}
+
+    versions = Counter(key[0] for key in prepared_facts)
+    for n, (key, df) in enumerate(prepared_facts.items()):
+        name = key[0] if versions[key[0]] == 1 else f'{key[0]}_{n}'
+        frames[name] = df
+        if key in sizes:
+            before[name] = sizes[key]
+
+    print("==== Memory (MB) ====")
+    print(memory_report(frames, before).to_string(index=False))
+
+
+# Runs the selected marts in a single pass: the CSV files are read and the
+# dimensions prepared once, then each mart gets its dimensions and facts loaded.
+# Prepared fact tables are reused between marts whose surrogate ids match.
+# With workers > 1 the fact tables of a mart are prepared in a process pool and
+# loaded from a thread pool. With a chunksize the fact files are streamed instead
+# (those of STREAMED_FACTS always are).
+# backend='duckdb' runs the fact preparers as DuckDB queries when it is installed.
+# With a batch_size the fact tables are loaded in checkpointed batches (streamed
+# chunks are checkpointed one by one), and running the same load again after a
+# failure resumes it.
+# create_tables creates the missing tables of each mart from schema.py, and bulk
+# drops the foreign keys and indexes of the fact tables while they are loaded,
+# then rebuilds them and checks the foreign keys. With aggregates the summary
+# tables of aggregates.py are refreshed for the races each load touched.
+# With compact the fact source frames and the prepared fact tables are kept in
+# their smallest types (compaction.py); report_memory prints their sizes.
+# The dimensions are always upserted (see load_mart_dimensions()) and fact rows
+# already in a table are skipped by their row_hash, so running the same load
+# again duplicates nothing. With incremental only the fact rows of races after
+# the last one loaded are read, and with changes only the races whose rows
+# changed since the last load of each fact table.
+# With partitions the fact tables read whole are prepared and loaded in that
+# many season partitions, over workers processes (see load_partitioned()).
+def run_pipeline(marts, db_config=None, incremental=False, data_dir='Data', workers=1, chunksize=None,
+                 parser='c', cache_dir=CACHE_DIR, backend='pandas', batch_size=None, bulk=False,
+                 create_tables=False, aggregates=True, compact=True, report_memory=False, changes=False,
+                 partitions=None):
+
+    if 'all' in marts:
+        marts = list(MARTS)
+    marts = list(dict.fromkeys(marts))
+
+    db_config = db_config or load_db_config()
+    strategy = db_config.get('load_strategy', 'auto')
+
+    if backend == 'duckdb' and not duckdb_backend.available():
+        print("duckdb is not installed, preparing the fact tables with pandas.")
+        backend = 'pandas'
+
+    sources = read_sources(marts, data_dir, skip=FACTS if chunksize else STREAMED_FACTS, parser=parser,
+                           cache_dir=cache_dir)
+    prepared = prepare_dimensions(sources, marts)
+    prepared_facts = {}
+
+    # The dimension sources are left as read: their natural keys are matched as text
+    sizes = {}
+    if compact:
+        sources.update(compact_frames({fact: sources[fact] for fact in FACTS if fact in sources},
+                                      prefix='compact_source', sizes=sizes))
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and not partitions else None
+
+    try:
+        for mart in marts:
+            database = MARTS[mart]['database'] or db_config['database']
+            print(f"==== {mart} mart ({database}) ====")
+
+            try:
+                engine = get_connection(db_config, database)
+                print(f"Connection to the {db_config['host']} for user {db_config['user']} created successfully.")
+            except Exception as ex:
+                print("Connection could not be made due to the following error: \n", ex)
+                continue
+
+            if create_tables:
+                create_schema(engine, mart_dimensions(mart) + MARTS[mart]['facts'])
+            ensure_hash_columns(engine, MARTS[mart]['facts'])
+            if changes:
+                ensure_manifest_tables(engine)
+            if 'qualifying' in add_missing_columns(engine, MARTS[mart]['facts']):
+                backfill_qualifying_times(engine)
+
+            try:
+                registry = load_mart_dimensions(engine, mart, prepared, pool_settings(db_config)['pool_size'])
+            except Exception as ex:
+                print(f"The dimensions of the {mart} mart could not be loaded, its fact tables are not loaded: \n",
+                      ex)
+                continue
+
+            streamed = [fact for fact in MARTS[mart]['facts'] if chunksize or fact in STREAMED_FACTS]
+            in_memory = [fact for fact in MARTS[mart]['facts'] if fact not in streamed]
+
+            with bulk_mode(engine, MARTS[mart]['facts']) if bulk else contextlib.nullcontext():
+                touched = {}
+                if in_memory:
+                    touched.update(load_mart_facts(engine, mart, sources, registry, prepared_facts, executor,
+                                                   strategy, workers, incremental and not changes, backend,
+                                                   batch_size, compact, sizes, in_memory, data_dir, changes,
+                                                   partitions))
+                if streamed:
+                    touched.update(stream_facts(engine, streamed, sources, registry, data_dir, chunksize, strategy,
+                                                incremental and not changes, backend, checkpoint=bool(batch_size),
+                                                changes=changes))
+
+            if aggregates:
+                refresh_aggregates(engine, touched)
+
+        if report_memory:
+            _report_memory(sources, prepared_facts, sizes)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        dispose_all()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Load the Formula 1 CSV files into the selected data marts.')
+    parser.add_argument('marts', nargs='+', choices=list(MARTS) + ['all'],
+                        help='Data marts to load in this run, or "all".')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only load fact rows of races newer than the last load.')
+    parser.add_argument('--changes', action='store_true',
+                        help='Only load the races whose fact rows changed since the last load (replaces the race '
+                             'watermark of --incremental).')
+    parser.add_argument('--config', default='config.json', help='Database connection settings.')
+    parser.add_argument('--data-dir', default='Data', help='Folder with the CSV files.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Prepare and load the fact tables of each mart in parallel with this many workers.')
+    parser.add_argument('--partitions', type=int, default=None,
+                        help='Split every fact table read whole into this many season ranges, prepared by the '
+                             '--workers processes and loaded as each one is ready.')
+    parser.add_argument('--stream', type=int, metavar='CHUNKSIZE', default=None,
+                        help='Stream the fact CSV files in chunks of this many rows instead of reading them whole.')
+    parser.add_argument('--parser', choices=['c', 'pyarrow'], default='c',
+                        help='CSV parsing engine (pyarrow must be installed).')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always parse the CSV files instead of using the staging cache.')
+    parser.add_argument('--backend', choices=duckdb_backend.BACKENDS, default='pandas',
+                        help='Engine that prepares the fact tables (duckdb must be installed).')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Commit the fact tables in checkpointed batches of this many rows; running the same '
+                             'load again after a failure resumes from the first uncommitted batch.')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Drop the foreign keys and indexes of the fact tables during the load and rebuild them '
+                             'afterwards.')
+    parser.add_argument('--create-schema', action='store_true',
+                        help='Create the missing tables and indexes of every mart before loading it.')
+    parser.add_argument('--no-aggregates', action='store_true',
+                        help='Do not refresh the summary tables of the dashboards after loading the fact tables.')
+    parser.add_argument('--no-compact', action='store_true',
+                        help='Keep the fact tables in the types they were read and prepared with.')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='Print the memory used by the source frames and the prepared fact tables.')
+    parser.add_argument('--metrics', default=None,
+                        help='Write the timed stages to this file (JSON lines, or Prometheus text for .prom).')
+    parser.add_argument('--profile', metavar='DIR', default=None,
+                        help='Save a cProfile file of every stage (or of --profile-stage) to this folder.')
+    parser.add_argument('--profile-stage', action='append', default=None,
+                        help='Stage to profile, e.g. prepare_results. Can be repeated.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record the tracemalloc peak of every stage (slower).')
+    args = parser.parse_args()
+
+    instrumentation.configure(trace_memory=args.trace_memory, profile_dir=args.profile,
+                              profile_stages=set(args.profile_stage) if args.profile_stage else None)
+    try:
+        run_pipeline(args.marts, load_db_config(args.config), args.incremental, args.data_dir, args.workers,
+                     args.stream, args.parser, None if args.no_cache else CACHE_DIR, args.backend, args.batch_size,
+                     args.bulk, args.create_schema, not args.no_aggregates, not args.no_compact,
+                     args.memory_report, args.changes, args.partitions)
+    finally:
+        if args.metrics:
+            instrumentation.export(args.metrics)
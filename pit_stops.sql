@@ -7,7 +7,10 @@ CREATE TABLE IF NOT EXISTS driver (
   driver_name VARCHAR(255),
   driver_surname VARCHAR(255),
   driver_nationality VARCHAR(255),
-  date_of_birth DATETIME
+  date_of_birth DATETIME,
+  UNIQUE KEY uq_driver_natural_key (driver_name, driver_surname, date_of_birth),
+  KEY ix_driver_nationality (driver_nationality, driver_id),
+  KEY ix_driver_surname (driver_surname, driver_name, driver_id)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS race (
@@ -15,7 +18,9 @@ CREATE TABLE IF NOT EXISTS race (
   year INT,
   month INT,
   day INT,
-  race_name VARCHAR(255)
+  race_name VARCHAR(255),
+  UNIQUE KEY uq_race_natural_key (year, race_name),
+  KEY ix_race_year (year, race_id)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS pit_stops (
@@ -27,19 +32,45 @@ CREATE TABLE IF NOT EXISTS pit_stops (
   lap_number INT,
   stop_time TIME,
   stop_duration INT,
+  row_hash BIGINT,
 
-  FOREIGN KEY(driver_id) REFERENCES driver(driver_id),
-  foreign key(race_id) references race(race_id)
+  CONSTRAINT fk_pit_stops_driver FOREIGN KEY (driver_id) REFERENCES driver(driver_id),
+  CONSTRAINT fk_pit_stops_race FOREIGN KEY (race_id) REFERENCES race(race_id),
+  KEY ix_pit_stops_driver_race (driver_id, race_id),
+  KEY ix_pit_stops_race_driver (race_id, driver_id, stop_number, stop_duration),
+  KEY ix_pit_stops_row_hash (row_hash)
 ) ENGINE=InnoDB;
 
+CREATE TABLE IF NOT EXISTS load_watermark (
+  table_name VARCHAR(64) PRIMARY KEY,
+  race_date DATE
+) ENGINE=InnoDB;
 
+CREATE TABLE IF NOT EXISTS load_checkpoint (
+  run_id VARCHAR(64),
+  table_name VARCHAR(64),
+  batch_number INT,
+  row_count INT,
+  committed_at DATETIME,
+  PRIMARY KEY (run_id, table_name, batch_number)
+) ENGINE=InnoDB;
 
-SELECT * from pit_stops;
-SELECT * from driver;
-SELECT * from race;
-
-
+CREATE TABLE IF NOT EXISTS load_file (
+  table_name VARCHAR(64) PRIMARY KEY,
+  file_hash VARCHAR(64),
+  loaded_at DATETIME
+) ENGINE=InnoDB;
 
+CREATE TABLE IF NOT EXISTS load_partition (
+  table_name VARCHAR(64),
+  source_race_id INT,
+  row_count INT,
+  partition_hash BIGINT,
+  PRIMARY KEY (table_name, source_race_id)
+) ENGINE=InnoDB;
 
 
 
+SELECT * from pit_stops;
+SELECT * from driver;
+SELECT * from race;
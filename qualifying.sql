@@ -7,13 +7,17 @@ CREATE TABLE IF NOT EXISTS driver (
   driver_name VARCHAR(255),
   driver_surname VARCHAR(255),
   driver_nationality VARCHAR(255),
-  date_of_birth DATETIME
+  date_of_birth DATETIME,
+  UNIQUE KEY uq_driver_natural_key (driver_name, driver_surname, date_of_birth),
+  KEY ix_driver_nationality (driver_nationality, driver_id),
+  KEY ix_driver_surname (driver_surname, driver_name, driver_id)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS constructor (
   constructor_id INT AUTO_INCREMENT PRIMARY KEY,
   constructor_name VARCHAR(255),
-  constructor_nationality VARCHAR(255)
+  constructor_nationality VARCHAR(255),
+  UNIQUE KEY uq_constructor_natural_key (constructor_name)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS race (
@@ -21,7 +25,9 @@ CREATE TABLE IF NOT EXISTS race (
   year INT,
   month INT,
   day INT,
-  race_name VARCHAR(255)
+  race_name VARCHAR(255),
+  UNIQUE KEY uq_race_natural_key (year, race_name),
+  KEY ix_race_year (year, race_id)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS circuit (
@@ -31,7 +37,8 @@ CREATE TABLE IF NOT EXISTS circuit (
   circuit_country VARCHAR(255),
   longitude FLOAT,
   latitude FLOAT,
-  altitude FLOAT
+  altitude FLOAT,
+  UNIQUE KEY uq_circuit_natural_key (circuit_name)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS qualifying (
@@ -45,10 +52,50 @@ CREATE TABLE IF NOT EXISTS qualifying (
   q1 VARCHAR(20),
   q2 VARCHAR(20),
   q3 VARCHAR(20),
+  q1_ms INT,
+  q2_ms INT,
+  q3_ms INT,
+  best_q_ms INT,
+  gap_to_pole_ms INT,
+  row_hash BIGINT,
   
-  foreign key(circuit_id) references circuit(circuit_id),
-  foreign key(constructor_id) references constructor(constructor_id),
-  foreign key(race_id) references race(race_id),
-  foreign key(driver_id) references driver(driver_id)
+  CONSTRAINT fk_qualifying_circuit FOREIGN KEY (circuit_id) REFERENCES circuit(circuit_id),
+  CONSTRAINT fk_qualifying_constructor FOREIGN KEY (constructor_id) REFERENCES constructor(constructor_id),
+  CONSTRAINT fk_qualifying_race FOREIGN KEY (race_id) REFERENCES race(race_id),
+  CONSTRAINT fk_qualifying_driver FOREIGN KEY (driver_id) REFERENCES driver(driver_id),
+  KEY ix_qualifying_circuit (circuit_id),
+  KEY ix_qualifying_constructor_race (constructor_id, race_id),
+  KEY ix_qualifying_driver_best (driver_id, best_q_ms),
+  KEY ix_qualifying_driver_race (driver_id, race_id),
+  KEY ix_qualifying_race_best (race_id, best_q_ms, driver_id, gap_to_pole_ms),
+  KEY ix_qualifying_race_driver (race_id, driver_id, q1, q2, q3),
+  KEY ix_qualifying_row_hash (row_hash)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS load_watermark (
+  table_name VARCHAR(64) PRIMARY KEY,
+  race_date DATE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS load_checkpoint (
+  run_id VARCHAR(64),
+  table_name VARCHAR(64),
+  batch_number INT,
+  row_count INT,
+  committed_at DATETIME,
+  PRIMARY KEY (run_id, table_name, batch_number)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS load_file (
+  table_name VARCHAR(64) PRIMARY KEY,
+  file_hash VARCHAR(64),
+  loaded_at DATETIME
+) ENGINE=InnoDB;
 
-) ENGINE=InnoDB;
\ No newline at end of file
+CREATE TABLE IF NOT EXISTS load_partition (
+  table_name VARCHAR(64),
+  source_race_id INT,
+  row_count INT,
+  partition_hash BIGINT,
+  PRIMARY KEY (table_name, source_race_id)
+) ENGINE=InnoDB;
@@ -0,0 +1,527 @@
+import argparse
+import contextlib
+
+from sqlalchemy import (BigInteger, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData,
+                        PrimaryKeyConstraint, SmallInteger, String, Table, Time, UniqueConstraint, inspect, text)
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable
+
+from fingerprint import HASH_COLUMN
+from instrumentation import log, span
+
+
+# The star schema of the .sql files, which must be kept in sync with it.
+metadata = MetaData()
+
+
+def _table(name, *columns):
+    return Table(name, metadata, *columns, mysql_engine='InnoDB')
+
+
+_table(
+    'driver',
+    Column('driver_id', Integer, primary_key=True, autoincrement=True),
+    Column('driver_name', String(255)),
+    Column('driver_surname', String(255)),
+    Column('driver_nationality', String(255)),
+    Column('date_of_birth', DateTime),
+    UniqueConstraint('driver_name', 'driver_surname', 'date_of_birth', name='uq_driver_natural_key'),
+    # Dashboard filters on surname and nationality, joined to the facts by id
+    Index('ix_driver_surname', 'driver_surname', 'driver_name', 'driver_id'),
+    Index('ix_driver_nationality', 'driver_nationality', 'driver_id'),
+)
+
+_table(
+    'constructor',
+    Column('constructor_id', Integer, primary_key=True, autoincrement=True),
+    Column('constructor_name', String(255)),
+    Column('constructor_nationality', String(255)),
+    UniqueConstraint('constructor_name', name='uq_constructor_natural_key'),
+)
+
+_table(
+    'race',
+    Column('race_id', Integer, primary_key=True, autoincrement=True),
+    Column('year', Integer),
+    Column('month', Integer),
+    Column('day', Integer),
+    Column('race_name', String(255)),
+    UniqueConstraint('year', 'race_name', name='uq_race_natural_key'),
+    # Year range filter joined to the facts by id
+    Index('ix_race_year', 'year', 'race_id'),
+)
+
+_table(
+    'circuit',
+    Column('circuit_id', Integer, primary_key=True, autoincrement=True),
+    Column('circuit_name', String(255)),
+    Column('circuit_location', String(255)),
+    Column('circuit_country', String(255)),
+    Column('longitude', Float),
+    Column('latitude', Float),
+    Column('altitude', Float),
+    UniqueConstraint('circuit_name', name='uq_circuit_natural_key'),
+)
+
+_table(
+    'status',
+    Column('status_id', Integer, primary_key=True, autoincrement=True),
+    Column('status', String(255)),
+    UniqueConstraint('status', name='uq_status_natural_key'),
+)
+
+# Fact indexes start with the id the workbooks join on and include the
+# measures they show, so those queries are answered from the index alone.
+_table(
+    'qualifying',
+    Column('qualifying_id', Integer, primary_key=True, autoincrement=True),
+    Column('circuit_id', Integer, ForeignKey('circuit.circuit_id', name='fk_qualifying_circuit')),
+    Column('constructor_id', Integer, ForeignKey('constructor.constructor_id', name='fk_qualifying_constructor')),
+    Column('race_id', Integer, ForeignKey('race.race_id', name='fk_qualifying_race')),
+    Column('driver_id', Integer, ForeignKey('driver.driver_id', name='fk_qualifying_driver')),
+    Column('q1', String(20)),
+    Column('q2', String(20)),
+    Column('q3', String(20)),
+    Column('q1_ms', Integer),
+    Column('q2_ms', Integer),
+    Column('q3_ms', Integer),
+    Column('best_q_ms', Integer),
+    Column('gap_to_pole_ms', Integer),
+    Column('row_hash', BigInteger),
+    Index('ix_qualifying_row_hash', 'row_hash'),
+    Index('ix_qualifying_race_driver', 'race_id', 'driver_id', 'q1', 'q2', 'q3'),
+    Index('ix_qualifying_race_best', 'race_id', 'best_q_ms', 'driver_id', 'gap_to_pole_ms'),
+    Index('ix_qualifying_driver_best', 'driver_id', 'best_q_ms'),
+    Index('ix_qualifying_driver_race', 'driver_id', 'race_id'),
+    Index('ix_qualifying_constructor_race', 'constructor_id', 'race_id'),
+    Index('ix_qualifying_circuit', 'circuit_id'),
+)
+
+_table(
+    'pit_stops',
+    Column('pit_stops_id', Integer, primary_key=True, autoincrement=True),
+    Column('driver_id', Integer, ForeignKey('driver.driver_id', name='fk_pit_stops_driver')),
+    Column('race_id', Integer, ForeignKey('race.race_id', name='fk_pit_stops_race')),
+    Column('stop_number', Integer),
+    Column('lap_number', Integer),
+    Column('stop_time', Time),
+    Column('stop_duration', Integer),
+    Column('row_hash', BigInteger),
+    Index('ix_pit_stops_row_hash', 'row_hash'),
+    Index('ix_pit_stops_race_driver', 'race_id', 'driver_id', 'stop_number', 'stop_duration'),
+    Index('ix_pit_stops_driver_race', 'driver_id', 'race_id'),
+)
+
+_table(
+    'results',
+    Column('result_id', Integer, primary_key=True, autoincrement=True),
+    Column('constructor_id', Integer, ForeignKey('constructor.constructor_id', name='fk_results_constructor')),
+    Column('race_id', Integer, ForeignKey('race.race_id', name='fk_results_race')),
+    Column('driver_id', Integer, ForeignKey('driver.driver_id', name='fk_results_driver')),
+    Column('status_id', Integer, ForeignKey('status.status_id', name='fk_results_status')),
+    Column('car_number', Integer),
+    Column('starting_position', Integer),
+    Column('final_position', Integer),
+    Column('position_order', Integer),
+    Column('points', Integer),
+    Column('laps', Integer),
+    Column('row_hash', BigInteger),
+    Index('ix_results_row_hash', 'row_hash'),
+    Index('ix_results_race_driver', 'race_id', 'driver_id', 'final_position', 'points'),
+    Index('ix_results_driver_race', 'driver_id', 'race_id', 'final_position', 'points'),
+    Index('ix_results_constructor_race', 'constructor_id', 'race_id', 'points'),
+    Index('ix_results_status', 'status_id'),
+)
+
+# Championship standings after every race, and the points of every constructor
+# in every race, as published in the source files.
+_table(
+    'driver_standings',
+    Column('driver_standings_id', Integer, primary_key=True, autoincrement=True),
+    Column('race_id', Integer, ForeignKey('race.race_id', name='fk_driver_standings_race')),
+    Column('driver_id', Integer, ForeignKey('driver.driver_id', name='fk_driver_standings_driver')),
+    Column('points', Float),
+    Column('standing_position', Integer),
+    Column('position_text', String(8)),
+    Column('wins', Integer),
+    Column('row_hash', BigInteger),
+    Index('ix_driver_standings_row_hash', 'row_hash'),
+    Index('ix_driver_standings_race_driver', 'race_id', 'driver_id', 'standing_position', 'points'),
+    Index('ix_driver_standings_driver_race', 'driver_id', 'race_id', 'standing_position', 'points'),
+)
+
+_table(
+    'constructor_standings',
+    Column('constructor_standings_id', Integer, primary_key=True, autoincrement=True),
+    Column('race_id', Integer, ForeignKey('race.race_id', name='fk_constructor_standings_race')),
+    Column('constructor_id', Integer,
+           ForeignKey('constructor.constructor_id', name='fk_constructor_standings_constructor')),
+    Column('points', Float),
+    Column('standing_position', Integer),
+    Column('position_text', String(8)),
+    Column('wins', Integer),
+    Column('row_hash', BigInteger),
+    Index('ix_constructor_standings_row_hash', 'row_hash'),
+    Index('ix_constructor_standings_race_constructor', 'race_id', 'constructor_id', 'standing_position', 'points'),
+    Index('ix_constructor_standings_constructor_race', 'constructor_id', 'race_id', 'standing_position', 'points'),
+)
+
+_table(
+    'constructor_results',
+    Column('constructor_results_id', Integer, primary_key=True, autoincrement=True),
+    Column('race_id', Integer, ForeignKey('race.race_id', name='fk_constructor_results_race')),
+    Column('constructor_id', Integer,
+           ForeignKey('constructor.constructor_id', name='fk_constructor_results_constructor')),
+    Column('points', Float),
+    Column('result_status', String(8)),
+    Column('row_hash', BigInteger),
+    Index('ix_constructor_results_row_hash', 'row_hash'),
+    Index('ix_constructor_results_race_constructor', 'race_id', 'constructor_id', 'points'),
+    Index('ix_constructor_results_constructor_race', 'constructor_id', 'race_id', 'points'),
+)
+
+# One row per lap of every driver in every race: by far the largest table, so
+# its columns are as small as their values allow.
+_table(
+    'lap_times',
+    Column('lap_times_id', Integer, primary_key=True, autoincrement=True),
+    Column('race_id', Integer, ForeignKey('race.race_id', name='fk_lap_times_race')),
+    Column('driver_id', Integer, ForeignKey('driver.driver_id', name='fk_lap_times_driver')),
+    Column('lap_number', SmallInteger),
+    Column('lap_position', SmallInteger),
+    Column('lap_ms', Integer),
+    Column('row_hash', BigInteger),
+    Index('ix_lap_times_row_hash', 'row_hash'),
+    Index('ix_lap_times_race_driver', 'race_id', 'driver_id', 'lap_number', 'lap_ms'),
+    Index('ix_lap_times_driver_race', 'driver_id', 'race_id'),
+)
+
+_table(
+    'load_watermark',
+    Column('table_name', String(64), primary_key=True),
+    Column('race_date', Date),
+)
+
+_table(
+    'load_checkpoint',
+    Column('run_id', String(64)),
+    Column('table_name', String(64)),
+    Column('batch_number', Integer),
+    Column('row_count', Integer),
+    Column('committed_at', DateTime),
+    PrimaryKeyConstraint('run_id', 'table_name', 'batch_number'),
+)
+
+# Manifest of the source files loaded (manifest.py)
+_table(
+    'load_file',
+    Column('table_name', String(64), primary_key=True),
+    Column('file_hash', String(64)),
+    Column('loaded_at', DateTime),
+)
+
+_table(
+    'load_partition',
+    Column('table_name', String(64)),
+    Column('source_race_id', Integer),
+    Column('row_count', Integer),
+    Column('partition_hash', BigInteger),
+    PrimaryKeyConstraint('table_name', 'source_race_id'),
+)
+
+BOOKKEEPING_TABLES = ['load_watermark', 'load_checkpoint', 'load_file', 'load_partition']
+
+# Summary tables of aggregates.py, which creates them when they are missing.
+# Every one carries the year so the dashboards filter it without a join.
+_table(
+    'agg_race_constructor_points',
+    Column('race_id', Integer, primary_key=True, autoincrement=False),
+    Column('constructor_id', Integer, primary_key=True, autoincrement=False),
+    Column('year', Integer),
+    Column('points', Float),
+    Column('wins', Integer),
+    Column('podiums', Integer),
+    Column('entries', Integer),
+    Column('best_position', Integer),
+    Index('ix_agg_race_constructor_points_year', 'year', 'constructor_id'),
+)
+
+_table(
+    'agg_season_constructor_points',
+    Column('year', Integer, primary_key=True, autoincrement=False),
+    Column('constructor_id', Integer, primary_key=True, autoincrement=False),
+    Column('points', Float),
+    Column('wins', Integer),
+    Column('podiums', Integer),
+    Column('races', Integer),
+    Column('entries', Integer),
+)
+
+_table(
+    'agg_season_driver_points',
+    Column('year', Integer, primary_key=True, autoincrement=False),
+    Column('driver_id', Integer, primary_key=True, autoincrement=False),
+    Column('points', Float),
+    Column('wins', Integer),
+    Column('podiums', Integer),
+    Column('races', Integer),
+    Column('best_position', Integer),
+)
+
+# Standings after every race computed from the results (standings.py).
+_table(
+    'agg_driver_standings',
+    Column('race_id', Integer, primary_key=True, autoincrement=False),
+    Column('driver_id', Integer, primary_key=True, autoincrement=False),
+    Column('year', Integer),
+    Column('points', Float),
+    Column('wins', Integer),
+    Column('standing_position', Integer),
+    Index('ix_agg_driver_standings_year', 'year', 'driver_id'),
+)
+
+_table(
+    'agg_constructor_standings',
+    Column('race_id', Integer, primary_key=True, autoincrement=False),
+    Column('constructor_id', Integer, primary_key=True, autoincrement=False),
+    Column('year', Integer),
+    Column('points', Float),
+    Column('wins', Integer),
+    Column('standing_position', Integer),
+    Index('ix_agg_constructor_standings_year', 'year', 'constructor_id'),
+)
+
+_table(
+    'agg_race_pit_stops',
+    Column('race_id', Integer, primary_key=True, autoincrement=False),
+    Column('year', Integer),
+    Column('stops', Integer),
+    Column('drivers', Integer),
+    Column('avg_duration', Float),
+    Column('min_duration', Integer),
+    Column('max_duration', Integer),
+    Column('total_duration', Float),
+    Index('ix_agg_race_pit_stops_year', 'year'),
+)
+
+_table(
+    'agg_race_driver_pit_stops',
+    Column('race_id', Integer, primary_key=True, autoincrement=False),
+    Column('driver_id', Integer, primary_key=True, autoincrement=False),
+    Column('year', Integer),
+    Column('stops', Integer),
+    Column('avg_duration', Float),
+    Column('min_duration', Integer),
+    Column('total_duration', Float),
+    Index('ix_agg_race_driver_pit_stops_year', 'year', 'driver_id'),
+)
+
+_table(
+    'agg_race_qualifying',
+    Column('race_id', Integer, primary_key=True, autoincrement=False),
+    Column('year', Integer),
+    Column('circuit_id', Integer),
+    Column('entries', Integer),
+    Column('pole_driver_id', Integer),
+    Column('pole_constructor_id', Integer),
+    Column('pole_ms', Integer),
+    Column('best_q1_ms', Integer),
+    Column('best_q2_ms', Integer),
+    Column('best_q3_ms', Integer),
+    Index('ix_agg_race_qualifying_year', 'year'),
+)
+
+
+# Creates the missing tables (and their indexes) of the given names, plus the
+# bookkeeping tables. Existing tables are left as they are.
+def create_schema(engine, tables=None):
+
+    names = list(metadata.tables) if tables is None else list(dict.fromkeys(list(tables) + BOOKKEEPING_TABLES))
+    metadata.create_all(engine, tables=[metadata.tables[name] for name in names])
+
+
+def _indexes(table):
+    return sorted(metadata.tables[table].indexes, key=lambda index: index.name)
+
+
+# MySQL DDL of the given tables, to compare with the .sql files.
+def ddl(tables=None, dialect_name='mysql'):
+
+    from sqlalchemy.dialects import mysql, sqlite
+    dialect = {'mysql': mysql.dialect(), 'sqlite': sqlite.dialect()}[dialect_name]
+
+    statements = []
+    for table in metadata.sorted_tables:
+        if tables is None or table.name in tables:
+            statements.append(str(CreateTable(table).compile(dialect=dialect)).strip() + ';')
+            statements += [str(CreateIndex(index).compile(dialect=dialect)).strip() + ';'
+                           for index in _indexes(table.name)]
+
+    return '\n\n'.join(statements)
+
+
+def _is_mysql(engine):
+    return engine.dialect.name in ('mysql', 'mariadb')
+
+
+# Secondary (non-unique) indexes of a table that exist in the database.
+def _existing_indexes(engine, table):
+    return {ix['name']: ix for ix in inspect(engine).get_indexes(table) if not ix.get('unique')}
+
+
+# Creates the indexes of the schema that a table is missing. On MySQL all of
+# them are added with a single ALTER TABLE, so the table is read once.
+def build_indexes(engine, table):
+
+    existing = _existing_indexes(engine, table)
+    missing = [index for index in _indexes(table) if index.name not in existing]
+    if not missing:
+        return []
+
+    with engine.begin() as conn:
+        if _is_mysql(engine):
+            clauses = ', '.join(f"ADD INDEX {index.name} ({', '.join(c.name for c in index.columns)})"
+                                for index in missing)
+            conn.execute(text(f"ALTER TABLE {table} {clauses}"))
+        else:
+            for index in missing:
+                index.create(conn)
+
+    return [index.name for index in missing]
+
+
+# Adds the columns of the schema that existing tables are missing (with their
+# indexes), so tables created before a column was declared can still be loaded.
+# Returns the columns added to every table.
+def add_missing_columns(engine, tables):
+
+    added = {}
+    existing = set(inspect(engine).get_table_names())
+    for table in tables:
+        if table not in existing:
+            continue
+        present = {column['name'] for column in inspect(engine).get_columns(table)}
+        missing = [column for column in metadata.tables[table].columns if column.name not in present]
+        if not missing:
+            continue
+        with engine.begin() as conn:
+            for column in missing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} "
+                                  f"{column.type.compile(dialect=engine.dialect)}"))
+        build_indexes(engine, table)
+        added[table] = [column.name for column in missing]
+        log('schema', f"{table}: added {', '.join(added[table])}.")
+
+    return added
+
+
+# Rows of a fact table whose foreign key points to no row of the dimension,
+# for every foreign key of the table (null keys are allowed).
+def orphan_counts(engine, table):
+
+    counts = {}
+    with engine.connect() as conn:
+        for fk in metadata.tables[table].foreign_keys:
+            column, target = fk.parent.name, fk.column
+            counts[fk.constraint.name] = conn.execute(text(
+                f"SELECT COUNT(*) FROM {table} f LEFT JOIN {target.table.name} d "
+                f"ON f.{column} = d.{target.name} WHERE f.{column} IS NOT NULL AND d.{target.name} IS NULL"
+            )).scalar()
+
+    return counts
+
+
+# Indexes a bulk load keeps because the load reads them: those on row_hash,
+# which every chunk or batch probes to skip the rows already loaded
+# (fingerprint.drop_loaded()) and --changes to delete stale rows.
+def _kept_in_bulk(index):
+    return index['column_names'][:1] == [HASH_COLUMN]
+
+
+# Drops the foreign keys and the secondary indexes of the given fact tables, so
+# appending rows costs neither foreign key lookups nor index maintenance.
+# SQLite does not check foreign keys by default and cannot drop them, so only
+# its indexes are dropped. Unique keys and row_hash indexes are kept.
+def begin_bulk_load(engine, tables):
+
+    for table in tables:
+        with span(f'bulk_drop_{table}', echo=False) as stage, engine.begin() as conn:
+            dropped_fks = []
+            if _is_mysql(engine):
+                for fk in inspect(conn).get_foreign_keys(table):
+                    conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {fk['name']}"))
+                    dropped_fks.append(fk['name'])
+            dropped = [name for name, index in _existing_indexes(conn, table).items() if not _kept_in_bulk(index)]
+            for name in dropped:
+                if _is_mysql(engine):
+                    conn.execute(text(f"ALTER TABLE {table} DROP INDEX {name}"))
+                else:
+                    conn.execute(text(f"DROP INDEX {name}"))
+            stage.update(foreign_keys=dropped_fks, indexes=dropped)
+
+        log('schema', f"{table}: dropped {len(dropped_fks)} foreign keys and {len(dropped)} indexes for the bulk load.")
+
+
+# Rebuilds the indexes of the given fact tables in one pass, checks that every
+# foreign key points to an existing row and adds the foreign keys back. A
+# foreign key with orphan rows is not added back (its count is logged).
+# Returns the orphan counts of every table.
+def finish_bulk_load(engine, tables):
+
+    report = {}
+    for table in tables:
+        with span(f'bulk_rebuild_{table}') as stage:
+            stage['indexes'] = build_indexes(engine, table)
+            orphans = orphan_counts(engine, table)
+            stage['orphans'] = {name: count for name, count in orphans.items() if count}
+            report[table] = orphans
+
+            if _is_mysql(engine):
+                existing = {fk['name'] for fk in inspect(engine).get_foreign_keys(table)}
+                with engine.begin() as conn:
+                    for constraint in metadata.tables[table].foreign_key_constraints:
+                        if constraint.name in existing:
+                            continue
+                        if orphans.get(constraint.name):
+                            log('schema', f"WARNING: {table}.{constraint.name} not restored, "
+                                          f"{orphans[constraint.name]} rows point to missing rows.")
+                            continue
+                        conn.execute(AddConstraint(constraint))
+            elif stage['orphans']:
+                log('schema', f"WARNING: {table} has rows that point to missing rows: {stage['orphans']}")
+
+    return report
+
+
+# Runs the block with the fact tables in bulk mode; the indexes and foreign
+# keys are restored even if the load fails.
+@contextlib.contextmanager
+def bulk_mode(engine, tables):
+
+    begin_bulk_load(engine, tables)
+    try:
+        yield
+    finally:
+        finish_bulk_load(engine, tables)
+
+
+if __name__ == '__main__':
+
+    from connections import get_connection, load_db_config
+
+    parser = argparse.ArgumentParser(description='Create the star schema or print its DDL.')
+    parser.add_argument('command', choices=['create', 'indexes', 'ddl'])
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default=None, help='Database to use (the one of config.json by default).')
+    parser.add_argument('--tables', nargs='+', default=None, help='Tables to create (all by default).')
+    args = parser.parse_args()
+
+    if args.command == 'ddl':
+        print(ddl(args.tables))
+    else:
+        engine = get_connection(load_db_config(args.config), args.database)
+        if args.command == 'create':
+            create_schema(engine, args.tables)
+        for table in args.tables or [t for t in metadata.tables if metadata.tables[t].indexes]:
+            if table in inspect(engine).get_table_names():
+                added = build_indexes(engine, table)
+                log('schema', f"{table}: {len(added)} indexes added.")
@@ -0,0 +1,83 @@
+import contextlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from instrumentation import log
+
+
+# Blocks attached by this process, kept open while their arrays are in use.
+_ATTACHED = {}
+
+
+def _attach_block(name):
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block again with the resource
+        # tracker, which the workers share with the main process: nothing changes
+        return shared_memory.SharedMemory(name=name)
+
+
+# Copies the arrays of the lookup tables built by build_source_maps() (one
+# dict of arrays per dimension) into a single shared memory block, and yields
+# the handle that attach() turns back into the same lookup tables: a small
+# picklable dict with the block name and where every array is. The block is
+# removed when the context exits; workers must be done with it by then.
+@contextlib.contextmanager
+def shared_source_maps(source_maps):
+
+    layout, offset = {}, 0
+    for dimension, source_map in source_maps.items():
+        layout[dimension] = {}
+        for part, values in source_map.items():
+            values = np.ascontiguousarray(values)
+            layout[dimension][part] = (offset, values.dtype.str, values.shape)
+            # Every array starts on an 8-byte boundary
+            offset += -(-values.nbytes // 8) * 8
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 8))
+    log('shared_maps', f"Published {len(layout)} dimension lookups ({offset} bytes) in {block.name}.")
+    try:
+        for dimension, parts in layout.items():
+            for part, (start, dtype, shape) in parts.items():
+                target = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)
+                target[...] = source_maps[dimension][part]
+        yield {'name': block.name, 'layout': layout}
+    finally:
+        block.close()
+        block.unlink()
+
+
+# Lookup tables of a handle of shared_source_maps(), as read-only arrays that
+# point into the shared block (nothing is copied). The block stays attached for
+# the life of the process, so calling it again with the same handle is free.
+def attach(handle):
+
+    if handle['name'] not in _ATTACHED:
+        _ATTACHED[handle['name']] = _attach_block(handle['name'])
+    block = _ATTACHED[handle['name']]
+
+    source_maps = {}
+    for dimension, parts in handle['layout'].items():
+        source_maps[dimension] = {}
+        for part, (start, dtype, shape) in parts.items():
+            values = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)
+            values.flags.writeable = False
+            source_maps[dimension][part] = values
+
+    return source_maps
+
+
+# Closes the block of a handle in this process once its arrays are no longer
+# used. It stays attached when something still points into it.
+def detach(handle):
+
+    block = _ATTACHED.pop(handle['name'], None)
+    if block is None:
+        return
+    try:
+        block.close()
+    except BufferError:
+        _ATTACHED[handle['name']] = block
@@ -0,0 +1,178 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import log
+
+
+# Bumped whenever a schema below (or the way files are parsed) changes.
+PARSER_VERSION = 2
+
+# Null markers of the Ergast CSV export. pandas already treats '', 'NULL',
+# 'null', 'NA', 'N/A', 'n/a' and 'None' as nulls.
+NA_VALUES = ['\\N']
+
+# Null markers of the pandas C parser (its default na_values), given to pyarrow
+# with NA_VALUES so both parsers read the same nulls.
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+# Source CSV files, by name, inside the data folder.
+SOURCE_FILES = {
+    'circuits': 'circuits.csv',
+    'constructors': 'constructors.csv',
+    'drivers': 'drivers.csv',
+    'pit_stops': 'pit_stops.csv',
+    'qualifying': 'qualifying.csv',
+    'races': 'races.csv',
+    'status': 'status.csv',
+    'results': 'results.csv',
+    'driver_standings': 'driver_standings.csv',
+    'constructor_standings': 'constructor_standings.csv',
+    'constructor_results': 'constructor_results.csv',
+    'lap_times': 'lap_times.csv',
+}
+
+
+# Column types of every source file. Columns not listed keep the inferred type
+# (object for text). 'Int64' is used for integers that can be null. usecols
+# limits the columns read from a file (the others are never parsed).
+SOURCE_SCHEMAS = {
+    'circuits': {
+        'dtype': {'circuitId': 'int64', 'lat': 'float64', 'lng': 'float64', 'alt': 'float64',
+                  'country': 'category'},
+    },
+    'constructors': {
+        'dtype': {'constructorId': 'int64', 'nationality': 'category'},
+    },
+    'drivers': {
+        'dtype': {'driverId': 'int64', 'number': 'Int64', 'nationality': 'category'},
+        'dates': ['dob'],
+    },
+    'pit_stops': {
+        'dtype': {'raceId': 'int64', 'driverId': 'int64', 'stop': 'int64', 'lap': 'int64',
+                  'time': 'object', 'duration': 'object', 'milliseconds': 'int64'},
+    },
+    'qualifying': {
+        'dtype': {'qualifyId': 'int64', 'raceId': 'int64', 'driverId': 'int64', 'constructorId': 'int64',
+                  'number': 'int64', 'position': 'Int64', 'q1': 'object', 'q2': 'object', 'q3': 'object'},
+    },
+    'races': {
+        'dtype': {'raceId': 'int64', 'year': 'int64', 'round': 'int64', 'circuitId': 'int64',
+                  'time': 'object', 'fp1_time': 'object', 'fp2_time': 'object', 'fp3_time': 'object',
+                  'quali_time': 'object', 'sprint_time': 'object'},
+        'dates': ['date', 'fp1_date', 'fp2_date', 'fp3_date', 'quali_date', 'sprint_date'],
+    },
+    'status': {
+        'dtype': {'statusId': 'int64', 'status': 'category'},
+    },
+    'results': {
+        'dtype': {'resultId': 'int64', 'raceId': 'int64', 'driverId': 'int64', 'constructorId': 'int64',
+                  'number': 'Int64', 'grid': 'int64', 'position': 'Int64', 'positionText': 'category',
+                  'positionOrder': 'int64', 'points': 'float64', 'laps': 'int64', 'time': 'object',
+                  'milliseconds': 'Int64', 'fastestLap': 'Int64', 'rank': 'Int64',
+                  'fastestLapTime': 'object', 'fastestLapSpeed': 'float64', 'statusId': 'int64'},
+    },
+    'driver_standings': {
+        'dtype': {'driverStandingsId': 'int64', 'raceId': 'int64', 'driverId': 'int64', 'points': 'float64',
+                  'position': 'Int64', 'positionText': 'category', 'wins': 'int64'},
+    },
+    'constructor_standings': {
+        'dtype': {'constructorStandingsId': 'int64', 'raceId': 'int64', 'constructorId': 'int64',
+                  'points': 'float64', 'position': 'Int64', 'positionText': 'category', 'wins': 'int64'},
+    },
+    'constructor_results': {
+        'dtype': {'constructorResultsId': 'int64', 'raceId': 'int64', 'constructorId': 'int64',
+                  'points': 'float64', 'status': 'object'},
+    },
+    # One row per lap of every driver: read in the smallest types, without the
+    # lap time text (milliseconds holds the same value).
+    'lap_times': {
+        'dtype': {'raceId': 'int32', 'driverId': 'int32', 'lap': 'int16', 'position': 'Int16',
+                  'milliseconds': 'int32'},
+        'usecols': ['raceId', 'driverId', 'lap', 'position', 'milliseconds'],
+    },
+}
+
+
+# Whether pyarrow is installed; the staging cache and the compact frames use it
+# too when it is.
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Keyword arguments of pd.read_csv for a source file, so nulls, dates and
+# numbers are decoded once while parsing. The pyarrow engine is used when asked
+# for and installed; it does not support chunked reading.
+def read_options(name, engine='c'):
+
+    schema = SOURCE_SCHEMAS.get(name, {})
+    options = {
+        'dtype': dict(schema.get('dtype', {})),
+        'na_values': NA_VALUES,
+    }
+
+    if schema.get('usecols'):
+        options['usecols'] = list(schema['usecols'])
+
+    if schema.get('dates'):
+        options['parse_dates'] = list(schema['dates'])
+        options['date_format'] = DATE_FORMAT
+
+    if engine == 'pyarrow':
+        if has_pyarrow():
+            options['engine'] = 'pyarrow'
+        else:
+            log('source_schemas', "pyarrow is not installed, using the C parser.")
+
+    return options
+
+
+def source_path(name, data_dir='Data'):
+    return os.path.join(data_dir, SOURCE_FILES[name])
+
+
+# Reads a file with pyarrow into the frame the C parser gives. pd.read_csv
+# with engine='pyarrow' lets pyarrow infer the type of every column before
+# applying dtype, so text that looks like numbers ('21.910' in a file with no
+# stop over a minute) or clock times would not come back as written: the text
+# and date columns are read as strings instead.
+def _read_pyarrow(path, options):
+
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    dtype, dates = options['dtype'], options.get('parse_dates', [])
+    text = [col for col, kind in dtype.items() if kind in ('object', 'category')] + dates
+    convert = pa_csv.ConvertOptions(column_types={col: pa.string() for col in text},
+                                    null_values=PANDAS_NA_VALUES + options['na_values'],
+                                    strings_can_be_null=True, include_columns=options.get('usecols'))
+    df = pa_csv.read_csv(path, convert_options=convert).to_pandas()
+
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]):
+            # pyarrow gives None for null text, the C parser NaN
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    df = df.astype({col: kind for col, kind in dtype.items() if col in df.columns and kind != 'object'})
+    for col in dates:
+        df[col] = pd.to_datetime(df[col], format=options['date_format'], errors='coerce')
+
+    return df
+
+
+# Reads a source file with its declared schema.
+def read_source(name, data_dir='Data', engine='c'):
+
+    options = read_options(name, engine)
+    if options.pop('engine', None) == 'pyarrow':
+        return _read_pyarrow(source_path(name, data_dir), options)
+
+    return pd.read_csv(source_path(name, data_dir), **options)
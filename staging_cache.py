@@ -0,0 +1,153 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import log
+from source_schemas import PARSER_VERSION, SOURCE_SCHEMAS, has_pyarrow, read_source, source_path
+
+
+CACHE_DIR = '.staging_cache'
+
+# Upper bound of the cache size; the least recently used entries are evicted.
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+# Parquet when pyarrow is installed, pickle otherwise.
+def cache_format():
+    return 'parquet' if has_pyarrow() else 'pickle'
+
+
+def file_hash(path, block_size=1024 * 1024):
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+# The cache key changes whenever the file content, its schema or the parser
+# version changes.
+def cache_key(name, data_dir='Data'):
+
+    schema = json.dumps(SOURCE_SCHEMAS.get(name, {}), sort_keys=True)
+    stamp = f"{file_hash(source_path(name, data_dir))}:{PARSER_VERSION}:{schema}"
+
+    return f"{name}-{hashlib.sha256(stamp.encode()).hexdigest()[:24]}"
+
+
+def _entry_path(cache_dir, key, fmt):
+    return os.path.join(cache_dir, f"{key}.{fmt}")
+
+
+def _write(df, path, fmt):
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        with open(path, 'wb') as file:
+            pickle.dump(df, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read(path, fmt):
+
+    if fmt != 'parquet':
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    df = pd.read_parquet(path)
+    # Parquet gives None for the nulls of text columns; the parser gives NaN.
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]):
+            df[col] = df[col].where(df[col].notna(), np.nan)
+
+    return df
+
+
+def list_entries(cache_dir=CACHE_DIR):
+
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, file_name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append({'file': file_name, 'bytes': stat.st_size, 'last_used': stat.st_mtime})
+
+    return sorted(entries, key=lambda e: e['last_used'])
+
+
+# Deletes the least recently used entries until the cache fits in max_bytes.
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+
+    entries = list_entries(cache_dir)
+    total = sum(e['bytes'] for e in entries)
+
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(cache_dir, entry['file']))
+        total -= entry['bytes']
+        log('staging_cache', f"Evicted {entry['file']}.")
+
+
+def clear(cache_dir=CACHE_DIR):
+
+    entries = list_entries(cache_dir)
+    for entry in entries:
+        os.remove(os.path.join(cache_dir, entry['file']))
+
+    log('staging_cache', f"Removed {len(entries)} entries from {cache_dir}.")
+
+
+# Reads a source file through the cache: a hit returns the stored typed frame
+# without parsing the CSV, a miss parses it and stores the result.
+def cached_read_source(name, data_dir='Data', engine='c', cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+
+    fmt = cache_format()
+    path = _entry_path(cache_dir, cache_key(name, data_dir), fmt)
+
+    if os.path.exists(path):
+        try:
+            df = _read(path, fmt)
+        except Exception as ex:
+            log('staging_cache', f"Ignoring unreadable entry {path}: {ex}")
+        else:
+            os.utime(path)
+            return df
+
+    df = read_source(name, data_dir, engine)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write(df, path + '.tmp', fmt)
+        os.replace(path + '.tmp', path)
+        evict(cache_dir, max_bytes)
+    except Exception as ex:
+        log('staging_cache', f"Could not store {name} in the cache: {ex}")
+
+    return df
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Inspect or clear the staging cache of parsed source files.')
+    parser.add_argument('command', choices=['list', 'clear'])
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        entries = list_entries(args.cache_dir)
+        for entry in entries:
+            print(f"{entry['file']:<50} {entry['bytes'] / 1024:>10.1f} KiB  "
+                  f"{pd.Timestamp(entry['last_used'], unit='s'):%Y-%m-%d %H:%M:%S}")
+        print(f"{len(entries)} entries, {sum(e['bytes'] for e in entries) / 1024 / 1024:.1f} MiB in {args.cache_dir}")
+    else:
+        clear(args.cache_dir)
@@ -0,0 +1,177 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from instrumentation import log
+
+
+# Finishing positions counted for the countback tie-break (more firsts, then
+# more seconds...); lower positions almost never decide a tie.
+COUNTBACK_POSITIONS = 40
+
+
+# Decimals kept in the point totals: source points have at most two (shared
+# drives such as 3.33), the rest is floating-point noise that would keep
+# drivers tied on points from reaching the countback.
+POINT_DECIMALS = 6
+
+
+# Segmented cumulative sum: the running total of every row inside its group,
+# groups being runs of consecutive rows with the given lengths. Every group is
+# summed from zero, so its totals do not depend on the groups before it.
+def _running_total(values, lengths):
+
+    group = np.repeat(np.arange(len(lengths)), lengths)
+
+    return pd.DataFrame(values).groupby(group).cumsum().to_numpy().reshape(values.shape)
+
+
+# Standings of every driver (key='driver_id') or constructor after every race
+# of its seasons, from the results fact rows with the year, month and day of
+# their race: points and wins added up race by race, and the position in the
+# championship, ties going to the one with more wins, then more second places
+# and so on (countback), then to the best placed in that race (position_order),
+# then to the lowest id. Once a driver has taken part in a race of a season it
+# has a row after every later race of that season.
+# Seasons like 2012 or 2018 match the published standings exactly, but most do
+# not (cross_check() lists them), because:
+# - points: results.csv has no sprint races (2021 on), the dropped scores and
+#   shared drives of older seasons are not applied, and results.points is an
+#   integer column, which loses half points;
+# - rows: the published tables leave out some drivers until they are classified
+#   (in the first race of 2011, two disqualified and two who did not qualify);
+# - positions: mostly among drivers tied on points (9 in 10 of them on zero, as
+#   in 2010 and 2011), whose published order past the countback follows no rule
+#   found in the results (it is neither the result in that race, as here, nor
+#   the order after the previous race). In race 338 driver 37 (retired, then
+#   12th) is ranked ahead of driver 16 (12th, then retired), the reverse of the
+#   published table.
+def compute_standings(results, key):
+
+    columns = [key, 'race_id', 'year', 'points', 'wins', 'standing_position']
+    results = results[results['race_id'].notna() & results[key].notna()]
+    if results.empty:
+        return pd.DataFrame(columns=columns)
+
+    races = (results[['race_id', 'year', 'month', 'day']].drop_duplicates('race_id')
+             .sort_values(['year', 'month', 'day', 'race_id']).reset_index(drop=True))
+    race_ids, season_of_race = races['race_id'].to_numpy(), races['year'].to_numpy()
+    first_race = np.flatnonzero(np.r_[True, season_of_race[1:] != season_of_race[:-1]])
+    races_in_season = np.diff(np.r_[first_race, len(races)])
+    season_start = np.repeat(first_race, races_in_season)
+
+    # Results in race order, as (race, entity) codes
+    race = pd.Index(race_ids).get_indexer(results['race_id'])
+    entity_codes, entities = pd.factorize(results[key], sort=True)
+    position = results['final_position'].fillna(0).to_numpy(dtype='int64')
+    finishes = np.zeros((len(results), COUNTBACK_POSITIONS), dtype='int32')
+    counted = (position >= 1) & (position <= COUNTBACK_POSITIONS)
+    finishes[np.flatnonzero(counted), position[counted] - 1] = 1
+
+    # One row per (season, entity) pair for every race from its first one to the
+    # end of the season: the pairs follow each other, each one in race order
+    pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([season_start[race], entity_codes]), sort=True)
+    pair_first = np.full(len(pairs), len(races), dtype='int64')
+    np.minimum.at(pair_first, pair_codes, race)
+    pair_season = pairs.get_level_values(0).to_numpy()
+    lengths = pair_season + races_in_season[np.searchsorted(first_race, pair_season)] - pair_first
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+
+    row = starts[pair_codes] + race - pair_first[pair_codes]
+    size = int(lengths.sum())
+    points = np.zeros(size)
+    np.add.at(points, row, results['points'].fillna(0).to_numpy(dtype='float64'))
+    counts = np.zeros((size, COUNTBACK_POSITIONS), dtype='int32')
+    np.add.at(counts, row, finishes)
+    # Best car of the entity in the race itself; after everyone when it did not race
+    placed = np.full(size, np.iinfo('int64').max)
+    np.minimum.at(placed, row, results['position_order'].fillna(np.iinfo('int64').max).to_numpy(dtype='int64'))
+
+    points = _running_total(points, lengths).round(POINT_DECIMALS)
+    counts = _running_total(counts, lengths)
+    grid_race = np.repeat(pair_first - starts, lengths) + np.arange(size)
+    grid_entity = np.repeat(pairs.get_level_values(1).to_numpy(), lengths)
+
+    # Rank inside every race: points, then the countback, then the race, then the id
+    order = np.lexsort([grid_entity, placed] + [-counts[:, p] for p in reversed(range(COUNTBACK_POSITIONS))]
+                       + [-points, grid_race])
+    ranked_race = grid_race[order]
+    race_start = np.flatnonzero(np.r_[True, ranked_race[1:] != ranked_race[:-1]])
+    rank = np.arange(size) - np.repeat(race_start, np.diff(np.r_[race_start, size])) + 1
+
+    return pd.DataFrame({
+        key: entities.to_numpy()[grid_entity[order]],
+        'race_id': race_ids[ranked_race],
+        'year': season_of_race[ranked_race],
+        'points': points[order],
+        'wins': counts[order, 0].astype('int64'),
+        'standing_position': rank,
+    })[columns]
+
+
+def driver_standings(df):
+    return compute_standings(df, 'driver_id')
+
+
+# Constructors score the points of all their cars in a race.
+def constructor_standings(df):
+    return compute_standings(df, 'constructor_id')
+
+
+# Compares computed standings with the published ones (the driver_standings or
+# constructor_standings fact tables) race by race. Returns one row per season
+# with the rows of each side and how many differ in points, wins or position;
+# rows found on one side only count as missing or extra.
+def cross_check(computed, published, key):
+
+    merged = computed.merge(published[['race_id', key, 'points', 'wins', 'standing_position']],
+                            on=['race_id', key], how='outer', suffixes=('', '_published'), indicator=True)
+    merged['year'] = merged['year'].fillna(merged.groupby('race_id')['year'].transform('first'))
+    both = merged['_merge'] == 'both'
+
+    return (merged.assign(
+                computed=merged['_merge'] != 'right_only',
+                published=merged['_merge'] != 'left_only',
+                points_differ=both & ~np.isclose(merged['points'], merged['points_published']),
+                wins_differ=both & (merged['wins'] != merged['wins_published']),
+                position_differs=both & (merged['standing_position'] != merged['standing_position_published']))
+            .groupby('year', as_index=False)[['computed', 'published', 'points_differ', 'wins_differ',
+                                              'position_differs']].sum())
+
+
+# Reads the results with the date of their race, and the published standings,
+# of the given seasons (all of them when years is None).
+def _read(conn, table, years=None):
+
+    query = f"SELECT f.*, r.year, r.month, r.day FROM {table} f JOIN race r ON r.race_id = f.race_id"
+    if years is None:
+        return pd.read_sql(text(query), con=conn)
+
+    query = text(query + " WHERE r.year IN :years").bindparams(bindparam('years', expanding=True))
+    return pd.read_sql(query, con=conn, params={'years': sorted(years)})
+
+
+if __name__ == '__main__':
+
+    from connections import get_connection, load_db_config
+
+    parser = argparse.ArgumentParser(description='Compare the standings computed from the results with the '
+                                                 'published ones.')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default='results_db', help='Database with the results and standings.')
+    parser.add_argument('--years', nargs='+', type=int, default=None)
+    args = parser.parse_args()
+
+    engine = get_connection(load_db_config(args.config), args.database)
+    with engine.connect() as conn:
+        results = _read(conn, 'results', args.years)
+        for table, key, compute in [('driver_standings', 'driver_id', driver_standings),
+                                    ('constructor_standings', 'constructor_id', constructor_standings)]:
+            report = cross_check(compute(results), _read(conn, table, args.years), key)
+            drifted = report[report[['points_differ', 'wins_differ', 'position_differs']].any(axis=1)
+                             | (report['computed'] != report['published'])]
+            log('standings', f"{table}: {len(report) - len(drifted)} of {len(report)} seasons match the results.")
+            if len(drifted):
+                print(drifted.to_string(index=False))
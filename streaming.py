@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from fingerprint import HASH_COLUMN
+from instrumentation import log
+
+
+# Hashes of the rows already written, kept as a sorted uint64 array (8 bytes
+# per distinct row) so duplicates can be found across chunks.
+def _new_rows_mask(hashes, seen):
+
+    # Duplicates inside the chunk itself
+    mask = ~pd.Series(hashes).duplicated().to_numpy()
+
+    if len(seen):
+        positions = np.searchsorted(seen, hashes)
+        positions[positions == len(seen)] = 0
+        mask &= seen[positions] != hashes
+
+    return mask
+
+
+# Reads a fact CSV in chunks of chunksize rows, prepares every chunk with the
+# same dimension lookups as the in-memory path and hands it straight to sink
+# (a function that writes a DataFrame). Rows already written by a previous
+# chunk are dropped (compared by their row_hash when the preparer adds it), so
+# memory depends on the chunk size, not on the file size.
+# row_filter can drop source rows of a chunk before they are prepared. With
+# remember=False the hashes are not kept, so memory stays flat however long the
+# file is; only duplicates inside a chunk are dropped then (the sink can drop
+# the rows already loaded).
+def stream_fact(path, prepare, sink, chunksize=100000, row_filter=None, read_options=None, remember=True):
+
+    seen = np.empty(0, dtype='uint64')
+    stats = {'chunks': 0, 'rows_read': 0, 'rows_written': 0, 'duplicates': 0}
+
+    for chunk in pd.read_csv(path, chunksize=chunksize, **(read_options or {})):
+        stats['chunks'] += 1
+        stats['rows_read'] += len(chunk)
+
+        if row_filter is not None:
+            chunk = row_filter(chunk)
+            if chunk.empty:
+                continue
+
+        prepared = prepare(chunk)
+        if HASH_COLUMN in prepared.columns:
+            hashes = prepared[HASH_COLUMN].to_numpy().view('uint64')
+        else:
+            hashes = pd.util.hash_pandas_object(prepared, index=False).to_numpy()
+        mask = _new_rows_mask(hashes, seen)
+
+        stats['duplicates'] += int((~mask).sum())
+        prepared = prepared[mask]
+        if remember:
+            seen = np.union1d(seen, hashes[mask])
+
+        if not prepared.empty:
+            sink(prepared)
+            stats['rows_written'] += len(prepared)
+
+    log('streaming', f"{path}: {stats['rows_read']} rows read in {stats['chunks']} chunks, "
+                     f"{stats['rows_written']} written, {stats['duplicates']} duplicates dropped.")
+
+    return stats
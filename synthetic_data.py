@@ -0,0 +1,364 @@
+import argparse
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import log
+
+
+# Row counts of the files in Data/ (scale 1). Every other size is a multiple.
+BASE_SIZES = {
+    'circuits': 79,
+    'constructors': 212,
+    'drivers': 861,
+    'races': 1125,
+}
+
+STATUS_COUNT = 137
+ENTRANTS_PER_RACE = 24
+# Share of the (most recent) races that have qualifying and pit stop data.
+QUALIFYING_SHARE = 0.4
+PIT_STOPS_SHARE = 0.45
+LAP_TIMES_SHARE = 0.45
+
+FIRST_SEASON = 1950
+# Last season that still fits in a pandas Timestamp with room to spare.
+LAST_SEASON = 2200
+
+POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+COUNTRIES = ['Australia', 'Austria', 'Bahrain', 'Belgium', 'Brazil', 'Canada', 'China', 'France', 'Germany',
+             'Hungary', 'Italy', 'Japan', 'Mexico', 'Monaco', 'Netherlands', 'Portugal', 'Qatar',
+             'Saudi Arabia', 'Singapore', 'Spain', 'UK', 'USA']
+NATIONALITIES = ['Australian', 'Austrian', 'Brazilian', 'British', 'Canadian', 'Dutch', 'Finnish', 'French',
+                 'German', 'Italian', 'Japanese', 'Mexican', 'Monegasque', 'Spanish', 'Swiss', 'American']
+FORENAMES = ['Lewis', 'Max', 'Fernando', 'Charles', 'Lando', 'Sebastian', 'Kimi', 'Nico', 'Mika', 'Ayrton',
+             'Alain', 'Niki', 'Jim', 'Jackie', 'Juan', 'Graham', 'Jenson', 'Mark', 'Daniel', 'Carlos']
+SURNAMES = ['Hamilton', 'Verstappen', 'Alonso', 'Leclerc', 'Norris', 'Vettel', 'Raikkonen', 'Rosberg',
+            'Hakkinen', 'Senna', 'Prost', 'Lauda', 'Clark', 'Stewart', 'Fangio', 'Hill', 'Button', 'Webber',
+            'Ricciardo', 'Sainz']
+
+
+def _pick(rng, values, size):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), size)]
+
+
+def _lap_time(ms):
+    ms = np.asarray(ms, dtype='int64')
+    return pd.Series([f"{m // 60000}:{m // 1000 % 60:02d}.{m % 1000:03d}" for m in ms], dtype=object)
+
+
+# Same format as _lap_time(), built column-wise for the millions of lap times.
+def _lap_time_column(ms):
+    ms = pd.Series(np.asarray(ms, dtype='int64'))
+    return ((ms // 60000).astype(str) + ':' + (ms // 1000 % 60).astype(str).str.zfill(2) + '.'
+            + (ms % 1000).astype(str).str.zfill(3))
+
+
+def _clock(seconds):
+    seconds = np.asarray(seconds, dtype='int64')
+    return pd.Series([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds], dtype=object)
+
+
+def make_circuits(rng, n):
+
+    ids = np.arange(1, n + 1)
+    return pd.DataFrame({
+        'circuitId': ids,
+        'circuitRef': [f"circuit_{i}" for i in ids],
+        'name': [f"Circuit {i}" for i in ids],
+        'location': [f"City {i}" for i in ids],
+        'country': _pick(rng, COUNTRIES, n),
+        'lat': rng.uniform(-60, 70, n).round(5),
+        'lng': rng.uniform(-180, 180, n).round(5),
+        'alt': rng.integers(0, 2000, n),
+        'url': [f"http://example.org/circuit_{i}" for i in ids],
+    })
+
+
+def make_constructors(rng, n):
+
+    ids = np.arange(1, n + 1)
+    return pd.DataFrame({
+        'constructorId': ids,
+        'constructorRef': [f"constructor_{i}" for i in ids],
+        'name': [f"Constructor {i}" for i in ids],
+        'nationality': _pick(rng, NATIONALITIES, n),
+        'url': [f"http://example.org/constructor_{i}" for i in ids],
+    })
+
+
+# Natural keys (forename, surname, dob) are unique thanks to the numbered surname.
+def make_drivers(rng, n):
+
+    ids = np.arange(1, n + 1)
+    dob = pd.Timestamp('1900-01-01') + pd.to_timedelta(rng.integers(0, 105 * 365, n), unit='D')
+    numbers = pd.array(rng.integers(1, 100, n), dtype='Int64')
+    numbers[rng.random(n) < 0.8] = pd.NA
+
+    return pd.DataFrame({
+        'driverId': ids,
+        'driverRef': [f"driver_{i}" for i in ids],
+        'number': numbers,
+        'code': [f"D{i % 100:02d}" for i in ids],
+        'forename': _pick(rng, FORENAMES, n),
+        'surname': [f"{s} {i}" for s, i in zip(_pick(rng, SURNAMES, n), ids)],
+        'dob': dob.strftime('%Y-%m-%d'),
+        'nationality': _pick(rng, NATIONALITIES, n),
+        'url': [f"http://example.org/driver_{i}" for i in ids],
+    })
+
+
+def make_status():
+
+    names = ['Finished', 'Disqualified', 'Accident', 'Collision', 'Engine', 'Gearbox', 'Transmission',
+             'Clutch', 'Hydraulics', 'Electrical']
+    names += [f"+{i} Lap{'s' if i > 1 else ''}" for i in range(1, STATUS_COUNT - len(names) + 1)]
+
+    return pd.DataFrame({'statusId': np.arange(1, STATUS_COUNT + 1), 'status': names})
+
+
+# Seasons get as many rounds as needed to fit every race before LAST_SEASON;
+# (year, name) stays unique because the name carries the round.
+def make_races(rng, n, n_circuits):
+
+    per_season = max(20, math.ceil(n / (LAST_SEASON - FIRST_SEASON)))
+    index = np.arange(n)
+    year = FIRST_SEASON + index // per_season
+    rounds = index % per_season + 1
+    day = (rounds - 1) * 365 // per_season
+
+    races = pd.DataFrame({
+        'raceId': index + 1,
+        'year': year,
+        'round': rounds,
+        'circuitId': rng.integers(1, n_circuits + 1, n),
+        'name': [f"Grand Prix {r}" for r in rounds],
+        'date': (pd.to_datetime(year.astype(str), format='%Y') + pd.to_timedelta(day, unit='D')).strftime('%Y-%m-%d'),
+        'time': _clock(rng.integers(10, 18, n) * 3600),
+        'url': [f"http://example.org/race_{i}" for i in index + 1],
+    })
+    for col in ['fp1', 'fp2', 'fp3', 'quali', 'sprint']:
+        races[f'{col}_date'] = np.nan
+        races[f'{col}_time'] = np.nan
+
+    return races
+
+
+# One row per entrant of every race. Entrants are a window of the driver list
+# that moves every season, two drivers per constructor.
+def make_entries(rng, races, n_drivers, n_constructors):
+
+    n = len(races)
+    k = min(ENTRANTS_PER_RACE, n_drivers)
+    season = races['year'].to_numpy() - FIRST_SEASON
+    slot = np.tile(np.arange(k), n)
+
+    driver_offset = np.repeat(season * k, k)
+    team_offset = np.repeat(season * (k // 2), k)
+
+    return pd.DataFrame({
+        'raceId': np.repeat(races['raceId'].to_numpy(), k),
+        'driverId': (driver_offset + slot) % n_drivers + 1,
+        'constructorId': (team_offset + slot // 2) % n_constructors + 1,
+        'number': (slot + 1).astype('int64'),
+        # Random finishing order inside each race
+        'order': np.argsort(rng.random((n, k)), axis=1).ravel() + 1,
+        'grid': np.argsort(rng.random((n, k)), axis=1).ravel() + 1,
+    })
+
+
+def make_results(rng, entries):
+
+    n = len(entries)
+    order = entries['order'].to_numpy()
+    finished = rng.random(n) < 0.8
+    base_ms = 5400000 + rng.integers(0, 600000, n)
+
+    position = pd.array(order, dtype='Int64')
+    position[~finished] = pd.NA
+    points = np.where(order <= len(POINTS), np.asarray(POINTS)[np.minimum(order, len(POINTS)) - 1], 0)
+    milliseconds = pd.array(base_ms + order * 1500, dtype='Int64')
+    milliseconds[~finished] = pd.NA
+
+    fastest_ms = 80000 + rng.integers(0, 15000, n)
+
+    return pd.DataFrame({
+        'resultId': np.arange(1, n + 1),
+        'raceId': entries['raceId'],
+        'driverId': entries['driverId'],
+        'constructorId': entries['constructorId'],
+        'number': entries['number'],
+        'grid': entries['grid'],
+        'position': position,
+        'positionText': np.where(finished, order.astype(str), 'R'),
+        'positionOrder': order,
+        'points': np.where(finished, points, 0).astype(float),
+        'laps': np.where(finished, 58, rng.integers(0, 58, n)),
+        'time': np.where(finished, _lap_time(milliseconds.to_numpy(dtype='int64', na_value=0)), np.nan),
+        'milliseconds': milliseconds,
+        'fastestLap': rng.integers(2, 58, n),
+        'rank': entries['order'],
+        'fastestLapTime': _lap_time(fastest_ms),
+        'fastestLapSpeed': rng.uniform(180, 240, n).round(3),
+        'statusId': np.where(finished, 1, rng.integers(2, STATUS_COUNT + 1, n)),
+    })
+
+
+def make_qualifying(rng, entries, n_races):
+
+    first_race = n_races - int(n_races * QUALIFYING_SHARE)
+    entries = entries[entries['raceId'] > first_race].reset_index(drop=True)
+    n = len(entries)
+    grid = entries['grid'].to_numpy()
+
+    qualifying = pd.DataFrame({
+        'qualifyId': np.arange(1, n + 1),
+        'raceId': entries['raceId'],
+        'driverId': entries['driverId'],
+        'constructorId': entries['constructorId'],
+        'number': entries['number'],
+        'position': grid,
+    })
+    for session, cutoff in [('q1', None), ('q2', 15), ('q3', 10)]:
+        times = _lap_time(75000 + grid * 120 + rng.integers(0, 400, n))
+        qualifying[session] = times if cutoff is None else times.where(grid <= cutoff, np.nan)
+
+    return qualifying
+
+
+def make_pit_stops(rng, entries, n_races):
+
+    first_race = n_races - int(n_races * PIT_STOPS_SHARE)
+    entries = entries[entries['raceId'] > first_race].reset_index(drop=True)
+    stops = rng.choice([0, 1, 2], size=len(entries), p=[0.3, 0.45, 0.25])
+
+    rows = np.repeat(np.arange(len(entries)), stops)
+    starts = np.repeat(np.cumsum(stops) - stops, stops)
+    stop = np.arange(len(rows)) - starts + 1
+    n = len(rows)
+    milliseconds = 20000 + rng.integers(0, 10000, n)
+
+    return pd.DataFrame({
+        'raceId': entries['raceId'].to_numpy()[rows],
+        'driverId': entries['driverId'].to_numpy()[rows],
+        'stop': stop,
+        'lap': stop * 20 + rng.integers(0, 15, n),
+        'time': _clock(14 * 3600 + stop * 1800 + rng.integers(0, 1200, n)),
+        'duration': [f"{m / 1000:.3f}" for m in milliseconds],
+        'milliseconds': milliseconds,
+    })
+
+
+# One row per lap completed by every driver of the most recent races, as many
+# laps as its result, running in its finishing order.
+def make_lap_times(rng, results, n_races):
+
+    first_race = n_races - int(n_races * LAP_TIMES_SHARE)
+    results = results[results['raceId'] > first_race].reset_index(drop=True)
+    laps = results['laps'].to_numpy()
+
+    rows = np.repeat(np.arange(len(results)), laps)
+    lap = np.arange(len(rows)) - np.repeat(np.cumsum(laps) - laps, laps) + 1
+    order = results['positionOrder'].to_numpy()[rows]
+    milliseconds = 80000 + order * 150 + rng.integers(0, 3000, len(rows))
+
+    return pd.DataFrame({
+        'raceId': results['raceId'].to_numpy()[rows],
+        'driverId': results['driverId'].to_numpy()[rows],
+        'lap': lap,
+        'position': order,
+        'time': _lap_time_column(milliseconds),
+        'milliseconds': milliseconds,
+    })
+
+
+# Points of every constructor in every race, from the results.
+def make_constructor_results(results):
+
+    points = results.groupby(['raceId', 'constructorId'], sort=True, as_index=False)['points'].sum()
+
+    return pd.DataFrame({
+        'constructorResultsId': np.arange(1, len(points) + 1),
+        'raceId': points['raceId'],
+        'constructorId': points['constructorId'],
+        'points': points['points'],
+        'status': np.nan,
+    })
+
+
+# Championship standings of every driver (or constructor) after every race of
+# its season: points and wins added up race by race, ranked by points.
+def make_standings(results, races, key, id_name):
+
+    per_race = (results.assign(win=(results['positionOrder'] == 1).astype('int64'))
+                .groupby(['raceId', key], as_index=False)[['points', 'win']].sum()
+                .merge(races[['raceId', 'year', 'round']], on='raceId')
+                .sort_values(['year', 'round', key]))
+    season = per_race.groupby(['year', key])
+    per_race['points'] = season['points'].cumsum()
+    per_race['wins'] = season['win'].cumsum()
+    per_race['position'] = (per_race.groupby('raceId')['points'].rank(method='first', ascending=False)
+                            .astype('int64'))
+
+    return pd.DataFrame({
+        id_name: np.arange(1, len(per_race) + 1),
+        'raceId': per_race['raceId'].to_numpy(),
+        key: per_race[key].to_numpy(),
+        'points': per_race['points'].to_numpy(),
+        'position': per_race['position'].to_numpy(),
+        'positionText': per_race['position'].astype(str).to_numpy(),
+        'wins': per_race['wins'].to_numpy(),
+    })
+
+
+# Writes a referentially consistent copy of the source files, scale times the
+# size of Data/, into out_dir, using the same CSV layout and null marker (\N).
+# Returns the number of rows of every file.
+def generate(out_dir, scale=1, seed=42):
+
+    rng = np.random.default_rng(seed)
+    sizes = {name: max(1, int(size * scale)) for name, size in BASE_SIZES.items()}
+
+    circuits = make_circuits(rng, sizes['circuits'])
+    constructors = make_constructors(rng, sizes['constructors'])
+    drivers = make_drivers(rng, sizes['drivers'])
+    races = make_races(rng, sizes['races'], len(circuits))
+    entries = make_entries(rng, races, len(drivers), len(constructors))
+    results = make_results(rng, entries)
+
+    files = {
+        'circuits': circuits,
+        'constructors': constructors,
+        'drivers': drivers,
+        'status': make_status(),
+        'races': races,
+        'results': results,
+        'qualifying': make_qualifying(rng, entries, len(races)),
+        'pit_stops': make_pit_stops(rng, entries, len(races)),
+        'driver_standings': make_standings(results, races, 'driverId', 'driverStandingsId'),
+        'constructor_standings': make_standings(results, races, 'constructorId', 'constructorStandingsId'),
+        'constructor_results': make_constructor_results(results),
+        'lap_times': make_lap_times(rng, results, len(races)),
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in files.items():
+        df.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False, na_rep='\\N')
+
+    counts = {name: len(df) for name, df in files.items()}
+    log('synthetic_data', f"Wrote {sum(counts.values())} rows at scale {scale} to {out_dir}: {counts}")
+
+    return counts
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Generate synthetic Formula 1 CSV files.')
+    parser.add_argument('out_dir', help='Folder to write the CSV files to.')
+    parser.add_argument('--scale', type=float, default=1, help='Size as a multiple of the files in Data/.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generate(args.out_dir, args.scale, args.seed)
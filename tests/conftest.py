@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+import pipeline
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data')
+
+# Seasons copied to the data folder of the tests: 2009 has a race whose pole
+# time is slower than a Q2 time, 2012 standings match the published ones.
+SEASONS = ['2009', '2012']
+
+
+# Copy of the CSV files with the fact rows of SEASONS only (the dimension files
+# are copied whole). Every value is kept as the text of the source file.
+@pytest.fixture
+def data_dir(tmp_path):
+
+    folder = tmp_path / 'data'
+    folder.mkdir()
+
+    races = pd.read_csv(os.path.join(DATA_DIR, 'races.csv'), dtype=str, keep_default_na=False)
+    kept = set(races.loc[races['year'].isin(SEASONS), 'raceId'])
+    for name in os.listdir(DATA_DIR):
+        df = pd.read_csv(os.path.join(DATA_DIR, name), dtype=str, keep_default_na=False)
+        if 'raceId' in df.columns and name != 'races.csv':
+            df = df[df['raceId'].isin(kept)]
+        df.to_csv(folder / name, index=False)
+
+    return folder
+
+
+# Runs the pipeline against one SQLite file per database, created from
+# schema.py. Returns a function that loads the given marts and keeps the
+# engines in its `engines` attribute. Setting its `prefix` attribute sends the
+# next loads to other files (engines named prefix + database), to compare two
+# ways of loading the same data.
+@pytest.fixture
+def load(tmp_path, data_dir, monkeypatch):
+
+    engines = {}
+
+    def get_connection(db_config, database=None):
+        database = run.prefix + (database or db_config['database'])
+        if database not in engines:
+            engines[database] = create_engine(f"sqlite:///{tmp_path / database}.db")
+        return engines[database]
+
+    monkeypatch.setattr(pipeline, 'get_connection', get_connection)
+    config = {'host': 'localhost', 'user': 'test', 'database': 'formula1_db'}
+
+    def run(marts, **options):
+        pipeline.run_pipeline(marts, config, data_dir=str(data_dir), cache_dir=None, create_tables=True, **options)
+
+    run.engines, run.prefix = engines, ''
+    yield run
+
+    for engine in engines.values():
+        engine.dispose()
@@ -0,0 +1,29 @@
+import pandas as pd
+from sqlalchemy import text
+
+from aggregates import AGGREGATES, refresh_aggregates
+
+
+def _summary(engine, table):
+    df = pd.read_sql(text(f"SELECT * FROM {table}"), con=engine)
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+# After points of one race change, refreshing that race gives the summary
+# tables a full rebuild gives.
+def test_refreshing_the_touched_races_matches_a_full_rebuild(load):
+
+    load(['formula1'])
+    engine = load.engines['formula1_db']
+    with engine.begin() as conn:
+        race = conn.execute(text("SELECT MIN(race_id) FROM results")).scalar()
+        conn.execute(text("UPDATE results SET points = points + 5 WHERE race_id = :race AND final_position = 2"),
+                     {'race': race})
+
+    refresh_aggregates(engine, {'results': [race]})
+    refreshed = {name: _summary(engine, name) for name in AGGREGATES}
+    refresh_aggregates(engine, {fact: None for fact in ['qualifying', 'pit_stops', 'results']})
+
+    for name in AGGREGATES:
+        pd.testing.assert_frame_equal(refreshed[name], _summary(engine, name), obj=name)
+    assert len(refreshed['agg_race_constructor_points']) > 0
@@ -0,0 +1,17 @@
+from benchmark import run_benchmark
+from pipeline import FACTS
+from synthetic_data import generate
+
+
+# Every fact table of the formula1 mart is timed while it is prepared and
+# loaded into a temporary SQLite database.
+def test_every_stage_is_timed(tmp_path):
+
+    counts = generate(tmp_path, scale=0.05)
+
+    stages = {stage['stage']: stage for stage in run_benchmark(str(tmp_path))}
+
+    for fact in FACTS:
+        assert stages[f'load_{fact}']['rows'] == counts[fact] > 0
+        assert stages[f'prepare_{fact}']['wall_s'] >= 0
+    assert stages['load_dimensions']['rows'] > 0
@@ -0,0 +1,82 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+import bulk_load
+
+
+ROWS = pd.DataFrame({
+    'id': pd.array([1, None, 3], dtype='Int16'),
+    'name': pd.Categorical(['a', 'b, c', None]),
+    'note': ['say "hi"', None, 'x'],
+    'value': [1.5, np.nan, 2.0],
+    'loaded_at': pd.to_datetime(['2020-01-02 03:04:05', None, '2021-01-01 00:00:00']),
+})
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'load.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE rows (id INTEGER, name TEXT, note TEXT, value REAL, loaded_at TEXT)"))
+    yield engine
+    engine.dispose()
+
+
+def _loaded(engine):
+    return pd.read_sql(text("SELECT * FROM rows ORDER BY rowid"), con=engine)
+
+
+@pytest.mark.parametrize('strategy', ['executemany', 'to_sql', 'auto', 'benchmark'])
+def test_every_strategy_loads_the_same_rows(engine, strategy, monkeypatch):
+
+    monkeypatch.setattr(bulk_load, '_best_strategy', {})
+
+    used = bulk_load.bulk_load(engine, 'rows', ROWS, strategy=strategy)
+
+    assert used in ('executemany', 'to_sql')
+    loaded = _loaded(engine)
+    assert loaded['id'].tolist()[::2] == [1, 3] and pd.isna(loaded['id'][1])
+    assert loaded['name'].tolist() == ['a', 'b, c', None]
+    assert loaded['note'].tolist() == ['say "hi"', None, 'x']
+    pd.testing.assert_series_equal(pd.to_datetime(loaded['loaded_at']), ROWS['loaded_at'])
+
+
+# The benchmark runs every strategy on a sample in a rolled back transaction.
+def test_the_benchmark_leaves_no_rows_behind(engine, monkeypatch):
+
+    monkeypatch.setattr(bulk_load, '_best_strategy', {})
+
+    timings = bulk_load.benchmark_strategies(engine, 'rows', ROWS)
+
+    assert set(timings) == {'executemany', 'to_sql'}
+    assert bulk_load._best_strategy['rows'] in timings
+    assert _loaded(engine).empty
+
+
+def test_load_data_is_refused_outside_mysql(engine):
+
+    with pytest.raises(NotImplementedError):
+        bulk_load.bulk_load(engine, 'rows', ROWS, strategy='load_data')
+    with pytest.raises(ValueError):
+        bulk_load.bulk_load(engine, 'rows', ROWS, strategy='copy')
+
+
+# The LOAD DATA file has the same values with and without pyarrow: NULL for
+# nulls, text quoted when needed, categoricals as their values.
+def test_the_load_data_file_is_the_same_without_pyarrow(tmp_path, monkeypatch):
+
+    pytest.importorskip('pyarrow')
+    bulk_load._write_csv(ROWS, tmp_path / 'arrow.csv')
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    bulk_load._write_csv(ROWS, tmp_path / 'pandas.csv')
+
+    def read(name):
+        return pd.read_csv(tmp_path / name, header=None, na_values=['NULL'], keep_default_na=False)
+
+    pd.testing.assert_frame_equal(read('arrow.csv'), read('pandas.csv'))
+    assert read('pandas.csv').iloc[1].isna().tolist() == [True, False, True, True, True]
+    assert read('pandas.csv')[1].tolist()[:2] == ['a', 'b, c']
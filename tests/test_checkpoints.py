@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+import checkpoints
+from bulk_load import bulk_load
+from checkpoints import committed_batches, load_in_batches, run_id, with_retry
+
+
+ROWS = pd.DataFrame({'race_id': range(10), 'lap_ms': range(90000, 90010)})
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'laps.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE laps (race_id INTEGER, lap_ms INTEGER)"))
+    yield engine
+    engine.dispose()
+
+
+# A load that fails after two batches commits them with their checkpoints; the
+# same load run again writes the other batches only.
+def test_a_failed_load_resumes_from_the_first_missing_batch(engine, monkeypatch):
+
+    written = []
+
+    def failing(engine, table, df, **kwargs):
+        if len(written) == 2:
+            raise RuntimeError('server gone')
+        written.append(df['race_id'].tolist())
+        return bulk_load(engine, table, df, **kwargs)
+
+    monkeypatch.setattr(checkpoints, 'bulk_load', failing)
+    with pytest.raises(RuntimeError):
+        load_in_batches(engine, 'laps', ROWS, batch_size=3)
+    assert committed_batches(engine, run_id('laps', ROWS, 3), 'laps') == {0, 1}
+
+    monkeypatch.undo()
+    load_in_batches(engine, 'laps', ROWS, batch_size=3)
+
+    laps = pd.read_sql(text("SELECT * FROM laps ORDER BY race_id"), con=engine)
+    pd.testing.assert_frame_equal(laps, ROWS)
+    assert committed_batches(engine, run_id('laps', ROWS, 3), 'laps') == {0, 1, 2, 3}
+
+
+def test_only_transient_errors_are_retried(monkeypatch):
+
+    monkeypatch.setattr(checkpoints._time, 'sleep', lambda seconds: None)
+    calls = []
+
+    def locked():
+        calls.append(1)
+        if len(calls) < 3:
+            raise exc.OperationalError('INSERT', {}, Exception('database is locked'))
+        return 'done'
+
+    assert with_retry(locked, max_retries=5) == 'done' and len(calls) == 3
+
+    def duplicate():
+        calls.append(1)
+        raise exc.IntegrityError('INSERT', {}, Exception('UNIQUE constraint failed'))
+
+    with pytest.raises(exc.IntegrityError):
+        with_retry(duplicate, max_retries=5)
+    assert len(calls) == 4
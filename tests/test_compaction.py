@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compaction import compact, memory_usage
+
+
+RESULTS = pd.DataFrame({
+    'race_id': np.arange(1000, 1200, dtype='int64'),
+    'lap_ms': np.full(200, 100_000, dtype='int64'),
+    'grid': pd.array([1, None] * 100, dtype='Int64'),
+    'position': np.tile([1.0, 2.0, np.nan, 4.0], 50),
+    'points': np.tile([25.0, 18.0, 0.5, 0.0], 50),
+    'fastest_lap_speed': np.linspace(190.123456789, 220.987654321, 200),
+    'status': ['Finished', '+1 Lap'] * 100,
+    'url': [f'http://en.wikipedia.org/wiki/{n}' for n in range(200)],
+    'date': pd.date_range('2012-03-18', periods=200),
+    'row_hash': np.full(200, 2 ** 40, dtype='int64'),
+})
+
+
+# Every column takes the smallest type that keeps its values.
+@pytest.mark.parametrize('arrow_strings, url_dtype', [(False, 'object'), (True, 'string')])
+def test_columns_take_the_smallest_type_that_keeps_their_values(arrow_strings, url_dtype):
+
+    if arrow_strings:
+        pytest.importorskip('pyarrow')
+
+    compacted = compact(RESULTS, arrow_strings=arrow_strings)
+
+    assert compacted.dtypes.astype(str).to_dict() == {
+        'race_id': 'int16', 'lap_ms': 'int32', 'grid': 'Int8', 'position': 'Int8', 'points': 'float32',
+        'fastest_lap_speed': 'float64', 'status': 'category', 'url': url_dtype, 'date': 'datetime64[ns]',
+        'row_hash': 'int64',
+    }
+    pd.testing.assert_frame_equal(compacted.astype(RESULTS.dtypes.to_dict()), RESULTS)
+    assert memory_usage(compacted) < memory_usage(RESULTS)
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+import connections
+from connections import dispose_all, get_connection
+
+
+CONFIG = {'host': 'db', 'port': 3306, 'user': 'etl', 'password': 'p@ss:word', 'database': 'formula1_db',
+          'pool': {'pool_size': 2}}
+
+
+class _Engine:
+
+    def __init__(self, url, **kwargs):
+        self.url, self.kwargs, self.disposed = url, kwargs, False
+
+    def dispose(self):
+        self.disposed = True
+
+
+@pytest.fixture(autouse=True)
+def engines(monkeypatch):
+    created = []
+
+    def create_engine(url, **kwargs):
+        created.append(_Engine(url, **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(connections, 'create_engine', create_engine)
+    yield created
+    dispose_all()
+
+
+# Every thread asking for the same database gets the same engine, built with
+# the pool settings of config.json over the defaults.
+def test_one_engine_is_shared_per_database(engines):
+
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(get_connection(CONFIG))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(engines) == 1 and all(engine is engines[0] for engine in found)
+    assert get_connection(CONFIG, 'results_db') is not engines[0]
+    assert engines[0].kwargs['pool_size'] == 2 and engines[0].kwargs['pool_pre_ping']
+    assert engines[0].url.password == 'p@ss:word' and engines[0].url.database == 'formula1_db'
+
+
+def test_disposed_engines_are_built_again(engines):
+
+    engine = get_connection(CONFIG)
+    dispose_all()
+
+    assert engine.disposed and get_connection(CONFIG) is not engine
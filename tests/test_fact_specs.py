@@ -0,0 +1,43 @@
+import pandas as pd
+
+from fact_specs import FACT_SPECS, prepare_fact
+from key_registry import register_dimension
+
+
+REGISTRY = {}
+register_dimension(REGISTRY, 'race', pd.DataFrame({'race_id': [1], 'year': [2012], 'race_name': ['Monaco Grand Prix']}))
+register_dimension(REGISTRY, 'constructor', pd.DataFrame({'constructor_id': [5], 'constructor_name': ['Red Bull']}))
+register_dimension(REGISTRY, 'driver', pd.DataFrame({'driver_id': [7], 'driver_name': ['Mark'],
+                                                     'driver_surname': ['Webber'],
+                                                     'date_of_birth': pd.to_datetime(['1976-08-27'])}))
+register_dimension(REGISTRY, 'status', pd.DataFrame({'status_id': [3], 'status': ['Finished']}))
+
+SOURCES = {
+    'races': pd.DataFrame({'raceId': [860], 'year': [2012], 'name': ['Monaco Grand Prix'], 'circuitId': [6]}),
+    'constructors': pd.DataFrame({'constructorId': [9], 'name': ['Red Bull']}),
+    'drivers': pd.DataFrame({'driverId': [17], 'forename': ['Mark'], 'surname': ['Webber'],
+                             'dob': pd.to_datetime(['1976-08-27'])}),
+    'status': pd.DataFrame({'statusId': [1, 2], 'status': ['Finished', 'Disqualified']}),
+}
+
+
+# Source ids become surrogate ids: rows whose status is not in the status file
+# are dropped (status is required), ids the database does not know become null.
+# Columns are renamed and cast as the spec says.
+def test_results_are_built_from_their_spec():
+
+    source = pd.DataFrame({'resultId': [1, 2, 3], 'raceId': [860, 860, 860], 'driverId': [17, 18, 17],
+                           'constructorId': [9, 9, 10], 'number': ['2', '2', '\\N'], 'grid': ['1', '3', '2'],
+                           'position': ['1', '\\N', '4'], 'positionOrder': ['1', '3', '2'],
+                           'points': ['25', '0', '12'], 'laps': ['78', '0', '78'], 'statusId': [1, 4, 2]},
+                          index=[10, 11, 12])
+
+    results = prepare_fact('results', source, SOURCES, REGISTRY)
+
+    assert list(results.columns) == ([col for _, _, col, _ in FACT_SPECS['results']['lookups']]
+                                     + [col for _, col, _ in FACT_SPECS['results']['columns']] + ['row_hash'])
+    assert results.index.tolist() == [10, 12]
+    assert results['constructor_id'].tolist() == [5, pd.NA] and results['driver_id'].tolist() == [7, 7]
+    assert results['race_id'].tolist() == [1, 1] and results['status_id'].tolist() == [3, pd.NA]
+    assert results['car_number'].isna().tolist() == [False, True]
+    assert results['final_position'].tolist() == [1, 4] and results['points'].tolist() == [25, 12]
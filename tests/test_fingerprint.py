@@ -0,0 +1,41 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from fingerprint import HASH_COLUMN, add_row_hash, drop_loaded, hash_rows, row_hashes
+
+
+PIT_STOPS = pd.DataFrame({
+    'race_id': [841, 841, 842], 'driver_id': [1, 2, 1], 'stop_number': [1, 1, 2], 'lap_number': [16, 17, 30],
+    'stop_time': [datetime.time(17, 28, 5), datetime.time(17, 29, 1), None], 'stop_duration': [22, 23, None],
+})
+
+
+# The same values hash the same whatever their dtype or row index.
+def test_hashes_do_not_depend_on_the_dtypes_or_the_index():
+
+    other = PIT_STOPS.astype({'race_id': 'float64', 'driver_id': 'Int32', 'stop_number': 'category',
+                              'lap_number': 'int16', 'stop_duration': 'Int64'})
+    other.index = [10, 20, 30]
+
+    assert row_hashes(other, 'pit_stops').tolist() == row_hashes(PIT_STOPS, 'pit_stops').tolist()
+    assert len(set(row_hashes(PIT_STOPS, 'pit_stops'))) == 3
+    q1 = pd.DataFrame({'q1': ['1:26.572', None]})
+    assert hash_rows(q1.astype('category'), ['q1']).tolist() == hash_rows(q1, ['q1']).tolist()
+
+
+def test_rows_already_in_the_table_are_dropped(tmp_path):
+
+    laps = pd.DataFrame({'race_id': 1, 'driver_id': 1, 'lap_number': np.arange(2500),
+                         'lap_position': 1, 'lap_ms': 90000})
+    laps, repeated = add_row_hash(pd.concat([laps, laps.tail(1)], ignore_index=True), 'lap_times')
+    engine = create_engine(f"sqlite:///{tmp_path / 'laps.db'}")
+    laps.iloc[::2].to_sql('lap_times', engine, index=False)
+
+    new = drop_loaded(engine, 'lap_times', laps)
+
+    assert repeated == 1
+    assert new[HASH_COLUMN].tolist() == laps[HASH_COLUMN].iloc[1::2].tolist()
+    engine.dispose()
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from incremental import ensure_natural_keys, filter_new_races, get_watermark, set_watermark, upsert_dimension
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'formula1.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE constructor (constructor_id INTEGER PRIMARY KEY, constructor_name TEXT, "
+                          "nationality TEXT)"))
+    ensure_natural_keys(engine, ['constructor'])
+    yield engine
+    engine.dispose()
+
+
+def _constructors(engine):
+    return pd.read_sql(text("SELECT * FROM constructor ORDER BY constructor_id"), con=engine)
+
+
+# Existing rows keep their id and get the new attributes; new rows are added
+# after the highest id.
+def test_upsert_keeps_the_ids_of_existing_rows(engine):
+
+    upsert_dimension(engine, 'constructor', pd.DataFrame({'constructor_name': ['McLaren', 'Ferrari'],
+                                                          'nationality': ['British', 'Italian']}))
+    upsert_dimension(engine, 'constructor', pd.DataFrame({'constructor_name': ['Red Bull', 'McLaren'],
+                                                          'nationality': ['Austrian', 'UK']}))
+
+    assert _constructors(engine).values.tolist() == [[1, 'McLaren', 'UK'], [2, 'Ferrari', 'Italian'],
+                                                     [3, 'Red Bull', 'Austrian']]
+
+
+def test_only_races_after_the_watermark_are_kept(engine):
+
+    races = pd.DataFrame({'raceId': [1, 2, 3], 'RACE_DATE': pd.to_datetime(['2020-03-01', '2020-04-01', '2020-05-01'])})
+    facts = pd.DataFrame({'raceId': [1, 2, 2, 3]})
+
+    assert get_watermark(engine, 'results') is None
+    kept, watermark = filter_new_races(facts, races, None)
+    set_watermark(engine, 'results', watermark)
+    assert len(kept) == 4 and get_watermark(engine, 'results') == pd.Timestamp('2020-05-01')
+
+    kept, watermark = filter_new_races(facts, races, pd.Timestamp('2020-03-15'))
+    assert kept['raceId'].tolist() == [2, 2, 3] and watermark == pd.Timestamp('2020-05-01')
+    assert filter_new_races(facts, races, watermark)[1] is None
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import instrumentation
+from instrumentation import log, record, span
+
+
+@pytest.fixture(autouse=True)
+def empty():
+    instrumentation.reset()
+    yield
+    instrumentation.reset()
+
+
+def _run_stages():
+
+    with span('load_results', rows_in=10, table='results') as outer:
+        with span('load_chunk', rows_in=4, echo=False):
+            record(rows_out=4)
+        log('bulk_load', 'Falling back to executemany.')
+        outer.update(rows_out=8, dropped=2, unmapped={'driver_id': 1})
+    with pytest.raises(ValueError):
+        with span('load_pit_stops'):
+            raise ValueError('no such table')
+
+
+# Spans record their counts, parent, messages and outcome.
+def test_spans_record_every_stage(capsys):
+
+    _run_stages()
+
+    chunk, results, pit_stops = instrumentation.spans()
+    assert (chunk['stage'], chunk['parent'], chunk['rows_out']) == ('load_chunk', 'load_results', 4)
+    assert results['rows_out'] == 8 and results['status'] == 'ok' and results['wall_s'] >= 0
+    assert results['messages'] == ['[bulk_load] Falling back to executemany.']
+    assert pit_stops['status'] == 'error' and pit_stops['error'] == 'no such table'
+
+    printed = capsys.readouterr().out
+    assert '[load_results] ok in' in printed and '[load_chunk]' not in printed
+
+
+def test_spans_are_exported_as_json_lines_and_prometheus(tmp_path):
+
+    _run_stages()
+    instrumentation.export(str(tmp_path / 'spans.jsonl'))
+    instrumentation.export(str(tmp_path / 'spans.prom'))
+
+    lines = [json.loads(line) for line in (tmp_path / 'spans.jsonl').read_text().splitlines()]
+    assert [line['stage'] for line in lines] == ['load_chunk', 'load_results', 'load_pit_stops']
+
+    metrics = (tmp_path / 'spans.prom').read_text().splitlines()
+    assert 'pipeline_stage_rows_out{stage="load_results"} 8' in metrics
+    assert 'pipeline_stage_unmapped_keys{stage="load_results",column="driver_id"} 1' in metrics
+    assert 'pipeline_stage_errors{stage="load_pit_stops"} 1' in metrics
+
+
+def test_muted_spans_are_not_kept():
+
+    with instrumentation.muted():
+        with span('template'):
+            pass
+
+    assert instrumentation.spans() == []
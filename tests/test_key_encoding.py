@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from key_encoding import MISSING, UNMAPPED, build_source_map, decode_ids, encode_ids, map_source_ids
+
+
+VALUES = pd.Series([3, 7, None, 5, 1_000_000, -4, 3], dtype='Int64')
+
+
+# Small source ids are kept in a dense table, sparse ones in sorted arrays: both
+# resolve every value the same way, unknown or null ids to MISSING.
+@pytest.mark.parametrize('source_ids, layout', [([3, 5, 7], 'dense'), ([3, 5, 7, 10 ** 9], 'keys')])
+def test_dense_and_sorted_lookups_resolve_the_same_codes(source_ids, layout):
+
+    source_map = build_source_map(source_ids, np.arange(10, 10 + len(source_ids)))
+
+    assert layout in source_map
+    assert map_source_ids(source_map, VALUES).tolist() == [10, 12, MISSING, 11, MISSING, MISSING, 10]
+
+
+def test_ids_without_a_surrogate_decode_to_null():
+
+    codes = encode_ids(pd.array([4, None, 6], dtype='Int64'), present=[True, True, False])
+
+    assert codes.tolist() == [4, UNMAPPED, MISSING]
+    assert decode_ids(codes).tolist() == [4, pd.NA, pd.NA]
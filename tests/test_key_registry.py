@@ -0,0 +1,34 @@
+import pandas as pd
+
+from key_registry import lookup_ids, register_dimension
+
+
+DRIVERS = pd.DataFrame({
+    'driver_id': [1, 2, 3],
+    'driver_name': ['Lewis', 'Nico', 'Lewis'],
+    'driver_surname': ['Hamilton', 'Rosberg', 'Hamilton'],
+    'date_of_birth': ['1985-01-07', '1985-06-27', '1985-01-07'],
+})
+
+
+# Keys are compared once normalized, whatever the types they were read with,
+# the first id of a key is kept and unknown keys give <NA>.
+def test_ids_are_found_from_the_natural_key():
+
+    registry = register_dimension({}, 'driver', DRIVERS)
+    rows = pd.DataFrame({'name': ['Nico', 'Lewis', 'Max'], 'surname': ['Rosberg', 'Hamilton', 'Verstappen'],
+                         'dob': pd.to_datetime(['1985-06-27', '1985-01-07', '1997-09-30'])}, index=[10, 11, 12])
+
+    ids = lookup_ids(registry, 'driver', rows, ['name', 'surname', 'dob'])
+
+    assert ids.index.tolist() == [10, 11, 12]
+    assert ids.tolist()[:2] == [2, 1] and pd.isna(ids[12])
+
+
+def test_text_keys_ignore_case_and_spaces():
+
+    registry = register_dimension({}, 'status', pd.DataFrame({'status_id': [7], 'status': ['Finished']}))
+
+    ids = lookup_ids(registry, 'status', pd.DataFrame({'label': [' finished ', 'Engine']}), ['label'])
+
+    assert ids[0] == 7 and pd.isna(ids[1])
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from manifest import combine_partitions, diff_partitions, partition_hashes
+
+
+PIT_STOPS = pd.DataFrame({'raceId': [841, 841, 842, 842, 843], 'driverId': [1, 2, 1, 3, 1],
+                          'stop': [1, 1, 1, 1, 2], 'milliseconds': [22000, 23000, 24000, 25000, 26000]})
+COLUMNS = ['raceId', 'driverId', 'stop', 'milliseconds']
+
+
+# A partition hash does not depend on the order of its rows, and the hashes of
+# the chunks of a file add up to those of the whole file.
+def test_partition_hashes_of_chunks_add_up_to_the_whole_file():
+
+    whole = partition_hashes(PIT_STOPS, COLUMNS)
+    shuffled = partition_hashes(PIT_STOPS.iloc[::-1], COLUMNS)
+    chunks = combine_partitions([partition_hashes(PIT_STOPS.iloc[:3], COLUMNS),
+                                 partition_hashes(PIT_STOPS.iloc[3:], COLUMNS)])
+
+    pd.testing.assert_frame_equal(shuffled, whole)
+    pd.testing.assert_frame_equal(chunks, whole)
+    assert whole['row_count'].tolist() == [2, 2, 1]
+
+
+def test_only_changed_and_removed_races_are_found():
+
+    loaded = partition_hashes(PIT_STOPS, COLUMNS)
+    edited = PIT_STOPS.copy()
+    edited.loc[2, 'milliseconds'] = 24500
+    edited = pd.concat([edited[edited['raceId'] != 843],
+                        pd.DataFrame({'raceId': [844], 'driverId': [1], 'stop': [1], 'milliseconds': [21000]})])
+
+    assert diff_partitions(loaded, partition_hashes(edited, COLUMNS)) == ({842, 844}, {843})
+    assert diff_partitions(loaded, loaded) == (set(), set())
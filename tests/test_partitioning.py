@@ -0,0 +1,31 @@
+import pandas as pd
+
+import partitioning
+from partitioning import load_with_retry, season_partitions
+
+
+RACES = pd.DataFrame({'raceId': [1, 2, 3, 4, 5, 6], 'year': [2009, 2009, 2010, 2011, 2011, 2012]})
+
+
+# Partitions hold whole seasons of about the same size, keep the rows in their
+# order and send races missing from the races file to the last one.
+def test_seasons_are_never_split():
+
+    results = pd.DataFrame({'raceId': [1, 2, 3, 4, 5, 6, 99, 1, 4] * 10})
+
+    parts = season_partitions(results, RACES, 3)
+
+    assert len(parts) == 3 and sum(len(part) for part in parts) == len(results)
+    years = [set(part['raceId'].map(RACES.set_index('raceId')['year']).dropna()) for part in parts]
+    assert all(not (a & b) for i, a in enumerate(years) for b in years[i + 1:])
+    assert all(part.index.is_monotonic_increasing for part in parts)
+    assert (parts[-1]['raceId'] == 99).sum() == 10
+
+
+def test_failed_partitions_are_retried(monkeypatch):
+
+    monkeypatch.setattr(partitioning._time, 'sleep', lambda seconds: None)
+    attempts = iter([None, None, ['results']])
+
+    assert load_with_retry(lambda: next(attempts), 'results 1/3') == ['results']
+    assert load_with_retry(lambda: None, 'results 2/3', retries=1) is None
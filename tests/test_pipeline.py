@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from pipeline import FACTS, MARTS, mart_dimensions
+
+
+# Rows of a table in the order of its first column (the surrogate id).
+def _table(engine, table):
+    return pd.read_sql(text(f"SELECT * FROM {table} ORDER BY 1"), con=engine)
+
+
+# Rows of a fact table without its auto-increment id, which depends on the
+# order the rows were written in, in the order of their values.
+def _facts(engine, table):
+    df = _table(engine, table).iloc[:, 1:]
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+# The dimensions and fact tables of a mart are the same in both databases.
+def _assert_same_mart(engine, other, mart):
+    for table in mart_dimensions(mart):
+        pd.testing.assert_frame_equal(_table(other, table), _table(engine, table), obj=table)
+    for table in MARTS[mart]['facts']:
+        pd.testing.assert_frame_equal(_facts(other, table), _facts(engine, table), obj=table)
+
+
+def _count(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+
+def test_running_the_same_load_twice_changes_nothing(load):
+
+    load(['formula1'])
+    engine = load.engines['formula1_db']
+    tables = mart_dimensions('formula1') + MARTS['formula1']['facts']
+    first = {table: _table(engine, table) for table in tables}
+
+    load(['formula1'])
+
+    for table in tables:
+        pd.testing.assert_frame_equal(_table(engine, table), first[table], obj=table)
+    assert len(first['results']) and len(first['qualifying'])
+
+
+def test_changes_deletes_the_rows_removed_from_the_file(load, data_dir):
+
+    load(['pit_stops'], changes=True)
+    engine = load.engines['pit_stops_db']
+    before = _count(engine, 'pit_stops')
+
+    path = data_dir / 'pit_stops.csv'
+    source = pd.read_csv(path, dtype=str, keep_default_na=False)
+    removed = source.iloc[0]
+    source.iloc[1:].to_csv(path, index=False)
+
+    load(['pit_stops'], changes=True)
+
+    query = text("SELECT COUNT(*) FROM pit_stops p JOIN race r ON r.race_id = p.race_id "
+                 "JOIN driver d ON d.driver_id = p.driver_id "
+                 "WHERE r.year = :year AND r.race_name = :race AND p.stop_number = :stop "
+                 "AND d.driver_surname = :surname")
+    races = pd.read_csv(data_dir / 'races.csv', dtype=str, keep_default_na=False).set_index('raceId')
+    drivers = pd.read_csv(data_dir / 'drivers.csv', dtype=str, keep_default_na=False).set_index('driverId')
+    with engine.connect() as conn:
+        left = conn.execute(query, {'year': int(races.loc[removed['raceId'], 'year']),
+                                    'race': races.loc[removed['raceId'], 'name'],
+                                    'stop': int(removed['stop']),
+                                    'surname': drivers.loc[removed['driverId'], 'surname']}).scalar()
+
+    assert left == 0
+    assert _count(engine, 'pit_stops') == before - 1
+
+
+# 2009 Australian Grand Prix: Button took pole with a 1:26.202 in Q3, slower
+# than the 1:24.783 Barrichello set in Q2.
+def test_gap_to_pole_is_measured_from_the_pole_sitter(load):
+
+    load(['qualifying'])
+    engine = load.engines['qualifying_db']
+
+    race = pd.read_sql(text(
+        "SELECT q.driver_id, d.driver_surname, q.best_q_ms, q.gap_to_pole_ms FROM qualifying q "
+        "JOIN race r ON r.race_id = q.race_id JOIN driver d ON d.driver_id = q.driver_id "
+        "WHERE r.year = 2009 AND r.race_name = 'Australian Grand Prix'"), con=engine).set_index('driver_surname')
+    assert race.loc['Button', 'gap_to_pole_ms'] == 0
+    assert race.loc['Button', 'best_q_ms'] == 86202
+    assert race.loc['Barrichello', 'gap_to_pole_ms'] == 86505 - 86202
+
+    # The pole-sitter of the summary table has no gap in every race
+    poles = pd.read_sql(text(
+        "SELECT a.race_id, q.gap_to_pole_ms FROM agg_race_qualifying a JOIN qualifying q "
+        "ON q.race_id = a.race_id AND q.driver_id = a.pole_driver_id"), con=engine)
+    assert len(poles) and (poles['gap_to_pole_ms'] == 0).all()
+
+
+def test_standings_summary_matches_the_published_season(load):
+
+    load(['results'])
+    engine = load.engines['results_db']
+
+    query = ("SELECT s.race_id, s.driver_id, s.points, s.wins, s.standing_position FROM {table} s "
+             "JOIN race r ON r.race_id = s.race_id WHERE r.year = 2012 ORDER BY s.race_id, s.driver_id")
+    computed = pd.read_sql(text(query.format(table='agg_driver_standings')), con=engine)
+    published = pd.read_sql(text(query.format(table='driver_standings')), con=engine)
+
+    assert len(computed) == len(published) > 0
+    assert np.allclose(computed['points'], published['points'])
+    assert (computed[['race_id', 'driver_id', 'wins', 'standing_position']].to_numpy()
+            == published[['race_id', 'driver_id', 'wins', 'standing_position']].to_numpy()).all()
+
+
+# Loading every mart in one pass gives each mart the tables it gets when it is
+# loaded alone.
+def test_marts_loaded_together_match_marts_loaded_alone(load):
+
+    load(['all'])
+
+    load.prefix = 'alone_'
+    for mart in ['qualifying', 'pit_stops', 'results']:
+        load([mart])
+        database = MARTS[mart]['database']
+        _assert_same_mart(load.engines[database], load.engines['alone_' + database], mart)
+
+
+# Fact tables prepared by worker processes and loaded from threads are the
+# same as those prepared and loaded one after the other.
+def test_workers_load_the_same_tables(load):
+
+    load(['results'])
+    load.prefix = 'workers_'
+    load(['results'], workers=2)
+
+    _assert_same_mart(load.engines['results_db'], load.engines['workers_results_db'], 'results')
+
+
+# Fact tables prepared and loaded in season partitions by worker processes are
+# those of a single pass.
+def test_season_partitions_load_the_same_tables(load):
+
+    load(['results'])
+    load.prefix = 'partitioned_'
+    load(['results'], partitions=3, workers=2)
+
+    _assert_same_mart(load.engines['results_db'], load.engines['partitioned_results_db'], 'results')
+
+
+# Streaming the fact files in chunks that cut through races loads the rows of a
+# whole read, with the gaps to pole of the races split between chunks.
+def test_streamed_chunks_load_the_same_tables(load):
+
+    load(['formula1'])
+    load.prefix = 'streamed_'
+    load(['formula1'], chunksize=700)
+
+    _assert_same_mart(load.engines['formula1_db'], load.engines['streamed_formula1_db'], 'formula1')
+
+
+# lap_times is always streamed, in chunks of its own size: every lap of the file
+# is loaded once, however many chunks a race is cut into and however many
+# times the load runs.
+def test_lap_times_are_streamed_once(load, data_dir, monkeypatch):
+
+    results = pd.read_csv(data_dir / 'results.csv', usecols=['raceId', 'driverId', 'laps'])
+    laps = results.loc[results.index.repeat(results['laps'].clip(upper=5))]
+    laps = laps.assign(lap=laps.groupby(['raceId', 'driverId']).cumcount() + 1, position=1, time='1:30.000',
+                       milliseconds=90000 + np.arange(len(laps)))
+    laps.drop(columns='laps').to_csv(data_dir / 'lap_times.csv', index=False)
+    monkeypatch.setitem(FACTS['lap_times'], 'chunksize', 300)
+
+    load(['formula1'])
+    load(['formula1'])
+
+    loaded = pd.read_sql(text("SELECT lap_ms FROM lap_times ORDER BY lap_ms"), con=load.engines['formula1_db'])
+    assert len(laps) > 300 and loaded['lap_ms'].tolist() == laps['milliseconds'].tolist()
+
+
+# The fact tables prepared as DuckDB queries are those of the pandas preparers.
+def test_the_duckdb_backend_loads_the_same_tables(load):
+
+    pytest.importorskip('duckdb')
+    load(['formula1'])
+    load.prefix = 'duckdb_'
+    load(['formula1'], backend='duckdb')
+
+    _assert_same_mart(load.engines['formula1_db'], load.engines['duckdb_formula1_db'], 'formula1')
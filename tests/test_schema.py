@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from schema import bulk_mode, create_schema, metadata, orphan_counts
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'formula1.db'}")
+    create_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+def _indexes(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+# In bulk mode only the row_hash index is left to probe, and every index is
+# built again when the block ends, even if it fails.
+def test_bulk_mode_keeps_the_row_hash_index_and_restores_the_others(engine):
+
+    declared = {index.name for index in metadata.tables['results'].indexes}
+    assert _indexes(engine, 'results') == declared
+
+    with pytest.raises(RuntimeError):
+        with bulk_mode(engine, ['results']):
+            assert _indexes(engine, 'results') == {'ix_results_row_hash'}
+            raise RuntimeError('load failed')
+
+    assert _indexes(engine, 'results') == declared
+
+
+def test_orphan_rows_are_counted_per_foreign_key(engine):
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO race (race_id, year, race_name) VALUES (1, 2012, 'Monaco Grand Prix')"))
+        conn.execute(text("INSERT INTO results (race_id, driver_id) VALUES (1, NULL), (2, NULL), (3, 4)"))
+
+    counts = orphan_counts(engine, 'results')
+
+    assert counts['fk_results_race'] == 2 and counts['fk_results_driver'] == 1
+    assert counts['fk_results_status'] == 0
@@ -0,0 +1,40 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from key_encoding import build_source_map, map_source_ids
+import shared_maps
+from shared_maps import attach, detach, shared_source_maps
+
+
+SOURCE_MAPS = {'driver': build_source_map([1, 4, 9], np.array([7, 8, 9])),
+               'race': build_source_map([3, 10 ** 9], np.array([1, 2]))}
+IDS = pd.Series([4, 10 ** 9, 3, 9, 2], dtype='Int64')
+
+
+def _codes(handle):
+    source_maps = attach(handle)
+    return {dimension: map_source_ids(source_map, IDS).tolist() for dimension, source_map in source_maps.items()}
+
+
+# The lookups attached from the shared block, here or in a worker process, are
+# read-only views equal to the published ones.
+def test_attached_lookups_equal_the_published_ones():
+
+    expected = {dimension: map_source_ids(source_map, IDS).tolist() for dimension, source_map in SOURCE_MAPS.items()}
+
+    with shared_source_maps(SOURCE_MAPS) as handle:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(_codes, handle).result() == expected
+
+        attached = attach(handle)
+        for dimension, source_map in SOURCE_MAPS.items():
+            for part, values in source_map.items():
+                assert np.array_equal(attached[dimension][part], values)
+                assert not attached[dimension][part].flags.writeable
+        assert _codes(handle) == expected
+
+        del attached
+        detach(handle)
+        assert handle['name'] not in shared_maps._ATTACHED
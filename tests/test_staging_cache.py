@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+import staging_cache
+from source_schemas import read_source
+
+
+# Counts the files parsed by cached_read_source().
+@pytest.fixture
+def parsed(monkeypatch):
+
+    names = []
+
+    def counted(name, data_dir='Data', engine='c'):
+        names.append(name)
+        return read_source(name, data_dir, engine)
+
+    monkeypatch.setattr(staging_cache, 'read_source', counted)
+    return names
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'pickle'])
+def test_a_hit_gives_the_parsed_frame_without_parsing(data_dir, tmp_path, parsed, monkeypatch, fmt):
+
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(staging_cache, 'cache_format', lambda: fmt)
+    cache_dir = tmp_path / 'cache'
+
+    first = staging_cache.cached_read_source('pit_stops', data_dir, cache_dir=cache_dir)
+    second = staging_cache.cached_read_source('pit_stops', data_dir, cache_dir=cache_dir)
+
+    assert parsed == ['pit_stops']
+    pd.testing.assert_frame_equal(second, first)
+    pd.testing.assert_frame_equal(second, read_source('pit_stops', data_dir))
+
+
+def test_a_changed_file_is_parsed_again(data_dir, tmp_path, parsed):
+
+    cache_dir = tmp_path / 'cache'
+    staging_cache.cached_read_source('status', data_dir, cache_dir=cache_dir)
+    with open(data_dir / 'status.csv', 'a') as file:
+        file.write('999,Gearbox exploded\n')
+
+    status = staging_cache.cached_read_source('status', data_dir, cache_dir=cache_dir)
+
+    assert parsed == ['status', 'status']
+    assert status['status'].iloc[-1] == 'Gearbox exploded'
+    assert len(staging_cache.list_entries(cache_dir)) == 2
+
+
+# The least recently used entries go first when the cache is over its size.
+def test_the_least_recently_used_entries_are_evicted(data_dir, tmp_path):
+
+    cache_dir = tmp_path / 'cache'
+    for name in ['status', 'circuits', 'constructors']:
+        staging_cache.cached_read_source(name, data_dir, cache_dir=cache_dir)
+    entries = staging_cache.list_entries(cache_dir)
+    unused = next(entry['file'] for entry in entries if entry['file'].startswith('circuits'))
+    os.utime(cache_dir / unused, (1, 1))
+
+    staging_cache.evict(cache_dir, max_bytes=sum(e['bytes'] for e in entries) - 1)
+
+    left = [entry['file'] for entry in staging_cache.list_entries(cache_dir)]
+    assert len(left) == 2 and unused not in left
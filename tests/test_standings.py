@@ -0,0 +1,81 @@
+import os
+
+import pandas as pd
+
+from standings import constructor_standings, cross_check, driver_standings
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data')
+
+
+def _csv(name):
+    return pd.read_csv(os.path.join(DATA_DIR, f'{name}.csv'), na_values=['\\N'])
+
+
+# Results of some seasons in the shape compute_standings() reads from the
+# results fact table, keeping the source ids.
+def _season_results(*years):
+
+    races = _csv('races')
+    races = races[races['year'].isin(years)].assign(date=lambda df: pd.to_datetime(df['date']))
+    results = _csv('results').merge(races[['raceId', 'year', 'date']], on='raceId')
+
+    return pd.DataFrame({
+        'race_id': results['raceId'], 'driver_id': results['driverId'], 'constructor_id': results['constructorId'],
+        'year': results['year'], 'month': results['date'].dt.month, 'day': results['date'].dt.day,
+        'points': results['points'], 'final_position': results['position'],
+        'position_order': results['positionOrder'],
+    })
+
+
+def test_driver_standings_match_the_published_2012_season():
+
+    results = _season_results(2012)
+    published = (_csv('driver_standings')
+                 .rename(columns={'raceId': 'race_id', 'driverId': 'driver_id', 'position': 'standing_position'}))
+    published = published[published['race_id'].isin(results['race_id'])]
+
+    report = cross_check(driver_standings(results), published, 'driver_id')
+
+    assert report[['computed', 'published']].to_numpy().tolist() == [[488, 488]]
+    assert report[['points_differ', 'wins_differ', 'position_differs']].to_numpy().sum() == 0
+
+
+# Drivers tied on points are ranked by the countback first, then by their
+# result in that race, then by id.
+def test_ties_go_to_the_countback_then_to_the_result_in_the_race():
+
+    results = pd.DataFrame({
+        'race_id': [1, 1, 1, 1, 2, 2, 2, 2],
+        'driver_id': [10, 11, 12, 13, 10, 11, 12, 13],
+        'year': 2000, 'month': [3, 3, 3, 3, 4, 4, 4, 4], 'day': 1,
+        'points': [10, 0, 6, 0, 0, 10, 4, 0],
+        'final_position': [1, None, 2, None, None, 1, 3, None],
+        'position_order': [1, 4, 2, 3, 4, 1, 3, 2],
+    })
+
+    standings = driver_standings(results).set_index(['race_id', 'driver_id'])['standing_position']
+
+    # 13 beat 11 in race 1 on position_order, neither being classified. After
+    # race 2, 10, 11 and 12 have 10 points: 10 and 11 won a race, 12 did not, and
+    # 11 finished ahead of 10 in race 2
+    assert standings[1].sort_values().index.tolist() == [10, 12, 13, 11]
+    assert standings[2].sort_values().index.tolist() == [11, 10, 12, 13]
+
+
+# The standings of a season do not depend on the seasons loaded with it, so
+# refreshing one season (--changes) gives the rows of a full rebuild. In 1968
+# drivers 341 and 358 are tied on 8 points after races 674 to 676, which only
+# the countback separates.
+def test_one_season_is_ranked_as_in_a_full_rebuild():
+
+    results = _season_results(*range(1950, 1981))
+
+    for compute in [driver_standings, constructor_standings]:
+        everything = compute(results)
+        for year in [1955, 1968, 1980]:
+            season = compute(results[results['year'] == year])
+            pd.testing.assert_frame_equal(everything[everything['year'] == year].reset_index(drop=True), season)
+
+    tied = driver_standings(results[results['year'] == 1968]).set_index(['race_id', 'driver_id'])
+    assert tied.loc[(674, 341), 'points'] == tied.loc[(674, 358), 'points'] == 8
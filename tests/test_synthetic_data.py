@@ -0,0 +1,25 @@
+import pandas as pd
+
+from source_schemas import SOURCE_FILES, read_source
+from synthetic_data import generate
+
+
+# Every generated file is read with its declared schema, every fact row points
+# to existing races, drivers and constructors, and the same seed writes the
+# same files.
+def test_generated_files_are_consistent_and_repeatable(tmp_path):
+
+    counts = generate(tmp_path / 'a', scale=0.05, seed=7)
+    generate(tmp_path / 'b', scale=0.05, seed=7)
+
+    files = {name: read_source(name, tmp_path / 'a') for name in SOURCE_FILES}
+    assert {name: len(df) for name, df in files.items()} == counts
+    for name, df in files.items():
+        pd.testing.assert_frame_equal(read_source(name, tmp_path / 'b'), df, obj=name)
+
+    for name, df in files.items():
+        for column, parent, key in [('raceId', 'races', 'raceId'), ('driverId', 'drivers', 'driverId'),
+                                    ('constructorId', 'constructors', 'constructorId')]:
+            if column in df.columns and name != parent:
+                assert df[column].isin(files[parent][key]).all(), (name, column)
+    assert files['races']['circuitId'].isin(files['circuits']['circuitId']).all()
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from timing import add_qualifying_times, clock_time, lap_ms
+
+
+def test_lap_and_clock_times_are_parsed():
+
+    laps = pd.Series(['1:26.572', '58.1', '\\N', None, '1:26.572', 'DNF', '2:00.0005'], dtype='category')
+    clocks = pd.Series(['9:05:23', '17:05:23', '24:00:00', '\\N', None])
+
+    assert lap_ms(laps).tolist() == [86572, 58100, pd.NA, pd.NA, 86572, pd.NA, 120000]
+    assert clock_time(clocks).fillna('').tolist() == ['09:05:23', '17:05:23', '', '', '']
+
+
+# Race 1 was decided in Q3; driver 3, knocked out in Q2 on a faster track, is
+# ahead of the pole time. Race 2 only had Q1.
+def test_the_gap_is_measured_to_the_best_time_of_the_last_session():
+
+    qualifying = pd.DataFrame({
+        'race_id': [1, 1, 1, 2, 2],
+        'q1': ['1:30.000', '1:30.500', '1:29.000', '1:40.000', '1:41.250'],
+        'q2': ['1:29.500', '1:29.900', '1:28.800', None, None],
+        'q3': ['1:29.200', '1:29.000', None, None, None],
+    })
+
+    times = add_qualifying_times(qualifying)
+
+    assert times['best_q_ms'].tolist() == [89200, 89000, 88800, 100000, 101250]
+    assert times['gap_to_pole_ms'].tolist() == [200, 0, -200, 0, 1250]
+    assert times['q3_ms'].isna().tolist() == [False, False, True, True, True]
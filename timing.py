@@ -0,0 +1,179 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from chunking import chunked
+from instrumentation import log
+
+
+QUALIFYING_SESSIONS = ['q1', 'q2', 'q3']
+
+# Integer millisecond columns added to the qualifying fact table.
+QUALIFYING_TIME_COLUMNS = [f'{session}_ms' for session in QUALIFYING_SESSIONS] + ['best_q_ms', 'gap_to_pole_ms']
+
+LAP_TIME = r'^(?:(\d+):)?(\d+(?:\.\d+)?)$'
+CLOCK_TIME = r'^(\d{1,2}):(\d{2}):(\d{2})$'
+
+
+# Applies parse to the distinct values of the column only and spreads the result
+# back with their codes, so repeated values (categoricals, clock times of the
+# same lap) are parsed once. parse gets the distinct values as a string Series.
+def _parse_distinct(values, parse, dtype):
+
+    codes, uniques = pd.factorize(values)
+    if not len(uniques):
+        return pd.Series(np.nan, index=values.index, dtype=dtype)
+
+    parsed = parse(pd.Series(np.asarray(uniques, dtype=object), dtype='string'))
+    result = pd.Series(parsed.take(np.where(codes < 0, 0, codes)).to_numpy(), index=values.index, dtype=dtype)
+
+    return result.where(codes >= 0)
+
+
+def _lap_ms(strings):
+
+    parts = strings.str.extract(LAP_TIME)
+    minutes = pd.to_numeric(parts[0]).fillna(0)
+    seconds = pd.to_numeric(parts[1])
+
+    return (minutes * 60000 + seconds * 1000).round().where(seconds.notna()).astype('Int32')
+
+
+# Lap time strings ('1:26.572' or '58.1') as integer milliseconds (Int32).
+# Nulls, '\N' and anything else that is not a lap time become null.
+def lap_ms(times):
+    return _parse_distinct(times, _lap_ms, 'Int32')
+
+
+def _clock_time(strings):
+
+    parts = strings.str.extract(CLOCK_TIME)
+    numbers = parts.apply(pd.to_numeric)
+    valid = ((numbers[0] < 24) & (numbers[1] < 60) & (numbers[2] < 60)).fillna(False)
+
+    formatted = (parts[0].str.zfill(2) + ':' + parts[1] + ':' + parts[2]).where(valid)
+
+    return pd.Series(formatted.to_numpy(dtype=object, na_value=np.nan), index=strings.index)
+
+
+# Clock times ('9:05:23' or '17:05:23') as 'HH:MM:SS' strings, which every
+# database reads as a TIME value. Invalid times become null.
+def clock_time(times):
+    return _parse_distinct(times, _clock_time, object)
+
+
+# Last qualifying session every driver set a time in (3 for Q3, 2, 1, or 0
+# without any time) and that time. The grid follows them: the drivers in Q3 by
+# their Q3 time, then those knocked out in Q2 by their Q2 time, and so on.
+def last_session(q1, q2, q3):
+
+    session = np.select([q3.notna().to_numpy(), q2.notna().to_numpy(), q1.notna().to_numpy()], [3, 2, 1], 0)
+    return session, q3.fillna(q2).fillna(q1)
+
+
+# Gap of every driver's last session time to the pole time of their race: the
+# fastest time of the last session of the race (0 for the pole-sitter). A driver
+# knocked out earlier can have a negative gap when the track got slower.
+def pole_gaps(times, session, races):
+
+    session = pd.Series(session, index=times.index)
+    last = session.groupby(races).transform('max')
+    pole = times.where((session == last) & (last > 0)).groupby(races).transform('min')
+
+    return (times - pole).astype('Int32')
+
+
+# Adds the millisecond columns of the qualifying fact table: the time of every
+# session, the time of the last session the driver reached (best_q_ms, the one
+# that sets the grid) and the gap between that time and the pole time of the
+# race (gap_to_pole_ms, see pole_gaps()). The frame must hold whole races.
+def add_qualifying_times(df):
+
+    times = pd.DataFrame({f'{session}_ms': lap_ms(df[session]) if session in df.columns
+                          else pd.array([pd.NA] * len(df), dtype='Int32')
+                          for session in QUALIFYING_SESSIONS}, index=df.index)
+    session, best = last_session(times['q1_ms'], times['q2_ms'], times['q3_ms'])
+    times['best_q_ms'] = best.astype('Int32')
+    times['gap_to_pole_ms'] = pole_gaps(times['best_q_ms'], session, df['race_id'].to_numpy())
+
+    return pd.concat([df, times], axis=1)
+
+
+def _update(conn, df, columns):
+
+    statement = text(f"UPDATE qualifying SET {', '.join(f'{col} = :{col}' for col in columns)} "
+                     f"WHERE qualifying_id = :qualifying_id")
+    rows = df[['qualifying_id'] + columns].astype(object).where(df.notna(), None).to_dict('records')
+    if rows:
+        conn.execute(statement, rows)
+
+    return len(rows)
+
+
+def _read_races(conn, columns, races):
+
+    query = text(f"SELECT qualifying_id, race_id, {', '.join(columns)} FROM qualifying "
+                 f"WHERE race_id IN :races").bindparams(bindparam('races', expanding=True))
+
+    return pd.read_sql(query, conn, params={'races': races})
+
+
+# Fills the millisecond columns of the qualifying rows loaded before they
+# existed (or of every row with everything=True), race by race. Returns the
+# number of rows updated.
+def backfill_qualifying_times(engine, everything=False):
+
+    query = "SELECT DISTINCT race_id FROM qualifying"
+    if not everything:
+        query += " WHERE best_q_ms IS NULL AND (q1 IS NOT NULL OR q2 IS NOT NULL OR q3 IS NOT NULL)"
+    with engine.connect() as conn:
+        races = [row[0] for row in conn.execute(text(query))]
+
+    updated = 0
+    for chunk in chunked(races):
+        with engine.begin() as conn:
+            df = add_qualifying_times(_read_races(conn, QUALIFYING_SESSIONS, chunk))
+            updated += _update(conn, df, QUALIFYING_TIME_COLUMNS)
+
+    if updated:
+        log('timing', f"Filled the qualifying times of {updated} rows.")
+    return updated
+
+
+# Recomputes gap_to_pole_ms for the given races from the rows in the table, for
+# loads that wrote a race in several parts (streamed chunks). Only the rows
+# whose gap changed are updated; returns how many.
+def refresh_pole_gaps(engine, races):
+
+    updated = 0
+    for chunk in chunked(races):
+        with engine.begin() as conn:
+            df = _read_races(conn, ['q1_ms', 'q2_ms', 'q3_ms', 'best_q_ms', 'gap_to_pole_ms'], chunk)
+            session, _ = last_session(df['q1_ms'], df['q2_ms'], df['q3_ms'])
+            gap = pole_gaps(df['best_q_ms'].astype('Int64'), session, df['race_id'].to_numpy()).astype('Int64')
+            old = df['gap_to_pole_ms'].astype('Int64')
+            changed = (gap != old).fillna(gap.notna() | old.notna()).to_numpy(dtype=bool)
+            updated += _update(conn, df.assign(gap_to_pole_ms=gap)[changed], ['gap_to_pole_ms'])
+
+    if updated:
+        log('timing', f"Updated the gap to pole of {updated} rows.")
+    return updated
+
+
+if __name__ == '__main__':
+
+    from connections import get_connection, load_db_config
+    from schema import add_missing_columns
+
+    parser = argparse.ArgumentParser(description='Add and fill the millisecond columns of the qualifying table.')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default=None, help='Database to use (the one of config.json by default).')
+    parser.add_argument('--all', action='store_true',
+                        help='Recompute the columns of every row, not only of those where they are empty.')
+    args = parser.parse_args()
+
+    engine = get_connection(load_db_config(args.config), args.database)
+    add_missing_columns(engine, ['qualifying'])
+    backfill_qualifying_times(engine, args.all)